@@ -2,11 +2,18 @@
 
 テストケース YAML ではなく、対象環境・ロール別ログイン・Playwright/Runner 設定、
 およびページ検査・スラッグ正規化・レポート生成のプロジェクト固有パラメータを保持する。
+
+pytest plugin からは ``Config.load_cached`` を使い、``pytest_configure`` と
+``ndf_config`` fixture で同じ Config を共有する (YAML の parse はプロセスごとに
+1 回)。xdist worker には controller が load 済の snapshot (pickle) を渡す。
 """
 
 from __future__ import annotations
 
+import hashlib
+import json
 import os
+import pickle
 import re
 from dataclasses import dataclass, field
 from pathlib import Path
@@ -49,6 +56,65 @@ def _expand_env(value: Any) -> Any:
     return value
 
 
+# ---------------------------------------------------------------------------
+# スキーマ検証
+# ---------------------------------------------------------------------------
+
+def _validate_raw(raw: dict[str, Any]) -> list[str]:
+    """env 展開前の YAML に必須キーの欠落が無いかを調べ、問題の一覧を返す。
+
+    ``_from_dict`` 内の KeyError / AttributeError ではどの項目が悪いか
+    分かりにくいため、builder に渡す前にまとめて検出する。対象は builder が
+    実際に必須としているキーのみ (省略可能な項目の型までは縛らない)。
+    """
+    errors: list[str] = []
+    target = raw.get("target")
+    if not isinstance(target, dict):
+        errors.append("target: 辞書で指定してください")
+    elif not isinstance(target.get("base_url"), str):
+        errors.append("target.base_url: 文字列で指定してください")
+
+    roles = raw.get("roles")
+    if roles and not isinstance(roles, dict):
+        errors.append("roles: role id をキーにした辞書で指定してください")
+        roles = {}
+    for rid, role in (roles or {}).items():
+        login = role.get("login") if isinstance(role, dict) else None
+        if not isinstance(login, dict):
+            errors.append(f"roles.{rid}.login: 辞書で指定してください")
+            continue
+        # fail_if_url_contains は null (判定しない) も可。キー自体は必須
+        for key in ("path", "fields", "fail_if_url_contains"):
+            if key not in login:
+                errors.append(f"roles.{rid}.login.{key}: 指定してください")
+        if "fields" in login and not isinstance(login["fields"], dict):
+            errors.append(f"roles.{rid}.login.fields: 辞書で指定してください")
+    return errors
+
+
+# ---------------------------------------------------------------------------
+# プロセス内 cache / xdist worker 向け snapshot
+# ---------------------------------------------------------------------------
+
+# cache キー → load 済 Config。pytest_configure と ndf_config fixture で共有する。
+_LOADED: dict[str, "Config"] = {}
+
+
+def _config_cache_key(path: Path, text: str) -> str:
+    """ファイルパス・内容と、内容が参照する環境変数の値から cache キーを作る。
+
+    ``${VAR}`` の値が変われば展開結果も変わるため、キーに含める
+    (値そのものは hash にのみ含まれる)。
+    """
+    names = sorted({m.group(1) for m in _ENV_RE.finditer(text)})
+    payload = json.dumps(
+        {"path": str(path), "text": text, "env": {n: os.environ.get(n) for n in names}},
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
 # --- 接続/認証 -------------------------------------------------------
 
 @dataclass
@@ -67,6 +133,10 @@ class Login:
     # auth fixture の _submit_login_form が「これ → role/type=submit フォールバック
     # → Password で Enter」の順で試す。空のままでも汎用フォールバックで通常はログインできる。
     submit_selectors: list[str] = field(default_factory=list)
+    # 永続 storage_state cache (--ndf-auth-cache) の再利用前に GET するパス。
+    # 最終 URL が fail_if_url_contains を含めばログアウト済とみなし再ログインする。
+    # 空なら ``path`` (ログイン済ならログイン画面から遷移するサイトを想定)。
+    check_path: str = ""
 
 
 @dataclass
@@ -268,13 +338,65 @@ class Config:
                 f"設定ファイルが見つかりません: {path}\n"
                 "templates/scenario.config.yaml をコピーして作成してください。"
             )
-        with path.open("r", encoding="utf-8") as fp:
-            raw = yaml.safe_load(fp)
+        return cls._from_text(path.read_text(encoding="utf-8"), path)
+
+    @classmethod
+    def load_cached(cls, path: Path, snapshot: dict[str, Any] | None = None) -> "Config":
+        """``load`` の結果をプロセス内で共有する版。
+
+        キーはファイル内容と参照している環境変数の値の hash で、どちらかが
+        変われば読み直す。``snapshot`` (``Config.snapshot`` の戻り値) のキーが
+        一致すれば YAML を parse せずにそれを復元する。返す Config は
+        呼び出し元で共有されるため変更しないこと。
+        """
+        path = path.resolve()
+        if not path.exists():
+            return cls.load(path)
+        text = path.read_text(encoding="utf-8")
+        key = _config_cache_key(path, text)
+        cfg = _LOADED.get(key)
+        if cfg is None and snapshot is not None and snapshot.get("key") == key:
+            try:
+                restored = pickle.loads(snapshot["pickle"])
+            except Exception:
+                restored = None
+            if isinstance(restored, cls):
+                cfg = restored
+        if cfg is None:
+            cfg = cls._from_text(text, path)
+        _LOADED[key] = cfg
+        return cfg
+
+    @classmethod
+    def snapshot(cls, path: Path) -> dict[str, Any] | None:
+        """``load_cached`` 済の Config を worker に渡せる形 (キー + pickle) で返す。
+
+        未 load またはその後ファイル / 環境変数が変わった場合は None。
+        """
+        path = path.resolve()
+        try:
+            key = _config_cache_key(path, path.read_text(encoding="utf-8"))
+        except OSError:
+            return None
+        cfg = _LOADED.get(key)
+        if cfg is None:
+            return None
+        return {"key": key, "pickle": pickle.dumps(cfg)}
+
+    @classmethod
+    def _from_text(cls, text: str, path: Path) -> "Config":
+        raw = yaml.safe_load(text)
         if not isinstance(raw, dict):
             raise ValueError(
                 f"scenario.config.yaml の中身が空または辞書ではありません: {path}\n"
                 "templates/scenario.config.yaml をコピーして必要項目を埋めてください。"
             )
+        errors = _validate_raw(raw)
+        if errors:
+            raise ValueError(
+                f"scenario.config.yaml の設定に不備があります: {path}\n"
+                + "\n".join(f"- {e}" for e in errors)
+            )
         raw = _expand_env(raw)
         return cls._from_dict(raw, config_path=path.resolve())
 
@@ -329,8 +451,9 @@ def _role_from_raw(rid: str, raw: dict[str, Any]) -> Role:
             path=login["path"],
             requires_basic_auth=bool(login.get("requires_basic_auth", False)),
             fields=dict(login["fields"]),
-            fail_if_url_contains=login["fail_if_url_contains"],
+            fail_if_url_contains=str(login["fail_if_url_contains"] or ""),
             submit_selectors=list(login.get("submit_selectors") or []),
+            check_path=str(login.get("check_path") or ""),
         ),
     )
 
@@ -8,11 +8,25 @@ fixture と協調して動作する。
   1 度だけ読み込む。利用者プロジェクトの ``conftest.py`` から override 可能。
 - 各 role に対し ``ndf_role_<id>`` fixture を *動的* に生成する。
   実体は ``_login_and_get_storage_state`` で session 内 1 回だけ login し、
+  (login には pytest-playwright の session ``browser`` 上の使い捨て context を
+  使い、ブラウザを別途 launch しない)
   storage_state を session-scoped cache (`_StorageStateCache`) に保管。
-  以降の test では同じ role の cache を ``context.add_cookies`` 等で再利用する
-  ことで login の再実行を避ける。
+  以降の test では同じ role の cache を ``context.add_cookies`` と
+  ``context.add_init_script`` (localStorage) で注入し、login の再実行も
+  復元のための navigation も行わない。
 - function scope で ``page.context.storage_state(...)`` を inject し、
   ``page`` は既に該当 role でログイン済みの状態で test 関数に渡される。
+- ``--ndf-auth-cache <dir>`` (env ``NDF_AUTH_CACHE``) 指定時は storage_state を
+  session をまたいで ``<dir>/ndf-auth-cache/`` に保存する (`_DiskStateCache`)。cookie の expires
+  から有効期限を決め、再利用前に 1 回の GET でログイン状態を確認する。
+- pytest-xdist の worker 間では、run 共通の basetemp 配下の共有 store を
+  role ごとの file lock で守り、login は 1 role につき 1 worker だけが行う
+  (他の worker は lock 待ちの後にその結果を読む)。
+- in-memory cache は cookie の expires で期限切れを判定し、test 中に login 画面へ
+  redirect された role も無効化する。次にその role を使う test の前に
+  (xdist では lock 下で worker 全体 1 回だけ) 再 login して entry を更新する。
+- ``--ndf-prewarm-roles`` 指定時は session 開始時に全 role の login を
+  thread ごとに並行実行し、最初に role を使う test の時間から login を外す。
 
 fail_if_url_contains による失敗判定もここで行い、test 開始前に明示的に
 ``pytest.fail`` する。
@@ -20,10 +34,16 @@ fail_if_url_contains による失敗判定もここで行い、test 開始前に
 
 from __future__ import annotations
 
+import contextlib
+import hashlib
+import json
+import math
 import os
-from dataclasses import dataclass
+import re
+import time
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Any, Callable
+from typing import Any, Callable, Iterator
 from urllib.parse import urlsplit
 
 import pytest
@@ -35,8 +55,8 @@ def _same_origin(origin_url: str, base_url: str) -> bool:
     """``origin_url`` が ``base_url`` と同一 origin (scheme + host + port) かを返す。
 
     storage_state には認証対象以外のサードパーティ origin (広告 / 計測タグ等) が
-    含まれることがある。restore 時にそれらへ ``page.goto(url)`` するのは意図しない
-    外部送信になるため、本関数で base_url の origin に厳格一致するもののみ許可する。
+    含まれることがある。それらの localStorage まで復元するのは意図しない
+    情報の持ち出しになるため、本関数で base_url の origin に厳格一致するもののみ許可する。
     """
     try:
         a = urlsplit(origin_url)
@@ -52,6 +72,49 @@ def _same_origin(origin_url: str, base_url: str) -> bool:
     )
 
 
+# localStorage の復元を済ませた印 (init script が 2 回目以降の遷移で埋め直さない)。
+_LOCAL_STORAGE_SEEDED_KEY = "__ndf_ls_seeded__"
+
+
+def _local_storage_init_script(state: dict[str, Any], base_url: str) -> str | None:
+    """storage_state の localStorage を復元する init script を返す (無ければ None)。
+
+    ``context.add_init_script`` で登録すると各 document の script より先に
+    実行されるため、復元のための ``page.goto`` が不要になる。base_url と
+    同一 origin の項目のみ対象とし、document の origin が一致した場合だけ
+    未設定のキーを埋める (test 中にアプリが書き換えた値は上書きしない)。
+
+    init script は navigation のたびに走るため、埋めた時点で sessionStorage
+    (同じ tab) と localStorage (同じ context の他の page) に印を残し、以降は
+    何もしない。これでアプリが logout 等で消したキーが次の遷移で復活しない。
+    """
+    seed: dict[str, list[list[str]]] = {}
+    for origin in state.get("origins") or []:
+        url = origin.get("origin")
+        items = origin.get("localStorage") or []
+        if not url or not items or not _same_origin(url, base_url):
+            continue
+        seed[url.rstrip("/")] = [[it.get("name"), it.get("value")] for it in items]
+    if not seed:
+        return None
+    flag = json.dumps(_LOCAL_STORAGE_SEEDED_KEY)
+    return (
+        "(() => {\n"
+        f"  const items = {json.dumps(seed, ensure_ascii=False)}[window.location.origin];\n"
+        "  if (!items) return;\n"
+        "  try {\n"
+        "    const local = window.localStorage, session = window.sessionStorage;\n"
+        f"    if (session.getItem({flag}) !== null || local.getItem({flag}) !== null) return;\n"
+        "    for (const [k, v] of items) {\n"
+        "      if (local.getItem(k) === null) local.setItem(k, v);\n"
+        "    }\n"
+        f"    local.setItem({flag}, '1');\n"
+        f"    session.setItem({flag}, '1');\n"
+        "  } catch (e) {}\n"
+        "})();"
+    )
+
+
 # ---------------------------------------------------------------------------
 # Internal helpers
 # ---------------------------------------------------------------------------
@@ -59,19 +122,396 @@ def _same_origin(origin_url: str, base_url: str) -> bool:
 
 @dataclass
 class _StorageStateCache:
-    """session 内で role ごとの storage_state を 1 回だけ作る簡易 cache。"""
+    """session 内で role ごとの storage_state を 1 回だけ作る簡易 cache。
+
+    長時間の session では対象サイトの cookie が途中で切れるため、cookie の
+    ``expires`` から求めた期限を過ぎた entry は返さない。期限切れ・login 画面への
+    redirect で無効化した state は ``stale`` に残し、再 login 時に
+    「どの state が古いか」を共有 store と突き合わせるのに使う。
+    """
 
     states: dict[str, dict[str, Any]]
+    expires_at: dict[str, float] = field(default_factory=dict)
+    stale: dict[str, dict[str, Any]] = field(default_factory=dict)
 
     @classmethod
     def empty(cls) -> "_StorageStateCache":
         return cls(states={})
 
-    def get(self, role_id: str) -> dict[str, Any] | None:
-        return self.states.get(role_id)
-
-    def put(self, role_id: str, state: dict[str, Any]) -> None:
+    def get(self, role_id: str, now: float | None = None) -> dict[str, Any] | None:
+        state = self.states.get(role_id)
+        if state is None:
+            return None
+        now = time.time() if now is None else now
+        if self.expires_at.get(role_id, math.inf) <= now:
+            self.invalidate(role_id)
+            return None
+        return state
+
+    def put(
+        self,
+        role_id: str,
+        state: dict[str, Any],
+        now: float | None = None,
+        base_url: str = "",
+    ) -> None:
+        now = time.time() if now is None else now
         self.states[role_id] = state
+        # session cookie しか無い場合は session 中ずっと有効とみなす。
+        # 第三者 / 短命 cookie (analytics の _gat 等) の期限では失効させない。
+        self.expires_at[role_id] = _state_expires_at(
+            state, saved_at=now, default_ttl_s=math.inf, base_url=base_url
+        )
+        self.stale.pop(role_id, None)
+
+    def invalidate(self, role_id: str) -> None:
+        state = self.states.pop(role_id, None)
+        self.expires_at.pop(role_id, None)
+        if state is not None:
+            self.stale[role_id] = state
+
+
+# cookie に expires が無い (session cookie のみ) storage_state の保存期間。
+_DEFAULT_STATE_TTL_S = 12 * 60 * 60
+# expires 直前の cookie で test を始めないための余裕。
+_EXPIRY_MARGIN_S = 60
+# 保存時点の残り寿命がこれより短い cookie は期限の判定に使わない。計測タグの
+# ``_gat`` (60 秒) のような認証と無関係な短命 cookie で state 全体を失効させないため。
+_MIN_TRACKED_LIFETIME_S = 5 * 60
+
+
+def _cookie_sent_to(cookie: dict[str, Any], host: str) -> bool:
+    """cookie の ``domain`` が ``host`` (またはその親 domain) に一致するか。"""
+    domain = str(cookie.get("domain") or "").lstrip(".").lower()
+    return not domain or host == domain or host.endswith("." + domain)
+
+
+def _state_expires_at(
+    state: dict[str, Any], saved_at: float, default_ttl_s: float, base_url: str = ""
+) -> float:
+    """storage_state が有効な期限 (epoch 秒) を返す。
+
+    対象は ``base_url`` の host に送られる期限付き cookie (``expires`` > 0) のうち、
+    ``saved_at`` 時点で残り ``_MIN_TRACKED_LIFETIME_S`` 以上あるもの。その最も
+    早い期限から margin を引いた値を返す。対象が無い (session cookie のみ等)
+    場合は ``saved_at + default_ttl_s``。
+    """
+    host = (urlsplit(base_url).hostname or "").lower() if base_url else ""
+    expiries = [
+        float(c["expires"])
+        for c in state.get("cookies") or []
+        if isinstance(c.get("expires"), (int, float))
+        and c["expires"] - saved_at >= _MIN_TRACKED_LIFETIME_S
+        and (not host or _cookie_sent_to(c, host))
+    ]
+    if not expiries:
+        return saved_at + default_ttl_s
+    return min(expiries) - _EXPIRY_MARGIN_S
+
+
+def _login_fingerprint(base_url: str, role: Role, basic_auth_user: str) -> str:
+    """base_url / role / ログイン入力値から永続 cache のキーを作る。
+
+    フィールド値 (パスワード等) は hash にのみ含め、ファイル名や中身には残さない。
+    値が変われば別キーになり、古い login 状態は使われない。
+    """
+    payload = json.dumps(
+        {
+            "base_url": base_url,
+            "role": role.id,
+            "path": role.login.path,
+            "fields": role.login.fields,
+            "requires_basic_auth": role.login.requires_basic_auth,
+            "basic_auth_user": basic_auth_user if role.login.requires_basic_auth else "",
+        },
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class _DiskStateCache:
+    """session をまたいで role ごとの storage_state を保存する opt-in cache。
+
+    storage_state は cookie / localStorage をそのまま含むため、ディレクトリは
+    0700・ファイルは 0600 で作成し、group / other に権限が付いたファイルは
+    読まない (POSIX のみ)。``root`` が既にあり group / other に権限が付いて
+    いる場合は chmod せず (利用者のディレクトリの権限は変えない)、警告して
+    保存しない。書き込みは一時ファイル + ``os.replace`` で atomic。
+    """
+
+    root: Path
+    default_ttl_s: float = _DEFAULT_STATE_TTL_S
+
+    def path_for(self, role_id: str, fingerprint: str) -> Path:
+        safe = re.sub(r"[^A-Za-z0-9_.-]", "_", role_id)
+        return self.root / f"{safe}-{fingerprint[:32]}.json"
+
+    def load(
+        self, role_id: str, fingerprint: str, now: float | None = None
+    ) -> dict[str, Any] | None:
+        """期限内の storage_state を返す。無い / 期限切れ / 読めない場合は None。"""
+        path = self.path_for(role_id, fingerprint)
+        try:
+            if os.name == "posix" and path.stat().st_mode & 0o077:
+                return None
+            entry = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        if not isinstance(entry, dict) or entry.get("fingerprint") != fingerprint:
+            return None
+        now = time.time() if now is None else now
+        if not isinstance(entry.get("expires_at"), (int, float)) or entry["expires_at"] <= now:
+            return None
+        state = entry.get("state")
+        return state if isinstance(state, dict) else None
+
+    def store(
+        self,
+        role_id: str,
+        fingerprint: str,
+        state: dict[str, Any],
+        now: float | None = None,
+        base_url: str = "",
+    ) -> None:
+        now = time.time() if now is None else now
+        if not self._ensure_private_root():
+            return
+        path = self.path_for(role_id, fingerprint)
+        entry = {
+            "role": role_id,
+            "fingerprint": fingerprint,
+            "saved_at": now,
+            "expires_at": _state_expires_at(state, now, self.default_ttl_s, base_url),
+            "state": state,
+        }
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as fp:
+                json.dump(entry, fp, ensure_ascii=False)
+            os.replace(tmp, path)
+        except BaseException:
+            tmp.unlink(missing_ok=True)
+            raise
+
+    def discard(self, role_id: str, fingerprint: str) -> None:
+        self.path_for(role_id, fingerprint).unlink(missing_ok=True)
+
+    def _ensure_private_root(self) -> bool:
+        """``root`` を 0700 で用意する。既存で group / other に権限があれば False。"""
+        try:
+            self.root.mkdir(parents=True, mode=0o700)
+        except FileExistsError:
+            if os.name == "posix" and self.root.stat().st_mode & 0o077:
+                _warn_shared_cache_root(self.root)
+                return False
+            return True
+        if os.name == "posix":
+            # mkdir の mode は umask の影響を受けるため、作成したディレクトリにだけ明示する
+            os.chmod(self.root, 0o700)
+        return True
+
+
+# 権限の緩い cache ディレクトリの警告を出した root (1 root 1 回にする)。
+_warned_cache_root: set[str] = set()
+
+
+def _warn_shared_cache_root(root: Path) -> None:
+    if str(root) in _warned_cache_root:
+        return
+    _warned_cache_root.add(str(root))
+    import warnings
+
+    warnings.warn(
+        f"--ndf-auth-cache のディレクトリ {root} は group / other から読めるため、"
+        "storage_state (cookie 等) を保存しない。このディレクトリを削除するか "
+        "chmod 700 してください。",
+        stacklevel=3,
+    )
+
+
+@contextlib.contextmanager
+def _file_lock(path: Path) -> Iterator[None]:
+    """``path`` を lock file とするプロセス間の排他 lock (block して待つ)。
+
+    lock はファイルディスクリプタに紐づくため、保持したプロセスが異常終了しても
+    OS が解放する。POSIX は ``fcntl.flock``、Windows は ``msvcrt.locking``。
+    """
+    path.parent.mkdir(parents=True, exist_ok=True, mode=0o700)
+    with open(path, "a+b") as fp:
+        if os.name == "nt":  # pragma: no cover - Windows only
+            import msvcrt
+
+            while True:
+                fp.seek(0)
+                try:
+                    # LK_LOCK は約 10 秒 retry した後 OSError を投げる
+                    msvcrt.locking(fp.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+            try:
+                yield
+            finally:
+                fp.seek(0)
+                msvcrt.locking(fp.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+
+            fcntl.flock(fp.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(fp.fileno(), fcntl.LOCK_UN)
+
+
+# 他の worker の login 失敗を再試行せずに fail とみなす期間。
+_SHARED_FAILURE_TTL_S = 30.0
+
+
+@dataclass
+class _SharedLogin:
+    """xdist worker 間で role ごとの login 結果を共有する store。
+
+    ``store`` は run 共通ディレクトリ上の `_DiskStateCache`。role ごとの lock を
+    取った worker だけが login し、結果 (失敗時はそのメッセージ) を書き残す。
+    後続の worker は lock 解放後にそれを読むだけで、login を繰り返さない。
+
+    ``stale`` (期限切れ / redirect で無効になった state) を渡した場合、store の
+    中身がそれと同じなら再 login し、既に他の worker が更新済みならそれを返す。
+    これで途中失効時も再 login は worker 全体で 1 回になる。
+
+    失敗の記録は ``failure_ttl_s`` 秒だけ有効で、一時的な失敗 (通信断 / 5xx) で
+    run の残り全体を fail させない。login に成功すると記録は消え、再 login
+    (``stale`` 指定) は記録があっても login を試みる。記録の時刻は lock 待ちや
+    login の timeout の後に ``clock`` から取り直す (test では差し替える)。
+    """
+
+    store: _DiskStateCache
+    failure_ttl_s: float = _SHARED_FAILURE_TTL_S
+    clock: Callable[[], float] = time.time
+
+    def _failure_path(self, role_id: str, fingerprint: str) -> Path:
+        return self.store.path_for(role_id, fingerprint).with_suffix(".failed")
+
+    def _recent_failure(self, path: Path, now: float) -> str | None:
+        """``failure_ttl_s`` 以内に記録された失敗のメッセージ (無ければ None)。"""
+        try:
+            entry = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        if not isinstance(entry, dict) or not isinstance(entry.get("failed_at"), (int, float)):
+            return None
+        if now - entry["failed_at"] >= self.failure_ttl_s:
+            return None
+        return str(entry.get("message", ""))
+
+    def get_or_login(
+        self,
+        role_id: str,
+        fingerprint: str,
+        login: Callable[[], dict[str, Any]],
+        stale: dict[str, Any] | None = None,
+        base_url: str = "",
+    ) -> dict[str, Any]:
+        lock = self.store.path_for(role_id, fingerprint).with_suffix(".lock")
+        with _file_lock(lock):
+            state = self.store.load(role_id, fingerprint)
+            if state is not None and state != stale:
+                return state
+            failure = self._failure_path(role_id, fingerprint)
+            message = self._recent_failure(failure, self.clock()) if stale is None else None
+            if message is not None:
+                pytest.fail(f"[ndf_role_{role_id}] 他の worker での login が失敗済: {message}")
+            try:
+                state = login()
+            except (Exception, pytest.fail.Exception) as exc:
+                failure.write_text(
+                    json.dumps(
+                        {"failed_at": self.clock(), "message": str(exc) or type(exc).__name__}
+                    ),
+                    encoding="utf-8",
+                )
+                raise
+            self.store.store(role_id, fingerprint, state, base_url=base_url)
+            failure.unlink(missing_ok=True)
+            return state
+
+
+# check_path 未指定の警告を出した role (1 role 1 回にする)。
+_warned_check_path: set[str] = set()
+
+
+def _warn_missing_check_path(role: Role, url: str) -> None:
+    if role.id in _warned_check_path:
+        return
+    _warned_check_path.add(role.id)
+    import warnings
+
+    warnings.warn(
+        f"[ndf_role_{role.id}] login.check_path が未指定のため {url} で"
+        "ログイン状態を確認したが、ログイン画面から遷移しなかった。ログイン済でも"
+        "ログイン画面を返すサイトでは --ndf-auth-cache が毎回破棄されるため、"
+        "login.check_path にログインが必要なページ (例: /admin/) を指定してください。",
+        stacklevel=2,
+    )
+
+
+def _storage_state_is_valid(
+    *,
+    playwright,
+    base_url: str,
+    role: Role,
+    state: dict[str, Any],
+    basic_auth_user: str,
+    basic_auth_password: str,
+    verify_tls: bool,
+    timeout_ms: int = 10_000,
+) -> bool:
+    """保存済 storage_state がまだログイン状態かを 1 回の GET で確かめる。
+
+    ブラウザは起動せず Playwright の APIRequestContext で
+    ``login.check_path`` (未指定なら ``login.path``) を取得し、redirect 後の
+    最終 URL が ``fail_if_url_contains`` を含む / エラー status / 通信失敗なら
+    無効とみなす (呼び出し側は通常どおり login し直す)。
+
+    ``check_path`` 未指定で login 画面そのものに留まった (redirect されなかった)
+    場合は、設定不足で cache が常に捨てられている可能性が高いので 1 回警告する。
+    """
+    kwargs: dict[str, Any] = {
+        "storage_state": state,
+        "ignore_https_errors": not verify_tls,
+    }
+    if role.login.requires_basic_auth:
+        kwargs["http_credentials"] = {
+            "username": basic_auth_user,
+            "password": basic_auth_password,
+        }
+    url = f"{base_url}{role.login.check_path or role.login.path}"
+    try:
+        request = playwright.request.new_context(**kwargs)
+    except Exception:
+        return False
+    try:
+        resp = request.get(url, timeout=timeout_ms)
+        if not resp.ok:
+            return False
+        marker = role.login.fail_if_url_contains
+        if marker and marker in resp.url:
+            final = urlsplit(resp.url)._replace(query="", fragment="").geturl()
+            if not role.login.check_path and final.rstrip("/") == url.rstrip("/"):
+                _warn_missing_check_path(role, url)
+            return False
+        return True
+    except Exception:
+        return False
+    finally:
+        try:
+            request.dispose()
+        except Exception:
+            pass
 
 
 def _submit_login_form(page, login: Login) -> None:
@@ -109,7 +549,7 @@ def _submit_login_form(page, login: Login) -> None:
 
 def _login_and_get_storage_state(
     *,
-    playwright,
+    browser,
     base_url: str,
     role: Role,
     basic_auth_user: str,
@@ -121,77 +561,75 @@ def _login_and_get_storage_state(
 
     1 度だけ呼ばれることを想定。失敗時は ``pytest.fail`` を投げる。
 
-    AQ Critical-2 完遂: 関数全体を browser try/finally で囲み、
+    ``browser`` は pytest-playwright の session fixture をそのまま使い、
+    使い捨ての context を 1 つ開くだけにする (role ごとにブラウザを起動しない)。
+    共有のブラウザなので閉じてはならない。
+
+    AQ Critical-2 完遂: context 作成以降を try/finally で囲み、
     page.goto() / fill() / expect_navigation() / fail_if_url_contains で
     pytest.fail() が発生した場合も含め、全ての failure path で
-    browser.close() が必ず呼ばれることを保証する。
+    context.close() が必ず呼ばれることを保証する (login 用の cookie を
+    持った context を共有ブラウザに残さない)。
     pytest.fail() は内部的に例外を raise するため finally は確実に動く。
     """
-    browser = playwright.chromium.launch(headless=True)
-    try:
-        ctx_kwargs: dict[str, Any] = {
-            "ignore_https_errors": not verify_tls,
+    ctx_kwargs: dict[str, Any] = {
+        "ignore_https_errors": not verify_tls,
+    }
+    if role.login.requires_basic_auth:
+        ctx_kwargs["http_credentials"] = {
+            "username": basic_auth_user,
+            "password": basic_auth_password,
         }
-        if role.login.requires_basic_auth:
-            ctx_kwargs["http_credentials"] = {
-                "username": basic_auth_user,
-                "password": basic_auth_password,
-            }
-        context = browser.new_context(**ctx_kwargs)
+    context = browser.new_context(**ctx_kwargs)
+    try:
         context.set_default_navigation_timeout(nav_timeout_ms)
         context.set_default_timeout(nav_timeout_ms)
 
+        page = context.new_page()
+        url = f"{base_url}{role.login.path}"
         try:
-            page = context.new_page()
-            url = f"{base_url}{role.login.path}"
-            try:
-                page.goto(url, wait_until="domcontentloaded", timeout=nav_timeout_ms)
-            except Exception as exc:  # pragma: no cover - depends on remote target
-                pytest.fail(
-                    f"[ndf_role_{role.id}] login page open failed: {url} ({exc})"
-                )
-
-            for name, value in role.login.fields.items():
-                try:
-                    page.locator(f'input[name="{name}"]').fill(
-                        value, timeout=nav_timeout_ms
-                    )
-                except Exception as exc:  # pragma: no cover
-                    pytest.fail(
-                        f"[ndf_role_{role.id}] fill {name!r} failed: {exc}"
-                    )
+            page.goto(url, wait_until="domcontentloaded", timeout=nav_timeout_ms)
+        except Exception as exc:  # pragma: no cover - depends on remote target
+            pytest.fail(
+                f"[ndf_role_{role.id}] login page open failed: {url} ({exc})"
+            )
 
+        for name, value in role.login.fields.items():
             try:
-                with page.expect_navigation(
-                    wait_until="domcontentloaded", timeout=nav_timeout_ms
-                ):
-                    _submit_login_form(page, role.login)
+                page.locator(f'input[name="{name}"]').fill(
+                    value, timeout=nav_timeout_ms
+                )
             except Exception as exc:  # pragma: no cover
                 pytest.fail(
-                    f"[ndf_role_{role.id}] navigation 失敗: "
-                    f"{type(exc).__name__}: {exc}"
+                    f"[ndf_role_{role.id}] fill {name!r} failed: {exc}"
                 )
 
-            final_url = page.url
-            # Amazon Q Critical-1: fail_if_url_contains が空文字列の場合、空文字列は
-            # あらゆる文字列に含まれるため常に True になり全 login が失敗する。
-            # 空文字列 (= 未設定) の場合はチェックをスキップする。
-            if role.login.fail_if_url_contains and role.login.fail_if_url_contains in final_url:
-                pytest.fail(
-                    f"[ndf_role_{role.id}] login 失敗: "
-                    f"final_url={final_url} に '{role.login.fail_if_url_contains}' を含む"
-                )
+        try:
+            with page.expect_navigation(
+                wait_until="domcontentloaded", timeout=nav_timeout_ms
+            ):
+                _submit_login_form(page, role.login)
+        except Exception as exc:  # pragma: no cover
+            pytest.fail(
+                f"[ndf_role_{role.id}] navigation 失敗: "
+                f"{type(exc).__name__}: {exc}"
+            )
 
-            state = context.storage_state()
-            return state
-        finally:
-            try:
-                context.close()
-            except Exception:
-                pass
+        final_url = page.url
+        # Amazon Q Critical-1: fail_if_url_contains が空文字列の場合、空文字列は
+        # あらゆる文字列に含まれるため常に True になり全 login が失敗する。
+        # 空文字列 (= 未設定) の場合はチェックをスキップする。
+        if role.login.fail_if_url_contains and role.login.fail_if_url_contains in final_url:
+            pytest.fail(
+                f"[ndf_role_{role.id}] login 失敗: "
+                f"final_url={final_url} に '{role.login.fail_if_url_contains}' を含む"
+            )
+
+        state = context.storage_state()
+        return state
     finally:
         try:
-            browser.close()
+            context.close()
         except Exception:
             pass
 
@@ -223,8 +661,9 @@ def ndf_config(pytestconfig) -> Config:
             "または ./scenario.config.yaml を用意してください。"
         )
 
+    # pytest_configure で load 済ならそれを共有する (YAML を読み直さない)
     path = Path(raw_path).resolve()
-    return Config.load(path)
+    return Config.load_cached(path)
 
 
 @pytest.fixture(scope="session")
@@ -232,61 +671,272 @@ def _ndf_storage_state_cache() -> _StorageStateCache:
     return _StorageStateCache.empty()
 
 
+# ``--ndf-auth-cache <dir>`` の下に作る storage_state の置き場。
+_AUTH_CACHE_SUBDIR = "ndf-auth-cache"
+
+
+@pytest.fixture(scope="session")
+def _ndf_auth_disk_cache(pytestconfig) -> _DiskStateCache | None:
+    """``--ndf-auth-cache`` / env ``NDF_AUTH_CACHE`` 指定時のみ永続 cache を返す。"""
+    raw = pytestconfig.getoption("ndf_auth_cache", default=None) or os.environ.get(
+        "NDF_AUTH_CACHE"
+    )
+    if not raw:
+        return None
+    # 指定ディレクトリ自体 (プロジェクト直下や共有ディレクトリのこともある) の
+    # 権限は変えず、専用のサブディレクトリを 0700 で作ってそこに保存する
+    return _DiskStateCache(root=Path(raw).expanduser() / _AUTH_CACHE_SUBDIR)
+
+
+@pytest.fixture(scope="session")
+def _ndf_shared_login(tmp_path_factory) -> _SharedLogin | None:
+    """xdist worker 上でのみ、run 共通の basetemp に置く共有 login store を返す。
+
+    各 worker の basetemp (``.../pytest-N/popen-gwK``) の親は run ごとに
+    1 つで全 worker から見えるため、そこを lock と storage_state の置き場にする。
+    """
+    if not os.environ.get("PYTEST_XDIST_WORKER"):
+        return None
+    root = tmp_path_factory.getbasetemp().parent / "ndf-auth"
+    return _SharedLogin(store=_DiskStateCache(root=root))
+
+
+def _load_or_login(
+    ndf_config: Config,
+    role: Role,
+    playwright,
+    browser,
+    disk_cache: _DiskStateCache | None,
+    shared: _SharedLogin | None = None,
+    stale: dict[str, Any] | None = None,
+) -> dict[str, Any]:
+    """永続 cache (有効なもの) があればそれを、無ければ login して storage_state を返す。
+
+    ``shared`` (xdist) があれば全体を role ごとの lock 下で 1 worker だけが行う。
+    ``stale`` は session 中に無効になった state で、cache 上の同じ state は使わない。
+    """
+    fingerprint = _login_fingerprint(
+        ndf_config.base_url, role, ndf_config.basic_auth.user
+    )
+    if shared is not None:
+        return shared.get_or_login(
+            role.id,
+            fingerprint,
+            lambda: _load_or_login(ndf_config, role, playwright, browser, disk_cache, None, stale),
+            stale=stale,
+            base_url=ndf_config.base_url,
+        )
+    if disk_cache is not None:
+        state = disk_cache.load(role.id, fingerprint)
+        if state is not None and stale is not None and state == stale:
+            disk_cache.discard(role.id, fingerprint)
+            state = None
+        if state is not None:
+            if _storage_state_is_valid(
+                playwright=playwright,
+                base_url=ndf_config.base_url,
+                role=role,
+                state=state,
+                basic_auth_user=ndf_config.basic_auth.user,
+                basic_auth_password=ndf_config.basic_auth.password,
+                verify_tls=ndf_config.verify_tls,
+                timeout_ms=ndf_config.playwright.navigation_timeout_ms,
+            ):
+                return state
+            disk_cache.discard(role.id, fingerprint)
+
+    state = _login_and_get_storage_state(
+        browser=browser,
+        base_url=ndf_config.base_url,
+        role=role,
+        basic_auth_user=ndf_config.basic_auth.user,
+        basic_auth_password=ndf_config.basic_auth.password,
+        verify_tls=ndf_config.verify_tls,
+        nav_timeout_ms=ndf_config.playwright.navigation_timeout_ms,
+    )
+    if disk_cache is not None:
+        try:
+            disk_cache.store(role.id, fingerprint, state, base_url=ndf_config.base_url)
+        except OSError as exc:
+            import warnings
+
+            warnings.warn(
+                f"[ndf] auth cache 書き込み失敗 ({disk_cache.root}): {exc}",
+                stacklevel=2,
+            )
+    return state
+
+
+class _LazyBrowser:
+    """最初の ``new_context`` で初めて launch する Browser の代役。
+
+    prewarm の各 thread は永続 cache が有効なら login しないため、
+    その場合にブラウザ起動のコストを払わないようにする。
+    """
+
+    def __init__(self, launch: Callable[[], Any]) -> None:
+        self._launch = launch
+        self._browser = None
+
+    def new_context(self, **kwargs):
+        if self._browser is None:
+            self._browser = self._launch()
+        return self._browser.new_context(**kwargs)
+
+    def close(self) -> None:
+        if self._browser is not None:
+            self._browser.close()
+
+
+def _prewarm_role_states(
+    ndf_config: Config,
+    roles: list[Role],
+    *,
+    browser_name: str,
+    launch_args: dict[str, Any],
+    disk_cache: _DiskStateCache | None,
+    shared: _SharedLogin | None,
+) -> dict[str, dict[str, Any]]:
+    """``roles`` の login を thread ごとに並行実行し、成功した storage_state を返す。
+
+    sync API のオブジェクトは作成した thread 外から使えないため、各 thread が
+    自前の Playwright を起動する (ブラウザは login が必要な時だけ launch)。
+    永続 cache / xdist の共有 store は `_load_or_login` 経由でそのまま効く。
+    失敗した role は返さず、その role を使う test の遅延 login に任せる。
+
+    thread 数 (= 同時に起動するブラウザ数) は CPU 数で頭打ちにし、role が
+    多い config で CI runner を詰まらせない。
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    from playwright.sync_api import sync_playwright
+
+    def _warm(role: Role) -> dict[str, Any]:
+        with sync_playwright() as pw:
+            browser = _LazyBrowser(lambda: getattr(pw, browser_name).launch(**launch_args))
+            try:
+                return _load_or_login(ndf_config, role, pw, browser, disk_cache, shared)
+            finally:
+                browser.close()
+
+    states: dict[str, dict[str, Any]] = {}
+    workers = min(len(roles), os.cpu_count() or 4)
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ndf-prewarm") as pool:
+        futures = {role.id: pool.submit(_warm, role) for role in roles}
+        for role_id, future in futures.items():
+            try:
+                states[role_id] = future.result()
+            except (Exception, pytest.fail.Exception):
+                continue
+    return states
+
+
+@pytest.fixture(scope="session", autouse=True)
+def _ndf_prewarm_roles(request, pytestconfig) -> None:
+    """``--ndf-prewarm-roles`` 指定時、session 開始時に全 role へ並行 login する。
+
+    login 時間が最初に role を使う test に乗らず、合計も sum ではなく
+    max(login) 程度になる。config が無い場合は何もしない。
+    """
+    if not pytestconfig.getoption("ndf_prewarm_roles", default=False):
+        return
+    try:
+        ndf_config: Config = request.getfixturevalue("ndf_config")
+    except pytest.skip.Exception:
+        return
+    cache: _StorageStateCache = request.getfixturevalue("_ndf_storage_state_cache")
+    roles = [role for rid, role in ndf_config.roles.items() if cache.get(rid) is None]
+    if not roles:
+        return
+    browsers = pytestconfig.getoption("browser", default=None) or ["chromium"]
+    states = _prewarm_role_states(
+        ndf_config,
+        roles,
+        browser_name=browsers[0],
+        launch_args=request.getfixturevalue("browser_type_launch_args"),
+        disk_cache=request.getfixturevalue("_ndf_auth_disk_cache"),
+        shared=request.getfixturevalue("_ndf_shared_login"),
+    )
+    for role_id, state in states.items():
+        cache.put(role_id, state, base_url=ndf_config.base_url)
+
+
+def _watch_login_redirect(
+    context, role: Role, base_url: str, cache: _StorageStateCache, state: dict[str, Any]
+) -> None:
+    """test 中に main frame が login 画面 (``fail_if_url_contains``) へ遷移したら、
+    注入した ``state`` を cache から外す。
+
+    その test 自体は救えないが、以降の test が同じ失効 state で失敗し続けるのを防ぐ。
+    再 login は次の ``ndf_role_<id>`` の setup で行う (event handler 内では login しない)。
+    """
+    marker = role.login.fail_if_url_contains
+    if not marker:
+        return
+
+    def _on_navigated(frame) -> None:
+        url = frame.url or ""
+        if frame.parent_frame is not None or marker not in url:
+            return
+        if _same_origin(url, base_url) and cache.states.get(role.id) is state:
+            cache.invalidate(role.id)
+
+    def _watch(page) -> None:
+        page.on("framenavigated", _on_navigated)
+
+    for page in context.pages:
+        _watch(page)
+    context.on("page", _watch)
+
+
 def _make_role_fixture(role_id: str) -> Callable:
     """role_id ごとに ``ndf_role_<id>`` fixture の実装関数を生成する。"""
 
     def _fixture(
         ndf_config: Config,
         playwright,
+        browser,
         context,
         _ndf_storage_state_cache: _StorageStateCache,
+        _ndf_auth_disk_cache: _DiskStateCache | None,
+        _ndf_shared_login: _SharedLogin | None,
     ) -> Role:
         """login 済の storage_state を ``context`` に注入し、Role を返す。
 
-        - ``playwright`` / ``context`` は ``pytest-playwright`` 提供
+        - ``playwright`` / ``browser`` / ``context`` は ``pytest-playwright`` 提供
+          (login は session の ``browser`` 上の使い捨て context で行う)
         - 既に同 role の storage_state が cache 済なら login をスキップ
+        - ``--ndf-auth-cache`` 指定時は前回 session の storage_state も再利用
+        - xdist では他の worker が login 済ならその storage_state を再利用
+        - cookie の期限切れ、または test 中に login 画面へ redirect された role は
+          次にこの fixture を使う test の前に 1 回だけ再 login する
         """
         role = ndf_config.role(role_id)
 
         state = _ndf_storage_state_cache.get(role_id)
         if state is None:
-            state = _login_and_get_storage_state(
-                playwright=playwright,
-                base_url=ndf_config.base_url,
-                role=role,
-                basic_auth_user=ndf_config.basic_auth.user,
-                basic_auth_password=ndf_config.basic_auth.password,
-                verify_tls=ndf_config.verify_tls,
-                nav_timeout_ms=ndf_config.playwright.navigation_timeout_ms,
+            state = _load_or_login(
+                ndf_config,
+                role,
+                playwright,
+                browser,
+                _ndf_auth_disk_cache,
+                _ndf_shared_login,
+                stale=_ndf_storage_state_cache.stale.get(role_id),
             )
-            _ndf_storage_state_cache.put(role_id, state)
+            _ndf_storage_state_cache.put(role_id, state, base_url=ndf_config.base_url)
 
         # cookies / origins (localStorage 等) を新しい context に注入する。
         cookies = state.get("cookies") or []
         if cookies:
             context.add_cookies(cookies)
-        # storage_state に含まれる広告/計測タグ等の third-party origin に対して
-        # 不用意に goto するのを避けるため、base_url と同一 origin のみ復元する。
-        for origin in state.get("origins") or []:
-            url = origin.get("origin")
-            items = origin.get("localStorage") or []
-            if not url or not items:
-                continue
-            if not _same_origin(url, ndf_config.base_url):
-                continue
-            try:
-                page = context.new_page()
-                page.goto(url, wait_until="domcontentloaded")
-                for it in items:
-                    page.evaluate(
-                        "([k, v]) => window.localStorage.setItem(k, v)",
-                        [it.get("name"), it.get("value")],
-                    )
-                page.close()
-            except Exception:
-                # localStorage 注入失敗は致命的ではない (cookie ベースの認証なら OK)。
-                pass
+        # localStorage は base_url と同一 origin のみ、init script 1 本で
+        # document の script より先に埋める (restore のための navigation は行わない)。
+        script = _local_storage_init_script(state, ndf_config.base_url)
+        if script is not None:
+            context.add_init_script(script)
 
+        _watch_login_redirect(context, role, ndf_config.base_url, _ndf_storage_state_cache, state)
         return role
 
     _fixture.__name__ = f"ndf_role_{role_id}"
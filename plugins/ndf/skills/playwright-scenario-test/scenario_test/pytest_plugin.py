@@ -6,6 +6,8 @@ CLI options:
 - ``--ndf-no-evidence``: evidence 収集を OFF
 - ``--ndf-hud``: HUD overlay を ON
 - ``--ndf-drive-folder <id>``: Drive 連携
+- ``--ndf-auth-cache <dir>``: role の login 状態を session をまたいで再利用
+- ``--ndf-prewarm-roles``: session 開始時に全 role の login を並行実行
 
 markers:
 - ``page_role(*roles)``: a11y / CWV autouse の判定材料
@@ -78,6 +80,26 @@ def pytest_addoption(parser: pytest.Parser) -> None:
             " (Codex Minor 8)"
         ),
     )
+    group.addoption(
+        "--ndf-auth-cache",
+        action="store",
+        default=None,
+        help=(
+            "role ごとの login 済 storage_state を保存・再利用するディレクトリ "
+            "(env NDF_AUTH_CACHE も可)。cookie の期限内かつ 1 回の GET で"
+            "ログイン状態を確認できた場合は login を省略する。"
+            "Cookie / localStorage を含むため 0600 で保存される。"
+        ),
+    )
+    group.addoption(
+        "--ndf-prewarm-roles",
+        action="store_true",
+        default=False,
+        help=(
+            "session 開始時に config の全 role へ並行して login する "
+            "(最初に role を使う test の所要時間から login を除く)"
+        ),
+    )
 
 
 # ---------------------------------------------------------------------------
@@ -124,6 +146,24 @@ def pytest_configure(config: pytest.Config) -> None:
         config._ndf_config = cfg  # type: ignore[attr-defined]
 
 
+@pytest.hookimpl(optionalhook=True)
+def pytest_configure_node(node) -> None:
+    """xdist controller: load 済の Config を snapshot として各 worker に渡す。
+
+    worker は ``_try_load_config_silently`` でファイル内容 / 環境変数のキーが
+    一致することを確かめてから復元するため、YAML の parse と env 展開を
+    worker ごとに繰り返さない。
+    """
+    cfg = getattr(node.config, "_ndf_config", None)
+    if cfg is None:
+        return
+    from scenario_test.config import Config
+
+    snapshot = Config.snapshot(cfg.config_path)
+    if snapshot is not None:
+        node.workerinput["ndf_config_snapshot"] = snapshot
+
+
 # ---------------------------------------------------------------------------
 # Reports / hooks
 # ---------------------------------------------------------------------------
@@ -435,10 +475,14 @@ def _try_load_config_silently(config: pytest.Config) -> Any | None:
     if not raw_path:
         return None
 
+    # xdist worker は controller が渡した snapshot から復元する (YAML を parse しない)
+    workerinput = getattr(config, "workerinput", None) or {}
     try:
         from scenario_test.config import Config
 
-        return Config.load(Path(raw_path).resolve())
+        return Config.load_cached(
+            Path(raw_path).resolve(), snapshot=workerinput.get("ndf_config_snapshot")
+        )
     except Exception as exc:  # pragma: no cover - depends on user config
         import warnings
 
@@ -6,8 +6,9 @@ _login_and_get_storage_state を monkeypatch で fake し、Playwright 実機不
 を確認する (Codex Major 5)。
 
 Amazon Q Critical-1: fail_if_url_contains が空文字列の場合に全 login が失敗しない
-Amazon Q Critical-2: context.close() 例外で browser.close() がスキップされない
-の回帰テストも含む。
+Amazon Q Critical-2: 全ての failure path で login 用 context が close される
+の回帰テストも含む。login は pytest-playwright の session ``browser`` を共有する
+ため、browser 自体は close されない (起動もしない) ことも確認する。
 """
 
 from __future__ import annotations
@@ -88,12 +89,9 @@ def test_fail_if_url_contains_empty_string_does_not_fail(monkeypatch):
     fake_browser = MagicMock()
     fake_browser.new_context.return_value = fake_context
 
-    fake_playwright = MagicMock()
-    fake_playwright.chromium.launch.return_value = fake_browser
-
     # pytest.fail が呼ばれないことを確認
     result = _login_and_get_storage_state(
-        playwright=fake_playwright,
+        browser=fake_browser,
         base_url="https://example.com",
         role=role,
         basic_auth_user="",
@@ -116,12 +114,9 @@ def test_fail_if_url_contains_non_empty_triggers_on_match(monkeypatch):
     fake_browser = MagicMock()
     fake_browser.new_context.return_value = fake_context
 
-    fake_playwright = MagicMock()
-    fake_playwright.chromium.launch.return_value = fake_browser
-
     with pytest.raises(pytest.fail.Exception):
         _login_and_get_storage_state(
-            playwright=fake_playwright,
+            browser=fake_browser,
             base_url="https://example.com",
             role=role,
             basic_auth_user="",
@@ -131,16 +126,57 @@ def test_fail_if_url_contains_non_empty_triggers_on_match(monkeypatch):
 
 
 # ---------------------------------------------------------------------------
-# Amazon Q Critical-2: browser.close() リソースリーク回帰テスト
+# Amazon Q Critical-2: login 用 context のリソースリーク回帰テスト
 # ---------------------------------------------------------------------------
 
 
+def test_login_uses_shared_browser_with_context_options(monkeypatch):
+    """login は渡された session ``browser`` 上に context を 1 つ開くだけで、
+    http_credentials / ignore_https_errors をその context に渡すこと。"""
+    role = Role(
+        id="admin",
+        label="Admin",
+        login=Login(
+            path="/admin/login",
+            requires_basic_auth=True,
+            fields={"username": "u", "password": "p"},
+            fail_if_url_contains="",
+        ),
+    )
+    fake_page = MagicMock()
+    fake_page.url = "https://example.com/admin/"
+    fake_context = MagicMock()
+    fake_context.new_page.return_value = fake_page
+    fake_context.storage_state.return_value = {"cookies": [], "origins": []}
+    fake_browser = MagicMock()
+    fake_browser.new_context.return_value = fake_context
+
+    _login_and_get_storage_state(
+        browser=fake_browser,
+        base_url="https://example.com",
+        role=role,
+        basic_auth_user="ba",
+        basic_auth_password="secret",
+        verify_tls=False,
+    )
+
+    fake_browser.new_context.assert_called_once_with(
+        ignore_https_errors=True,
+        http_credentials={"username": "ba", "password": "secret"},
+    )
+    fake_page.goto.assert_called_once()
+    assert fake_page.goto.call_args.args[0] == "https://example.com/admin/login"
+    fake_context.close.assert_called_once()
+    # 共有 browser は閉じない
+    fake_browser.close.assert_not_called()
+
+
 def test_browser_closed_even_when_context_close_raises(monkeypatch):
-    """context.close() が例外を投げても browser.close() が必ず呼ばれること (Amazon Q Critical-2)。
+    """context.close() が例外を投げても login が成功扱いになること (Amazon Q Critical-2)。
 
-    新実装では context.close() の例外は finally 内で握りつぶされるため、
+    context.close() の例外は finally 内で握りつぶされるため、
     呼び出し元には伝播しない。storage_state は正常に返ること、
-    かつ browser.close() が呼ばれることを検証する。
+    かつ共有 browser は close されないことを検証する。
     """
     role = _make_role(fail_if_url_contains="")
 
@@ -155,13 +191,10 @@ def test_browser_closed_even_when_context_close_raises(monkeypatch):
     fake_browser = MagicMock()
     fake_browser.new_context.return_value = fake_context
 
-    fake_playwright = MagicMock()
-    fake_playwright.chromium.launch.return_value = fake_browser
-
     # context.close() が例外を投げても、新実装では握りつぶされて
     # storage_state が正常に返ること
     result = _login_and_get_storage_state(
-        playwright=fake_playwright,
+        browser=fake_browser,
         base_url="https://example.com",
         role=role,
         basic_auth_user="",
@@ -170,16 +203,17 @@ def test_browser_closed_even_when_context_close_raises(monkeypatch):
     )
     assert result == {"cookies": [], "origins": []}
 
-    # browser.close() が呼ばれていること
-    fake_browser.close.assert_called_once()
+    fake_context.close.assert_called_once()
+    # session の browser は pytest-playwright の持ち物なので close しない
+    fake_browser.close.assert_not_called()
 
 
 def test_browser_closed_when_goto_fails(monkeypatch):
-    """page.goto() が失敗して pytest.fail() が呼ばれても browser.close() されること (AQ Critical-2 完遂)。
+    """page.goto() が失敗して pytest.fail() が呼ばれても context.close() されること (AQ Critical-2 完遂)。
 
     goto / fill / expect_navigation / fail_if_url_contains の失敗は
-    いずれも pytest.fail() を raise し、旧実装では末尾 finally に到達しなかった。
-    新実装では関数全体を browser try/finally で囲んでいるため browser.close() が保証される。
+    いずれも pytest.fail() を raise する。context 作成以降を try/finally で
+    囲んでいるため context.close() が保証される。
     """
     role = _make_role(fail_if_url_contains="")
 
@@ -193,13 +227,10 @@ def test_browser_closed_when_goto_fails(monkeypatch):
     fake_browser = MagicMock()
     fake_browser.new_context.return_value = fake_context
 
-    fake_playwright = MagicMock()
-    fake_playwright.chromium.launch.return_value = fake_browser
-
     # pytest.fail() が発生する (goto 失敗)
     with pytest.raises(pytest.fail.Exception):
         _login_and_get_storage_state(
-            playwright=fake_playwright,
+            browser=fake_browser,
             base_url="https://example.com",
             role=role,
             basic_auth_user="",
@@ -207,12 +238,12 @@ def test_browser_closed_when_goto_fails(monkeypatch):
             verify_tls=False,
         )
 
-    # browser.close() が呼ばれていること
-    fake_browser.close.assert_called_once()
+    fake_context.close.assert_called_once()
+    fake_browser.close.assert_not_called()
 
 
 def test_browser_closed_when_fail_if_url_contains_triggers(monkeypatch):
-    """fail_if_url_contains でログイン失敗判定しても browser.close() されること (AQ Critical-2 完遂)。"""
+    """fail_if_url_contains でログイン失敗判定しても context.close() されること (AQ Critical-2 完遂)。"""
     role = _make_role(fail_if_url_contains="/login")
 
     fake_page = MagicMock()
@@ -225,12 +256,9 @@ def test_browser_closed_when_fail_if_url_contains_triggers(monkeypatch):
     fake_browser = MagicMock()
     fake_browser.new_context.return_value = fake_context
 
-    fake_playwright = MagicMock()
-    fake_playwright.chromium.launch.return_value = fake_browser
-
     with pytest.raises(pytest.fail.Exception):
         _login_and_get_storage_state(
-            playwright=fake_playwright,
+            browser=fake_browser,
             base_url="https://example.com",
             role=role,
             basic_auth_user="",
@@ -238,5 +266,6 @@ def test_browser_closed_when_fail_if_url_contains_triggers(monkeypatch):
             verify_tls=False,
         )
 
-    # fail_if_url_contains でも browser.close() が呼ばれること
-    fake_browser.close.assert_called_once()
+    # fail_if_url_contains でも context.close() が呼ばれること
+    fake_context.close.assert_called_once()
+    fake_browser.close.assert_not_called()
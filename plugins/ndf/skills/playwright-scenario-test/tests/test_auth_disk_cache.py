@@ -0,0 +1,332 @@
+"""``--ndf-auth-cache`` (session をまたぐ永続 storage_state cache) の検証。
+
+- ``_DiskStateCache``: 保存 → 読み込み、0600 / 0700、期限切れ・破損・
+  権限の緩いファイルの無視、既存の共有ディレクトリは chmod せず保存しない
+- ``_state_expires_at``: cookie の expires からの有効期限計算
+- ``_login_fingerprint``: login 入力値が変わればキーが変わること
+- ``_storage_state_is_valid``: 1 回の GET による再利用可否判定 (Playwright 実機不要)
+- pytester: 2 回目の session で login が省略されること
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import stat
+import textwrap
+import warnings
+from pathlib import Path
+from unittest.mock import MagicMock
+
+import pytest
+
+from scenario_test.config import Login, Role
+from scenario_test.fixtures import auth as auth_module
+from scenario_test.fixtures.auth import (
+    _DEFAULT_STATE_TTL_S,
+    _EXPIRY_MARGIN_S,
+    _DiskStateCache,
+    _login_fingerprint,
+    _state_expires_at,
+    _storage_state_is_valid,
+)
+
+posix_only = pytest.mark.skipif(os.name != "posix", reason="POSIX permission bits")
+
+
+def _role(
+    fields: dict[str, str] | None = None,
+    fail_if_url_contains: str = "/login",
+    check_path: str = "",
+) -> Role:
+    return Role(
+        id="admin",
+        label="管理者",
+        login=Login(
+            path="/login",
+            requires_basic_auth=False,
+            fields=fields or {"email": "a@example.com", "password": "p"},
+            fail_if_url_contains=fail_if_url_contains,
+            check_path=check_path,
+        ),
+    )
+
+
+_STATE = {
+    "cookies": [
+        {"name": "sid", "value": "abc", "expires": 2_000_000_000},
+        {"name": "pref", "value": "x", "expires": 1_900_000_000},
+        {"name": "tmp", "value": "y", "expires": -1},
+    ],
+    "origins": [],
+}
+
+
+# ---------------------------------------------------------------------------
+# 有効期限 / キー
+# ---------------------------------------------------------------------------
+
+
+def test_expires_at_uses_earliest_cookie_expiry():
+    assert _state_expires_at(_STATE, saved_at=0, default_ttl_s=10) == (
+        1_900_000_000 - _EXPIRY_MARGIN_S
+    )
+
+
+def test_expires_at_falls_back_to_ttl_for_session_cookies():
+    state = {"cookies": [{"name": "sid", "value": "v", "expires": -1}]}
+    assert _state_expires_at(state, saved_at=100.0, default_ttl_s=50) == 150.0
+    assert _state_expires_at({}, saved_at=100.0, default_ttl_s=50) == 150.0
+
+
+_NOW = 1_700_000_000.0
+_MIXED = {
+    "cookies": [
+        {"name": "sid", "value": "s", "domain": "example.com", "expires": _NOW + 24 * 3600},
+        # 認証と無関係な短命 cookie (Google Analytics の _gat は 60 秒)
+        {"name": "_gat", "value": "1", "domain": ".example.com", "expires": _NOW + 60},
+        # 第三者 domain の cookie は base_url に送られない
+        {"name": "ads", "value": "a", "domain": ".ads.example.net", "expires": _NOW + 3600},
+    ],
+    "origins": [],
+}
+
+
+def test_expires_at_ignores_short_lived_and_third_party_cookies():
+    assert _state_expires_at(
+        _MIXED, saved_at=_NOW, default_ttl_s=10, base_url="https://app.example.com"
+    ) == _NOW + 24 * 3600 - _EXPIRY_MARGIN_S
+
+
+def test_disk_cache_hits_with_mixed_cookie_jar(tmp_path: Path):
+    cache = _DiskStateCache(root=tmp_path / "auth")
+    cache.store("admin", "f" * 64, _MIXED, now=_NOW, base_url="https://example.com")
+    # _gat の期限 (60 秒後) を過ぎても sid が有効な間は hit する
+    assert cache.load("admin", "f" * 64, now=_NOW + 3600) == _MIXED
+    assert cache.load("admin", "f" * 64, now=_NOW + 24 * 3600) is None
+
+
+def test_fingerprint_changes_with_login_inputs():
+    base = _login_fingerprint("https://example.com", _role(), "")
+    assert base == _login_fingerprint("https://example.com", _role(), "")
+    assert base != _login_fingerprint("https://staging.example.com", _role(), "")
+    assert base != _login_fingerprint(
+        "https://example.com", _role(fields={"email": "a@example.com", "password": "q"}), ""
+    )
+
+
+# ---------------------------------------------------------------------------
+# _DiskStateCache
+# ---------------------------------------------------------------------------
+
+
+def test_disk_cache_roundtrip(tmp_path: Path):
+    cache = _DiskStateCache(root=tmp_path / "auth")
+    cache.store("admin", "f" * 64, _STATE, now=1_000.0)
+    assert cache.load("admin", "f" * 64, now=2_000.0) == _STATE
+    # 別 fingerprint (= ログイン入力値が変わった) は miss
+    assert cache.load("admin", "e" * 64, now=2_000.0) is None
+    # パスワード等はファイル名に含まれない
+    assert cache.path_for("admin", "f" * 64).name == f"admin-{'f' * 32}.json"
+
+
+@posix_only
+def test_disk_cache_restricts_permissions(tmp_path: Path):
+    cache = _DiskStateCache(root=tmp_path / "auth")
+    cache.store("admin", "f" * 64, _STATE)
+    assert stat.S_IMODE(cache.root.stat().st_mode) == 0o700
+    assert stat.S_IMODE(cache.path_for("admin", "f" * 64).stat().st_mode) == 0o600
+
+
+@posix_only
+def test_disk_cache_leaves_existing_shared_dir_unchanged(tmp_path: Path, monkeypatch):
+    monkeypatch.setattr(auth_module, "_warned_cache_root", set())
+    shared = tmp_path / "shared"
+    shared.mkdir()
+    os.chmod(shared, 0o755)
+    cache = _DiskStateCache(root=shared)
+    with pytest.warns(UserWarning, match="chmod 700"):
+        cache.store("admin", "f" * 64, _STATE)
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        cache.store("admin", "f" * 64, _STATE)
+    assert stat.S_IMODE(shared.stat().st_mode) == 0o755
+    assert list(shared.iterdir()) == []
+
+
+@posix_only
+def test_disk_cache_ignores_group_readable_file(tmp_path: Path):
+    cache = _DiskStateCache(root=tmp_path / "auth")
+    cache.store("admin", "f" * 64, _STATE, now=1_000.0)
+    os.chmod(cache.path_for("admin", "f" * 64), 0o644)
+    assert cache.load("admin", "f" * 64, now=2_000.0) is None
+
+
+def test_disk_cache_expired_entry_is_miss(tmp_path: Path):
+    cache = _DiskStateCache(root=tmp_path / "auth")
+    cache.store("admin", "f" * 64, _STATE, now=1_000.0)
+    assert cache.load("admin", "f" * 64, now=1_900_000_000) is None
+
+    session_only = {"cookies": [{"name": "sid", "value": "v", "expires": -1}]}
+    cache.store("user", "f" * 64, session_only, now=1_000.0)
+    assert cache.load("user", "f" * 64, now=1_000.0 + _DEFAULT_STATE_TTL_S - 1) is not None
+    assert cache.load("user", "f" * 64, now=1_000.0 + _DEFAULT_STATE_TTL_S) is None
+
+
+def test_disk_cache_corrupt_file_is_miss(tmp_path: Path):
+    cache = _DiskStateCache(root=tmp_path / "auth")
+    cache.store("admin", "f" * 64, _STATE)
+    cache.path_for("admin", "f" * 64).write_text("{not json", encoding="utf-8")
+    assert cache.load("admin", "f" * 64) is None
+    cache.discard("admin", "f" * 64)
+    assert not cache.path_for("admin", "f" * 64).exists()
+
+
+# ---------------------------------------------------------------------------
+# _storage_state_is_valid
+# ---------------------------------------------------------------------------
+
+
+def _fake_playwright(url: str = "https://example.com/home", ok: bool = True, exc=None):
+    resp = MagicMock()
+    resp.url = url
+    resp.ok = ok
+    request = MagicMock()
+    if exc is not None:
+        request.get.side_effect = exc
+    else:
+        request.get.return_value = resp
+    pw = MagicMock()
+    pw.request.new_context.return_value = request
+    return pw, request
+
+
+def _check(pw, role: Role) -> bool:
+    return _storage_state_is_valid(
+        playwright=pw,
+        base_url="https://example.com",
+        role=role,
+        state=_STATE,
+        basic_auth_user="",
+        basic_auth_password="",
+        verify_tls=False,
+    )
+
+
+def test_valid_when_redirected_away_from_login():
+    pw, request = _fake_playwright(url="https://example.com/dashboard")
+    assert _check(pw, _role()) is True
+    request.get.assert_called_once()
+    assert request.get.call_args.args[0] == "https://example.com/login"
+    assert pw.request.new_context.call_args.kwargs["storage_state"] == _STATE
+    request.dispose.assert_called_once()
+
+
+def test_invalid_when_final_url_is_login_page():
+    pw, request = _fake_playwright(url="https://example.com/login?next=/")
+    assert _check(pw, _role(check_path="/admin/")) is False
+    assert request.get.call_args.args[0] == "https://example.com/admin/"
+    request.dispose.assert_called_once()
+
+
+def test_warns_once_when_login_page_is_not_redirected(monkeypatch):
+    monkeypatch.setattr(auth_module, "_warned_check_path", set())
+    pw, _ = _fake_playwright(url="https://example.com/login?next=%2F")
+    with pytest.warns(UserWarning, match="check_path"):
+        assert _check(pw, _role()) is False
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        assert _check(pw, _role()) is False
+        # check_path 指定時 / login 画面から redirect された場合は警告しない
+        monkeypatch.setattr(auth_module, "_warned_check_path", set())
+        pw, _ = _fake_playwright(url="https://example.com/login")
+        assert _check(pw, _role(check_path="/admin/")) is False
+        pw, _ = _fake_playwright(url="https://example.com/login/expired")
+        assert _check(pw, _role()) is False
+
+
+def test_invalid_on_error_status_or_exception():
+    pw, _ = _fake_playwright(ok=False)
+    assert _check(pw, _role()) is False
+    pw, request = _fake_playwright(exc=RuntimeError("connection refused"))
+    assert _check(pw, _role()) is False
+    request.dispose.assert_called_once()
+
+
+# ---------------------------------------------------------------------------
+# pytester: 2 回目の session は login しない
+# ---------------------------------------------------------------------------
+
+
+def test_second_session_reuses_disk_cache(pytester, tmp_path: Path):
+    cfg_path = tmp_path / "scenario.config.yaml"
+    cfg_path.write_text(
+        textwrap.dedent(
+            """
+            target:
+              base_url: https://example.com
+            roles:
+              admin:
+                label: 管理者
+                login:
+                  path: /login
+                  requires_basic_auth: false
+                  fail_if_url_contains: /login
+                  fields:
+                    email: admin@example.com
+                    password: pass
+            """
+        ).strip()
+        + "\n",
+        encoding="utf-8",
+    )
+    log = tmp_path / "logins.txt"
+    pytester.makeconftest(
+        textwrap.dedent(
+            f"""
+            from unittest.mock import MagicMock
+            import pytest
+            import scenario_test.fixtures.auth as m
+
+            def _fake_login(**kwargs):
+                with open({str(log)!r}, "a") as fp:
+                    fp.write(kwargs["role"].id + "\\n")
+                return {{"cookies": [{{"name": "sid", "value": "v", "expires": -1}}], "origins": []}}
+
+            @pytest.fixture(scope="session", autouse=True)
+            def _patch_login():
+                orig = (m._login_and_get_storage_state, m._storage_state_is_valid)
+                m._login_and_get_storage_state = _fake_login
+                m._storage_state_is_valid = lambda **kwargs: True
+                yield
+                m._login_and_get_storage_state, m._storage_state_is_valid = orig
+
+            @pytest.fixture(scope="session")
+            def browser():
+                return MagicMock()
+
+            @pytest.fixture()
+            def context():
+                return MagicMock()
+            """
+        )
+    )
+    pytester.makepyfile(
+        """
+        def test_admin(ndf_role_admin, context):
+            context.add_cookies.assert_called_once()
+        """
+    )
+    # 既存の (group / other から読める) ディレクトリを指定しても権限は変えず、
+    # 専用のサブディレクトリに保存する
+    cache_dir = tmp_path / "auth-cache"
+    cache_dir.mkdir()
+    os.chmod(cache_dir, 0o755)
+    args = ("-p", "no:cacheprovider", f"--ndf-config={cfg_path}", f"--ndf-auth-cache={cache_dir}")
+    pytester.runpytest(*args).assert_outcomes(passed=1)
+    pytester.runpytest(*args).assert_outcomes(passed=1)
+    assert log.read_text().splitlines() == ["admin"]
+    assert stat.S_IMODE(cache_dir.stat().st_mode) == 0o755
+    assert stat.S_IMODE((cache_dir / "ndf-auth-cache").stat().st_mode) == 0o700
+    [saved] = list((cache_dir / "ndf-auth-cache").glob("admin-*.json"))
+    assert json.loads(saved.read_text())["state"]["cookies"][0]["name"] == "sid"
@@ -0,0 +1,133 @@
+"""``--ndf-prewarm-roles`` (session 開始時の並行 login) の検証。
+
+- ``_LazyBrowser``: login が不要ならブラウザを launch しない
+- thread 数は CPU 数で頭打ち
+- pytester: 全 role の login が並行に走り、test 本体の前に済んでいること
+"""
+
+from __future__ import annotations
+
+import concurrent.futures
+import textwrap
+from pathlib import Path
+from unittest.mock import MagicMock
+
+from scenario_test.config import Role
+from scenario_test.fixtures import auth as auth_module
+from scenario_test.fixtures.auth import _LazyBrowser
+
+
+def test_lazy_browser_launches_on_first_context_only():
+    launch = MagicMock()
+    browser = _LazyBrowser(launch)
+    browser.close()
+    launch.assert_not_called()
+
+    browser.new_context(ignore_https_errors=True)
+    browser.new_context()
+    launch.assert_called_once()
+    assert launch.return_value.new_context.call_count == 2
+    browser.close()
+    launch.return_value.close.assert_called_once()
+
+
+def test_prewarm_pool_is_capped_by_cpu_count(monkeypatch):
+    pools: list[int] = []
+    orig = concurrent.futures.ThreadPoolExecutor
+
+    def _recording_pool(max_workers, **kwargs):
+        pools.append(max_workers)
+        return orig(max_workers=max_workers, **kwargs)
+
+    monkeypatch.setattr(concurrent.futures, "ThreadPoolExecutor", _recording_pool)
+    monkeypatch.setattr(auth_module.os, "cpu_count", lambda: 2)
+    monkeypatch.setattr("playwright.sync_api.sync_playwright", MagicMock())
+    monkeypatch.setattr(auth_module, "_load_or_login", lambda *a: {"cookies": [], "origins": []})
+    roles = [MagicMock(spec=Role, id=f"r{i}") for i in range(5)]
+    states = auth_module._prewarm_role_states(
+        MagicMock(), roles, browser_name="chromium", launch_args={}, disk_cache=None, shared=None
+    )
+    assert pools == [2]
+    assert sorted(states) == [f"r{i}" for i in range(5)]
+
+
+def _write_config(path: Path) -> None:
+    roles = "".join(
+        textwrap.dedent(
+            f"""
+              {rid}:
+                label: {rid}
+                login:
+                  path: /login
+                  requires_basic_auth: false
+                  fail_if_url_contains: /login
+                  fields:
+                    email: {rid}@example.com
+                    password: pass
+            """
+        )
+        for rid in ("admin", "editor", "viewer")
+    )
+    path.write_text(
+        "target:\n  base_url: https://example.com\nroles:" + textwrap.indent(roles, "  "),
+        encoding="utf-8",
+    )
+
+
+def test_prewarm_logs_in_all_roles_concurrently(pytester, tmp_path: Path):
+    cfg_path = tmp_path / "scenario.config.yaml"
+    _write_config(cfg_path)
+    log = tmp_path / "logins.txt"
+    pytester.makeconftest(
+        textwrap.dedent(
+            f"""
+            import threading
+            from unittest.mock import MagicMock
+            import pytest
+            import scenario_test.fixtures.auth as m
+
+            # 3 role の login が同時に走らないと揃わない (直列なら timeout で失敗)
+            _all_started = threading.Barrier(3, timeout=10)
+
+            def _fake_login(**kwargs):
+                _all_started.wait()
+                with open({str(log)!r}, "a") as fp:
+                    fp.write(kwargs["role"].id + "\\n")
+                return {{"cookies": [{{"name": "sid", "value": kwargs["role"].id}}], "origins": []}}
+
+            # prewarm は plugin の autouse fixture で conftest の fixture より先に走るため、
+            # configure 時点で差し替える
+            # 3 thread 揃うよう CPU 数の上限も固定する
+            def pytest_configure(config):
+                config._ndf_orig = (m._login_and_get_storage_state, m.os.cpu_count)
+                m._login_and_get_storage_state = _fake_login
+                m.os.cpu_count = lambda: 8
+
+            def pytest_unconfigure(config):
+                m._login_and_get_storage_state, m.os.cpu_count = config._ndf_orig
+
+            @pytest.fixture(scope="session")
+            def browser():
+                return MagicMock()
+
+            @pytest.fixture()
+            def context():
+                return MagicMock()
+            """
+        )
+    )
+    pytester.makepyfile(
+        f"""
+        def test_admin(ndf_role_admin, context):
+            assert context.add_cookies.call_args.args[0][0]["value"] == "admin"
+            # 使っていない role も含めて test 本体の前に login 済
+            with open({str(log)!r}) as fp:
+                assert sorted(fp.read().split()) == ["admin", "editor", "viewer"]
+
+        def test_viewer(ndf_role_viewer, context):
+            assert context.add_cookies.call_args.args[0][0]["value"] == "viewer"
+        """
+    )
+    res = pytester.runpytest("-p", "no:cacheprovider", f"--ndf-config={cfg_path}", "--ndf-prewarm-roles")
+    res.assert_outcomes(passed=2)
+    assert sorted(log.read_text().split()) == ["admin", "editor", "viewer"]
@@ -0,0 +1,216 @@
+"""session 途中の認証失効 (cookie 期限切れ / login 画面への redirect) からの再 login 検証。
+
+- ``_StorageStateCache``: cookie の expires を過ぎた entry は返さず stale に残す
+  (第三者 / 短命 cookie の期限は見ない)
+- ``_SharedLogin``: stale と同じ state しか無ければ再 login、更新済みならそれを使う
+- ``ndf_role_<id>``: redirect 検知で無効化し、次の setup で 1 回だけ再 login
+"""
+
+from __future__ import annotations
+
+import textwrap
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+from scenario_test.config import Config
+from scenario_test.fixtures import auth as auth_module
+from scenario_test.fixtures.auth import (
+    _EXPIRY_MARGIN_S,
+    _DiskStateCache,
+    _SharedLogin,
+    _StorageStateCache,
+    _make_role_fixture,
+)
+
+_OLD = {"cookies": [{"name": "sid", "value": "old", "expires": 1_000_000}], "origins": []}
+_NEW = {"cookies": [{"name": "sid", "value": "new", "expires": -1}], "origins": []}
+
+
+# ---------------------------------------------------------------------------
+# _StorageStateCache
+# ---------------------------------------------------------------------------
+
+
+def test_cache_expires_with_cookie():
+    cache = _StorageStateCache.empty()
+    cache.put("admin", _OLD, now=0)
+    assert cache.get("admin", now=1_000_000 - _EXPIRY_MARGIN_S - 1) is _OLD
+    assert cache.get("admin", now=1_000_000 - _EXPIRY_MARGIN_S) is None
+    assert cache.stale["admin"] is _OLD
+
+    cache.put("admin", _NEW, now=0)
+    assert "admin" not in cache.stale
+    # session cookie のみなら session 中は失効しない
+    assert cache.get("admin", now=10**12) is _NEW
+
+
+def test_cache_ignores_short_lived_and_third_party_cookies():
+    day = 24 * 3600
+    state = {
+        "cookies": [
+            {"name": "sid", "value": "s", "domain": "example.com", "expires": 1_000_000 + day},
+            {"name": "_gat", "value": "1", "domain": ".example.com", "expires": 1_000_000 + 60},
+            {"name": "ads", "value": "x", "domain": ".ads.example.net", "expires": 1_000_000 + 600},
+        ],
+        "origins": [],
+    }
+    cache = _StorageStateCache.empty()
+    cache.put("admin", state, now=1_000_000, base_url="https://example.com")
+    # _gat (60 秒) / 第三者 cookie の期限を過ぎても、auth cookie が有効なら使い続ける
+    assert cache.get("admin", now=1_000_000 + 3600) is state
+    assert cache.get("admin", now=1_000_000 + day - _EXPIRY_MARGIN_S) is None
+
+
+# ---------------------------------------------------------------------------
+# _SharedLogin (xdist)
+# ---------------------------------------------------------------------------
+
+
+def test_shared_relogin_only_when_store_still_stale(tmp_path: Path):
+    shared = _SharedLogin(store=_DiskStateCache(root=tmp_path / "ndf-auth"))
+    shared.store.store("admin", "f" * 64, _NEW)
+    login = MagicMock(return_value={"cookies": [{"name": "sid", "value": "newer"}]})
+
+    # 他の worker が既に更新済み (store != stale) → login しない
+    assert shared.get_or_login("admin", "f" * 64, login, stale=_OLD) == _NEW
+    login.assert_not_called()
+
+    # store の中身が自分の失効 state と同じ → 1 回だけ再 login して store を更新
+    refreshed = shared.get_or_login("admin", "f" * 64, login, stale=_NEW)
+    assert refreshed == login.return_value
+    assert shared.get_or_login("admin", "f" * 64, login, stale=_NEW) == refreshed
+    login.assert_called_once()
+
+
+# ---------------------------------------------------------------------------
+# ndf_role_<id>: redirect 検知 → 次の setup で再 login
+# ---------------------------------------------------------------------------
+
+
+def _config(tmp_path: Path) -> Config:
+    cfg = tmp_path / "scenario.config.yaml"
+    cfg.write_text(
+        textwrap.dedent(
+            """
+            target:
+              base_url: https://example.com
+            roles:
+              admin:
+                label: 管理者
+                login:
+                  path: /login
+                  requires_basic_auth: false
+                  fail_if_url_contains: /login
+                  fields:
+                    email: a@example.com
+                    password: p
+            """
+        ).strip()
+        + "\n",
+        encoding="utf-8",
+    )
+    return Config.load(cfg)
+
+
+class _FakePage:
+    def __init__(self) -> None:
+        self.handlers: list = []
+
+    def on(self, event: str, handler) -> None:
+        assert event == "framenavigated"
+        self.handlers.append(handler)
+
+    def navigate(self, url: str) -> None:
+        for handler in self.handlers:
+            handler(SimpleNamespace(url=url, parent_frame=None))
+
+
+def _context_with_page() -> tuple[MagicMock, _FakePage]:
+    page = _FakePage()
+    context = MagicMock()
+    context.pages = [page]
+    return context, page
+
+
+def test_redirect_to_login_triggers_one_relogin(tmp_path: Path, monkeypatch):
+    logins: list[str] = []
+
+    def _fake_login(**kwargs):
+        logins.append(kwargs["role"].id)
+        return {"cookies": [{"name": "sid", "value": f"v{len(logins)}"}], "origins": []}
+
+    monkeypatch.setattr(auth_module, "_login_and_get_storage_state", _fake_login)
+    cfg = _config(tmp_path)
+    cache = _StorageStateCache.empty()
+    fixture = _make_role_fixture("admin")
+
+    def _run(context) -> None:
+        fixture(
+            ndf_config=cfg,
+            playwright=MagicMock(),
+            browser=MagicMock(),
+            context=context,
+            _ndf_storage_state_cache=cache,
+            _ndf_auth_disk_cache=None,
+            _ndf_shared_login=None,
+        )
+
+    context, page = _context_with_page()
+    _run(context)
+    # 通常の遷移や第三者 origin の /login では無効化しない
+    page.navigate("https://example.com/dashboard")
+    page.navigate("https://idp.example.net/login")
+    _run(_context_with_page()[0])
+    assert logins == ["admin"]
+
+    # session 切れで login 画面へ戻された → 次の test の前に 1 回だけ再 login
+    context, page = _context_with_page()
+    _run(context)
+    page.navigate("https://example.com/login?next=/dashboard")
+    assert cache.get("admin") is None
+    context, _ = _context_with_page()
+    _run(context)
+    _run(_context_with_page()[0])
+    assert logins == ["admin", "admin"]
+    assert context.add_cookies.call_args.args[0][0]["value"] == "v2"
+
+
+def test_redirect_in_old_test_does_not_drop_refreshed_state(tmp_path: Path, monkeypatch):
+    monkeypatch.setattr(
+        auth_module,
+        "_login_and_get_storage_state",
+        MagicMock(side_effect=[{"cookies": [], "origins": []}, {"cookies": [], "origins": []}]),
+    )
+    cfg = _config(tmp_path)
+    cache = _StorageStateCache.empty()
+    fixture = _make_role_fixture("admin")
+    kwargs = dict(
+        ndf_config=cfg,
+        playwright=MagicMock(),
+        browser=MagicMock(),
+        _ndf_storage_state_cache=cache,
+        _ndf_auth_disk_cache=None,
+        _ndf_shared_login=None,
+    )
+
+    old_context, old_page = _context_with_page()
+    fixture(context=old_context, **kwargs)
+    cache.invalidate("admin")
+    fixture(context=_context_with_page()[0], **kwargs)
+    fresh = cache.get("admin")
+    # 失効前の state を注入した page からの遅れた通知は新しい state を消さない
+    old_page.navigate("https://example.com/login")
+    assert cache.get("admin") is fresh
+
+
+def test_no_watch_without_fail_marker(tmp_path: Path):
+    cfg = _config(tmp_path)
+    role = cfg.role("admin")
+    role.login.fail_if_url_contains = ""
+    context, page = _context_with_page()
+    auth_module._watch_login_redirect(
+        context, role, cfg.base_url, _StorageStateCache.empty(), {}
+    )
+    assert page.handlers == []
+    context.on.assert_not_called()
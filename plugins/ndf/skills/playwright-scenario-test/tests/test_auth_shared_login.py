@@ -0,0 +1,214 @@
+"""xdist worker 間の login 共有 (``_SharedLogin`` / ``_file_lock``) の検証。
+
+- ``_file_lock``: 複数プロセスからの read-modify-write が直列化されること
+- ``_SharedLogin``: login は 1 回だけ、失敗は記録されて後続は login せず fail
+  (記録は短時間で失効し、再 login と成功した login では使わない)
+- pytester + ``-n 3``: 2 role を 6 test で使っても login は role ごとに 1 回
+"""
+
+from __future__ import annotations
+
+import multiprocessing
+import os
+import textwrap
+import time
+from pathlib import Path
+from unittest.mock import MagicMock
+
+import pytest
+
+from scenario_test.fixtures.auth import _DiskStateCache, _SharedLogin, _file_lock
+
+posix_only = pytest.mark.skipif(os.name != "posix", reason="fork start method")
+
+
+def _bump(lock: str, counter: str, times: int) -> None:
+    for _ in range(times):
+        with _file_lock(Path(lock)):
+            value = int(Path(counter).read_text())
+            time.sleep(0.001)
+            Path(counter).write_text(str(value + 1))
+
+
+@posix_only
+def test_file_lock_serialises_processes(tmp_path: Path):
+    counter = tmp_path / "counter"
+    counter.write_text("0")
+    ctx = multiprocessing.get_context("fork")
+    procs = [
+        ctx.Process(target=_bump, args=(str(tmp_path / "x.lock"), str(counter), 20))
+        for _ in range(4)
+    ]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join(timeout=60)
+    assert [p.exitcode for p in procs] == [0, 0, 0, 0]
+    assert counter.read_text() == "80"
+
+
+def test_shared_login_logs_in_once(tmp_path: Path):
+    shared = _SharedLogin(store=_DiskStateCache(root=tmp_path / "ndf-auth"))
+    login = MagicMock(return_value={"cookies": [{"name": "sid", "value": "v"}], "origins": []})
+    first = shared.get_or_login("admin", "f" * 64, login)
+    second = shared.get_or_login("admin", "f" * 64, login)
+    assert first == second
+    login.assert_called_once()
+
+
+def test_shared_login_failure_is_not_retried(tmp_path: Path):
+    shared = _SharedLogin(store=_DiskStateCache(root=tmp_path / "ndf-auth"))
+
+    def _failing_login():
+        pytest.fail("[ndf_role_admin] login 失敗: final_url=/login")
+
+    with pytest.raises(pytest.fail.Exception):
+        shared.get_or_login("admin", "f" * 64, _failing_login)
+    login = MagicMock()
+    with pytest.raises(pytest.fail.Exception, match="他の worker"):
+        shared.get_or_login("admin", "f" * 64, login)
+    login.assert_not_called()
+
+
+class _FakeClock:
+    def __init__(self, now: float = 1_000_000.0) -> None:
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_shared_login_failure_expires_and_is_cleared(tmp_path: Path):
+    clock = _FakeClock()
+    shared = _SharedLogin(
+        store=_DiskStateCache(root=tmp_path / "ndf-auth"), failure_ttl_s=30, clock=clock
+    )
+    state = {"cookies": [{"name": "sid", "value": "v"}], "origins": []}
+    with pytest.raises(RuntimeError):
+        shared.get_or_login("admin", "f" * 64, MagicMock(side_effect=RuntimeError("503")))
+
+    # 記録から TTL を過ぎれば login を再試行し、成功したら記録を消す
+    clock.now += 30
+    login = MagicMock(return_value=state)
+    assert shared.get_or_login("admin", "f" * 64, login) == state
+    login.assert_called_once()
+    assert not shared._failure_path("admin", "f" * 64).exists()
+
+
+def test_shared_login_failure_is_timed_after_slow_login(tmp_path: Path):
+    clock = _FakeClock()
+    shared = _SharedLogin(
+        store=_DiskStateCache(root=tmp_path / "ndf-auth"), failure_ttl_s=30, clock=clock
+    )
+
+    def _timing_out_login():
+        # navigation timeout 相当: 失敗が確定するまでに TTL 以上かかる
+        clock.now += 45
+        raise RuntimeError("Timeout 30000ms exceeded")
+
+    with pytest.raises(RuntimeError):
+        shared.get_or_login("admin", "f" * 64, _timing_out_login)
+
+    # 失敗の記録は login 開始時刻ではなく失敗時刻 → 直後の worker は login しない
+    clock.now += 1
+    login = MagicMock()
+    with pytest.raises(pytest.fail.Exception, match="Timeout 30000ms"):
+        shared.get_or_login("admin", "f" * 64, login)
+    login.assert_not_called()
+
+
+def test_shared_relogin_ignores_recent_failure(tmp_path: Path):
+    shared = _SharedLogin(store=_DiskStateCache(root=tmp_path / "ndf-auth"))
+    stale = {"cookies": [{"name": "sid", "value": "old"}], "origins": []}
+    shared.store.store("admin", "f" * 64, stale)
+    with pytest.raises(RuntimeError):
+        shared.get_or_login(
+            "admin", "f" * 64, MagicMock(side_effect=RuntimeError("503")), stale=stale
+        )
+
+    # 途中失効からの再 login は直前の失敗記録があっても試みる
+    fresh = {"cookies": [{"name": "sid", "value": "new"}], "origins": []}
+    assert shared.get_or_login("admin", "f" * 64, MagicMock(return_value=fresh), stale=stale) == fresh
+
+
+def test_xdist_workers_share_one_login_per_role(pytester, tmp_path: Path):
+    cfg_path = tmp_path / "scenario.config.yaml"
+    cfg_path.write_text(
+        textwrap.dedent(
+            """
+            target:
+              base_url: https://example.com
+            roles:
+              admin:
+                label: 管理者
+                login:
+                  path: /login
+                  requires_basic_auth: false
+                  fail_if_url_contains: /login
+                  fields:
+                    email: admin@example.com
+                    password: pass
+              user:
+                label: 一般ユーザ
+                login:
+                  path: /login
+                  requires_basic_auth: false
+                  fail_if_url_contains: /login
+                  fields:
+                    email: user@example.com
+                    password: pass
+            """
+        ).strip()
+        + "\n",
+        encoding="utf-8",
+    )
+    log = tmp_path / "logins.txt"
+    pytester.makeconftest(
+        textwrap.dedent(
+            f"""
+            import time
+            from unittest.mock import MagicMock
+            import pytest
+            import scenario_test.fixtures.auth as m
+
+            def _fake_login(**kwargs):
+                time.sleep(0.3)  # 他の worker が lock 待ちになる時間を作る
+                with open({str(log)!r}, "a") as fp:
+                    fp.write(kwargs["role"].id + "\\n")
+                return {{"cookies": [{{"name": "sid", "value": kwargs["role"].id}}], "origins": []}}
+
+            @pytest.fixture(scope="session", autouse=True)
+            def _patch_login():
+                orig = m._login_and_get_storage_state
+                m._login_and_get_storage_state = _fake_login
+                yield
+                m._login_and_get_storage_state = orig
+
+            @pytest.fixture(scope="session")
+            def browser():
+                return MagicMock()
+
+            @pytest.fixture()
+            def context():
+                return MagicMock()
+            """
+        )
+    )
+    pytester.makepyfile(
+        textwrap.dedent(
+            """
+            import pytest
+
+            @pytest.mark.parametrize("i", range(3))
+            def test_admin(ndf_role_admin, context, i):
+                assert context.add_cookies.call_args.args[0][0]["value"] == "admin"
+
+            @pytest.mark.parametrize("i", range(3))
+            def test_user(ndf_role_user, context, i):
+                assert context.add_cookies.call_args.args[0][0]["value"] == "user"
+            """
+        )
+    )
+    res = pytester.runpytest_subprocess("-n", "3", "-p", "no:cacheprovider", f"--ndf-config={cfg_path}")
+    res.assert_outcomes(passed=6)
+    assert sorted(log.read_text().splitlines()) == ["admin", "user"]
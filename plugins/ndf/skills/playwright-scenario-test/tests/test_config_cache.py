@@ -0,0 +1,174 @@
+"""``Config.load_cached`` / ``Config.snapshot`` とスキーマ検証の検証。
+
+- 同じ内容・同じ env なら YAML の parse は 1 回 (hook と fixture で共有)
+- ファイル内容 / 参照している環境変数が変われば読み直す
+- snapshot (キー一致) からの復元は YAML を parse しない
+- 必須キーの欠落はまとめて ValueError (null の fail_if_url_contains は "")
+- pytester + ``-n 2``: worker は controller の snapshot から起動する
+"""
+
+from __future__ import annotations
+
+import textwrap
+from pathlib import Path
+
+import pytest
+
+from scenario_test import config as config_module
+from scenario_test.config import Config
+
+_YAML = """
+target:
+  base_url: ${NDF_TEST_BASE_URL:-https://example.com}
+roles:
+  admin:
+    label: 管理者
+    login:
+      path: /login
+      requires_basic_auth: false
+      fail_if_url_contains: /login
+      fields:
+        email: admin@example.com
+        password: pass
+"""
+
+
+@pytest.fixture()
+def parse_count(monkeypatch) -> list[int]:
+    monkeypatch.setattr(config_module, "_LOADED", {})
+    calls = [0]
+    orig = config_module.yaml.safe_load
+
+    def _counting(stream):
+        calls[0] += 1
+        return orig(stream)
+
+    monkeypatch.setattr(config_module.yaml, "safe_load", _counting)
+    return calls
+
+
+def _write(tmp_path: Path, text: str = _YAML) -> Path:
+    path = tmp_path / "scenario.config.yaml"
+    path.write_text(text.strip() + "\n", encoding="utf-8")
+    return path
+
+
+def test_load_cached_parses_once(tmp_path: Path, parse_count: list[int]):
+    path = _write(tmp_path)
+    first = Config.load_cached(path)
+    assert Config.load_cached(path) is first
+    assert Config.load_cached(tmp_path / "." / path.name) is first
+    assert parse_count == [1]
+
+
+def test_load_cached_reloads_on_file_or_env_change(
+    tmp_path: Path, parse_count: list[int], monkeypatch
+):
+    monkeypatch.delenv("NDF_TEST_BASE_URL", raising=False)
+    path = _write(tmp_path)
+    assert Config.load_cached(path).base_url == "https://example.com"
+
+    monkeypatch.setenv("NDF_TEST_BASE_URL", "https://staging.example.com/")
+    assert Config.load_cached(path).base_url == "https://staging.example.com"
+
+    _write(tmp_path, _YAML.replace("label: 管理者", "label: 管理者2"))
+    assert Config.load_cached(path).roles["admin"].label == "管理者2"
+    assert parse_count == [3]
+
+
+def test_snapshot_restores_without_parsing(tmp_path: Path, parse_count: list[int], monkeypatch):
+    path = _write(tmp_path)
+    original = Config.load_cached(path)
+    snapshot = Config.snapshot(path)
+    assert snapshot is not None
+
+    # 別プロセス (xdist worker) 相当: プロセス内 cache は空
+    monkeypatch.setattr(config_module, "_LOADED", {})
+    restored = Config.load_cached(path, snapshot=snapshot)
+    assert restored == original
+    assert parse_count == [1]
+
+    # キーが合わない (controller と内容 / env が違う) snapshot は使わない
+    monkeypatch.setattr(config_module, "_LOADED", {})
+    _write(tmp_path, _YAML.replace("/login\n      fields", "/signin\n      fields"))
+    assert Config.load_cached(path, snapshot=snapshot).roles["admin"].login.fail_if_url_contains == "/signin"
+    assert parse_count == [2]
+
+
+def test_snapshot_is_none_until_loaded(tmp_path: Path, parse_count: list[int]):
+    path = _write(tmp_path)
+    assert Config.snapshot(path) is None
+    assert Config.snapshot(tmp_path / "missing.yaml") is None
+
+
+def test_schema_errors_are_reported_together(tmp_path: Path):
+    path = _write(
+        tmp_path,
+        """
+target:
+  basic_auth: nope
+roles:
+  admin:
+    login:
+      path: /login
+      fields: [email]
+""",
+    )
+    with pytest.raises(ValueError) as excinfo:
+        Config.load(path)
+    message = str(excinfo.value)
+    assert "target.base_url" in message
+    assert "roles.admin.login.fail_if_url_contains" in message
+    assert "roles.admin.login.fields" in message
+
+
+def test_schema_accepts_what_the_builder_accepts(tmp_path: Path):
+    # fail_if_url_contains: null は「判定しない」("")、省略可能な section は空でよい
+    path = _write(
+        tmp_path,
+        _YAML.replace("fail_if_url_contains: /login", "fail_if_url_contains:")
+        .replace("  base_url:", "  basic_auth:\n  base_url:")
+        + "playwright:\n",
+    )
+    cfg = Config.load(path)
+    assert cfg.roles["admin"].login.fail_if_url_contains == ""
+
+
+def test_xdist_workers_start_from_snapshot(pytester, tmp_path: Path):
+    cfg_path = _write(tmp_path)
+    pytester.makeconftest(
+        textwrap.dedent(
+            """
+            import pytest
+            import scenario_test.config as m
+
+            PARSES = [0]
+            _orig = m.yaml.safe_load
+
+            def _counting(stream):
+                PARSES[0] += 1
+                return _orig(stream)
+
+            m.yaml.safe_load = _counting
+
+            @pytest.fixture()
+            def parses():
+                return PARSES[0]
+            """
+        )
+    )
+    pytester.makepyfile(
+        """
+        import os
+        import pytest
+
+        @pytest.mark.parametrize("i", range(4))
+        def test_worker(ndf_config, parses, pytestconfig, i):
+            assert os.environ.get("PYTEST_XDIST_WORKER")
+            assert ndf_config.roles["admin"].label == "管理者"
+            assert pytestconfig._ndf_config is ndf_config
+            assert parses == 0
+        """
+    )
+    res = pytester.runpytest_subprocess("-n", "2", "-p", "no:cacheprovider", f"--ndf-config={cfg_path}")
+    res.assert_outcomes(passed=4)
@@ -0,0 +1,151 @@
+"""``ndf_role_<id>`` の localStorage 復元 (init script 1 本、navigation なし) の検証。"""
+
+from __future__ import annotations
+
+import json
+import shutil
+import subprocess
+import textwrap
+from pathlib import Path
+from unittest.mock import MagicMock
+
+import pytest
+
+from scenario_test.config import Config
+from scenario_test.fixtures.auth import (
+    _StorageStateCache,
+    _local_storage_init_script,
+    _make_role_fixture,
+)
+
+_STATE = {
+    "cookies": [{"name": "sid", "value": "abc"}],
+    "origins": [
+        {
+            "origin": "https://example.com",
+            "localStorage": [
+                {"name": "token", "value": "t-1"},
+                {"name": "theme", "value": "dark \"quoted\""},
+            ],
+        },
+        {
+            "origin": "https://ads.example.net",
+            "localStorage": [{"name": "tracker", "value": "x"}],
+        },
+    ],
+}
+
+
+def _config(tmp_path: Path) -> Config:
+    cfg = tmp_path / "scenario.config.yaml"
+    cfg.write_text(
+        textwrap.dedent(
+            """
+            target:
+              base_url: https://example.com
+            roles:
+              admin:
+                label: 管理者
+                login:
+                  path: /login
+                  requires_basic_auth: false
+                  fail_if_url_contains: /login
+                  fields:
+                    email: a@example.com
+                    password: p
+            """
+        ).strip()
+        + "\n",
+        encoding="utf-8",
+    )
+    return Config.load(cfg)
+
+
+def test_init_script_contains_only_same_origin_items():
+    script = _local_storage_init_script(_STATE, "https://example.com")
+    assert script is not None
+    assert "https://example.com" in script
+    assert "t-1" in script
+    assert json.dumps("dark \"quoted\"") in script
+    assert "ads.example.net" not in script
+    assert "tracker" not in script
+
+
+def test_init_script_is_none_without_same_origin_items():
+    assert _local_storage_init_script({"cookies": []}, "https://example.com") is None
+    only_third_party = {"origins": [_STATE["origins"][1]]}
+    assert _local_storage_init_script(only_third_party, "https://example.com") is None
+
+
+def test_role_fixture_restores_without_navigation(tmp_path: Path):
+    cache = _StorageStateCache.empty()
+    cache.put("admin", _STATE)
+    context = MagicMock()
+    fixture = _make_role_fixture("admin")
+
+    role = fixture(
+        ndf_config=_config(tmp_path),
+        playwright=MagicMock(),
+        browser=MagicMock(),
+        context=context,
+        _ndf_storage_state_cache=cache,
+        _ndf_auth_disk_cache=None,
+        _ndf_shared_login=None,
+    )
+
+    assert role.id == "admin"
+    context.add_cookies.assert_called_once_with(_STATE["cookies"])
+    context.add_init_script.assert_called_once()
+    assert "t-1" in context.add_init_script.call_args.args[0]
+    context.new_page.assert_not_called()
+
+
+# init script を navigation ごとに実行するのを node で模擬する (ブラウザ無しで検証)
+_NAVIGATE_JS = """
+const script = require("fs").readFileSync(0, "utf8");
+class FakeStorage {
+  constructor() { this.m = new Map(); }
+  getItem(k) { return this.m.has(k) ? this.m.get(k) : null; }
+  setItem(k, v) { this.m.set(k, String(v)); }
+  removeItem(k) { this.m.delete(k); }
+  clear() { this.m.clear(); }
+}
+const local = new FakeStorage();
+const tabs = [new FakeStorage(), new FakeStorage()];
+const navigate = (tab) => new Function("window", script)({
+  location: { origin: "https://example.com" },
+  localStorage: local,
+  sessionStorage: tabs[tab],
+});
+const out = {};
+navigate(0);
+out.first = local.getItem("token");
+local.removeItem("token");
+navigate(0);
+out.removed_same_tab = local.getItem("token");
+navigate(1);
+out.removed_new_tab = local.getItem("token");
+local.clear();
+navigate(0);
+out.cleared_same_tab = local.getItem("token");
+console.log(JSON.stringify(out));
+"""
+
+
+@pytest.mark.skipif(shutil.which("node") is None, reason="node が無い")
+def test_removed_key_is_not_restored_on_navigation():
+    script = _local_storage_init_script(_STATE, "https://example.com")
+    res = subprocess.run(
+        ["node", "-e", _NAVIGATE_JS],
+        input=script,
+        capture_output=True,
+        text=True,
+        check=True,
+        timeout=30,
+    )
+    assert json.loads(res.stdout) == {
+        "first": "t-1",
+        "removed_same_tab": None,
+        "removed_new_tab": None,
+        "cleared_same_tab": None,
+    }
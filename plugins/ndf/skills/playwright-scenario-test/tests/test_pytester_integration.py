@@ -91,6 +91,11 @@ def test_auth_cache_hit_miss_via_pytester(pytester, tmp_path: Path):
                 yield
                 m._login_and_get_storage_state = orig
 
+            @pytest.fixture(scope="session")
+            def browser():
+                # login は session の browser を使うため実ブラウザを起動させない
+                return MagicMock()
+
             @pytest.fixture()
             def context():
                 ctx = MagicMock()
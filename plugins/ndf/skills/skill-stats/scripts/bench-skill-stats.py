@@ -0,0 +1,787 @@
+#!/usr/bin/env python3
+"""Micro-benchmarks for skill-stats.py.
+
+Subcommands:
+  matcher   compare the per-skill `any(t in text for t in triggers)` loop with
+            the single-pass TriggerMatcher on the same user messages, and
+            verify both return the same skills for every message
+  gen       write a synthetic transcript tree (Claude Code event shapes, large
+            tool_result payloads, resumed / forked sessions) of a requested
+            total size or session count, with a configurable event mix
+  events    time full-decode timeline extraction against the byte-probe
+            pre-filter / mmap reader (+ orjson when installed) on a transcript
+            tree, report peak RSS of each, and verify both produce the same
+            timelines and that aggregate_by_project with --jobs matches the
+            serial result when a session is copied into another directory
+  eval      replay a labelled sample of user messages and report per-skill
+            precision / recall of trigger matching and matcher throughput
+            for the explicit and fallback keyword sets, plus a pruned
+            keyword set per skill that keeps recall with fewer keywords
+            (on the full corpus, also the serial vs --jobs check of events)
+  stages    time iter_transcripts / iter_events / build_timeline /
+            aggregate_by_project separately on a transcript tree and report
+            MB/s and events/s as JSON, optionally against a previous run
+
+Messages come from real transcripts under ~/.claude/projects when available
+(--source transcripts) or are synthesized from the skills' own keywords.
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import importlib.util
+import json
+import math
+import multiprocessing
+import pathlib
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from types import ModuleType
+from typing import Iterable
+
+
+def load_skill_stats() -> ModuleType:
+    path = pathlib.Path(__file__).resolve().with_name("skill-stats.py")
+    spec = importlib.util.spec_from_file_location("skill_stats", path)
+    mod = importlib.util.module_from_spec(spec)
+    sys.modules["skill_stats"] = mod  # required for pickling in process pools
+    spec.loader.exec_module(mod)
+    return mod
+
+
+ss = load_skill_stats()
+
+_FILLER = (
+    "この関数の挙動を確認してください。テストが落ちている原因を調べて修正方針を教えて。"
+    "Please check why the build fails on CI and propose a minimal change. "
+    "ログを見るとタイムアウトしているようです。設定ファイルも合わせて見直したい。"
+)
+
+
+def legacy_match(skill_triggers: list[tuple[str, list[str]]], text_l: str) -> set[str]:
+    """The pre-TriggerMatcher loop from aggregate_by_project."""
+    return {q for q, trs in skill_triggers if trs and any(t in text_l for t in trs)}
+
+
+def synthetic_messages(skills: list[dict], n: int, seed: int) -> list[str]:
+    rng = random.Random(seed)
+    keywords = [t for s in skills for t in s["triggers"]] or ["skill"]
+    out: list[str] = []
+    for _ in range(n):
+        parts = [_FILLER[: rng.randint(20, len(_FILLER))]]
+        for _ in range(rng.randint(0, 2)):
+            parts.insert(rng.randint(0, len(parts)), rng.choice(keywords))
+        out.append(" ".join(parts) * rng.randint(1, 4))
+    return out
+
+
+def transcript_messages(n: int) -> list[str]:
+    out: list[str] = []
+    for path in ss.iter_transcripts(None, None, None):
+        tl, _project = ss.build_timeline(path)
+        out.extend(str(d) for k, d, _ts in tl if k == "user")
+        if len(out) >= n:
+            break
+    return out[:n]
+
+
+def _best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+_PROMPTS = [
+    "PRを作成して", "レビューをお願いします", "skill stats を出して", "このバグを fix して",
+    "テストが落ちている原因を調べて", "deploy 手順を確認したい", "merged したので後片付けして",
+    "Please summarise the diff", "ログを見てタイムアウトの原因を探して",
+]
+
+
+def _uuid(rng: random.Random) -> str:
+    # seeded, so a corpus is reproducible across commits
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def _event(rng: random.Random, kind: str, session: str, cwd: str, ts: datetime, message: dict, **extra) -> dict:
+    ev = {
+        "parentUuid": None,
+        "isSidechain": False,
+        "userType": "external",
+        "cwd": cwd,
+        "sessionId": session,
+        "version": "2.1.0",
+        "gitBranch": "main",
+        "type": kind,
+        "message": message,
+        "uuid": _uuid(rng),
+        "timestamp": ts.isoformat(timespec="milliseconds").replace("+00:00", "Z"),
+    }
+    ev.update(extra)
+    return ev
+
+
+def payload_size(rng: random.Random, mean_bytes: int, dist: str) -> int:
+    """Size of one tool payload averaging `mean_bytes`.
+
+    "uniform" spreads sizes over [mean/4, 7/4 mean]; "lognormal" gives the
+    heavy tail of real tool results (most small, a few far above the mean).
+    """
+    if dist == "lognormal":
+        sigma = 1.2
+        return max(1, int(rng.lognormvariate(math.log(mean_bytes) - sigma * sigma / 2, sigma)))
+    return rng.randint(mean_bytes // 4, mean_bytes * 7 // 4)
+
+
+def write_session(
+    path: pathlib.Path,
+    rng: random.Random,
+    cwd: str,
+    skills: list[str],
+    target_bytes: int,
+    payload_bytes: int,
+    skill_rate: float = 0.15,
+    write_rate: float = 0.20,
+    tools_per_turn: int = 6,
+    system_rate: float = 0.0,
+    payload_dist: str = "uniform",
+    prefix: bytes = b"",
+) -> int:
+    """Write one synthetic session of roughly `target_bytes`; return bytes written.
+
+    Each user turn is followed by 1..`tools_per_turn` tool calls: a Skill
+    call with probability `skill_rate`, a Write / Edit carrying a payload-sized
+    body with `write_rate`, another tool otherwise; every call gets a
+    tool_result of payload size. `system_rate` is the chance of a system
+    event after a turn. `prefix` (events of an earlier session) is copied
+    first, as resuming or forking a session does.
+    """
+    session = path.stem
+    ts = datetime(2026, 1, 1, tzinfo=timezone.utc) + timedelta(minutes=rng.randint(0, 60 * 24 * 80))
+    written = len(prefix)
+    with path.open("wb") as f:
+        f.write(prefix)
+
+        def emit(ev: dict) -> None:
+            nonlocal written
+            line = (json.dumps(ev, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+            f.write(line)
+            written += len(line)
+
+        while written < target_bytes:
+            ts += timedelta(seconds=rng.randint(5, 900))
+            emit(_event(rng, "user", session, cwd, ts, {"role": "user", "content": rng.choice(_PROMPTS)}))
+            for _ in range(rng.randint(1, tools_per_turn)):
+                ts += timedelta(seconds=rng.randint(1, 60))
+                tool_id = f"toolu_{rng.getrandbits(96):024x}"
+                r = rng.random()
+                if r < skill_rate:
+                    use = {"type": "tool_use", "id": tool_id, "name": "Skill",
+                           "input": {"skill": rng.choice(skills)}}
+                elif r < skill_rate + write_rate:
+                    # Write/Edit carry whole file bodies in the assistant event
+                    use = {"type": "tool_use", "id": tool_id, "name": rng.choice(["Write", "Edit"]),
+                           "input": {"file_path": "/work/src/app.py",
+                                     "content": "y" * payload_size(rng, payload_bytes // 2, payload_dist)}}
+                else:
+                    use = {"type": "tool_use", "id": tool_id,
+                           "name": rng.choice(["Bash", "Read", "Grep", "mcp__serena__find_symbol"]),
+                           "input": {"command": "ls -la"}}
+                emit(_event(rng, "assistant", session, cwd, ts,
+                            {"role": "assistant", "content": [{"type": "text", "text": "確認します。"}, use]}))
+                ts += timedelta(seconds=rng.randint(1, 30))
+                body = "x" * payload_size(rng, payload_bytes, payload_dist)
+                emit(_event(rng, "user", session, cwd, ts,
+                            {"role": "user", "content": [{"tool_use_id": tool_id, "type": "tool_result", "content": body}]},
+                            toolUseResult={"stdout": body, "stderr": "", "interrupted": False}))
+            if rng.random() < system_rate:
+                emit(_event(rng, "system", session, cwd, ts,
+                            {"role": "system", "content": "Conversation compacted"}, subtype="compact_boundary"))
+    return written
+
+
+def cmd_gen(args: argparse.Namespace) -> int:
+    if args.skill_rate + args.write_rate > 1:
+        print("[bench] --skill-rate + --write-rate must not exceed 1", file=sys.stderr)
+        return 2
+    rng = random.Random(args.seed)
+    out = pathlib.Path(args.out)
+    skills = [f"ndf:{n}" for n in ("pr", "review", "fix", "skill-stats", "merged", "deploy")]
+    target = None if args.sessions else args.size_mb * 1024 * 1024
+    earlier: dict[int, list[pathlib.Path]] = {}
+    total = files = resumed = 0
+    while (files < args.sessions) if target is None else (total < target):
+        project = rng.randrange(args.projects)
+        d = out / f"-work-project{project}"
+        d.mkdir(parents=True, exist_ok=True)
+        session_bytes = rng.randint(args.session_kb // 2, args.session_kb * 2) * 1024
+        if target is not None:
+            session_bytes = min(target - total, session_bytes)
+        prefix = b""
+        if earlier.get(project) and rng.random() < args.resume_rate:
+            # resume copies the whole earlier session, fork a leading part of it
+            prefix = rng.choice(earlier[project]).read_bytes()
+            if rng.random() < 0.5:
+                prefix = prefix[: prefix.rfind(b"\n", 0, len(prefix) // 2) + 1]
+            resumed += 1
+        path = d / f"{uuid.UUID(int=rng.getrandbits(128))}.jsonl"
+        total += write_session(
+            path, rng, f"/work/project{project}", skills, session_bytes + len(prefix), args.payload_kb * 1024,
+            skill_rate=args.skill_rate, write_rate=args.write_rate, tools_per_turn=args.tools_per_turn,
+            system_rate=args.system_rate, payload_dist=args.payload_dist, prefix=prefix,
+        )
+        earlier.setdefault(project, []).append(path)
+        files += 1
+    print(json.dumps({"out": str(out), "files": files, "resumed": resumed, "bytes": total}, indent=2))
+    return 0
+
+
+def legacy_timeline(path: pathlib.Path) -> tuple[list[tuple[str, object]], str]:
+    """The pre-filter build_timeline: text-mode read + json.loads of every line."""
+    timeline: list[tuple[str, object]] = []
+    first_cwd = None
+    with path.open("r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                ev = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if first_cwd is None and isinstance(ev.get("cwd"), str) and ev["cwd"]:
+                first_cwd = ev["cwd"]
+            if ev.get("type") == "user":
+                text = ss.extract_user_text(ev)
+                if text:
+                    timeline.append(("user", text))
+            elif ev.get("type") == "assistant":
+                timeline.extend(("skill", sk) for sk in ss.extract_skill_invocations(ev))
+    return timeline, ss.detect_project(path, first_cwd)
+
+
+def _peak_rss_mb() -> float | None:
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _run_timelines(variant: str, paths: list[pathlib.Path]) -> dict:
+    """Run one extraction variant in a fresh process; return time, peak RSS, digest."""
+    digest = hashlib.sha256()
+    t0 = time.perf_counter()
+    for p in paths:
+        if variant == "legacy":
+            tl, project = legacy_timeline(p)
+        else:
+            tl, project = ss.build_timeline(p)
+            tl = [(kind, data) for kind, data, _ts in tl]
+        digest.update(repr((tl, project)).encode("utf-8", "surrogatepass"))
+    return {
+        "sec": time.perf_counter() - t0,
+        "peak_rss_mb": _peak_rss_mb(),
+        "digest": digest.hexdigest(),
+    }
+
+
+def jobs_agree(paths: list[pathlib.Path], skills: list[dict], jobs: int, lookahead_cap: int = 100) -> bool:
+    """aggregate_by_project with `jobs` workers equals the serial result.
+
+    The largest session is also copied into a separate project directory, as
+    a resume from another checkout does, so the copy lands in another pool
+    chunk and must still be counted once.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        original = max(paths, key=lambda p: p.stat().st_size)
+        copy = pathlib.Path(tmp, "-work-bench-copy", original.name)
+        copy.parent.mkdir()
+        shutil.copyfile(original, copy)
+        corpus = [*paths, copy]
+        serial = ss.aggregate_by_project(corpus, skills, lookahead_cap=lookahead_cap)
+        pooled = ss.aggregate_by_project(corpus, skills, lookahead_cap=lookahead_cap, jobs=max(2, jobs))
+    return serial == pooled
+
+
+def cmd_events(args: argparse.Namespace) -> int:
+    paths = sorted(pathlib.Path(args.root).rglob("*.jsonl"))
+    size = sum(p.stat().st_size for p in paths)
+    if not paths:
+        print(f"[bench] no transcripts under {args.root}", file=sys.stderr)
+        return 1
+
+    runs: dict[str, dict] = {}
+    for variant in ("legacy", "prefilter"):
+        # a fresh interpreter per variant so peak RSS is not shared
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as ex:
+            runs[variant] = ex.submit(_run_timelines, variant, paths).result()
+    legacy, fast = runs["legacy"], runs["prefilter"]
+    mb = size / (1024 * 1024)
+    result = {
+        "files": len(paths),
+        "mb": round(mb, 1),
+        "largest_file_mb": round(max(p.stat().st_size for p in paths) / (1024 * 1024), 1),
+        "orjson": ss.orjson is not None,
+        "legacy_sec": round(legacy["sec"], 3),
+        "prefilter_sec": round(fast["sec"], 3),
+        "legacy_mb_per_sec": round(mb / legacy["sec"], 1),
+        "prefilter_mb_per_sec": round(mb / fast["sec"], 1),
+        "legacy_peak_rss_mb": legacy["peak_rss_mb"],
+        "prefilter_peak_rss_mb": fast["peak_rss_mb"],
+        "speedup": round(legacy["sec"] / fast["sec"], 2),
+        "identical": legacy["digest"] == fast["digest"],
+    }
+    plugin_root = pathlib.Path(args.plugin_root) if args.plugin_root else ss.plugin_root_default()
+    result["jobs_agree"] = jobs_agree(paths, ss.load_skills(plugin_root), ss.resolve_jobs(args.jobs))
+    print(json.dumps(result, indent=2))
+    return 0 if result["identical"] and result["jobs_agree"] else 1
+
+
+def cmd_matcher(args: argparse.Namespace) -> int:
+    plugin_root = pathlib.Path(args.plugin_root) if args.plugin_root else ss.plugin_root_default()
+    skills = ss.load_skills(plugin_root, include_fallback=args.include_fallback)
+    skill_triggers = [
+        (s["qualified"], [t.lower() for t in s["triggers"] if t]) for s in skills
+    ]
+    matcher = ss.build_matcher(skills)
+
+    if args.source == "transcripts":
+        messages = transcript_messages(args.messages)
+    else:
+        messages = synthetic_messages(skills, args.messages, args.seed)
+    if not messages:
+        print("[bench] no messages to match", file=sys.stderr)
+        return 1
+    lowered = [m.lower() for m in messages]
+
+    mismatches = sum(
+        1 for m in lowered if legacy_match(skill_triggers, m) != matcher.match(m)
+    )
+    t_legacy = _best_of(lambda: [legacy_match(skill_triggers, m) for m in lowered], args.repeat)
+    t_matcher = _best_of(lambda: [matcher.match(m) for m in lowered], args.repeat)
+
+    result = {
+        "messages": len(lowered),
+        "avg_message_chars": round(sum(map(len, lowered)) / len(lowered), 1),
+        "skills": len(skill_triggers),
+        "keywords": len(matcher.keywords),
+        "legacy_sec": round(t_legacy, 6),
+        "matcher_sec": round(t_matcher, 6),
+        "legacy_msgs_per_sec": round(len(lowered) / t_legacy) if t_legacy else None,
+        "matcher_msgs_per_sec": round(len(lowered) / t_matcher) if t_matcher else None,
+        "speedup": round(t_legacy / t_matcher, 2) if t_matcher else None,
+        "mismatches": mismatches,
+    }
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    return 1 if mismatches else 0
+
+
+def labelled_messages(paths: list[pathlib.Path], lookahead_cap: int = 100) -> Iterable[tuple[str, frozenset[str]]]:
+    """Yield (text, skills) per user message, labelled by what was actually invoked.
+
+    A message is positive for a skill when that skill is invoked within
+    `lookahead_cap` invocations and before the next user turn: the same rule
+    HitTracker uses, so on a full corpus true positives equal report hits.
+    Events copied into resumed / forked sessions are labelled once, with the
+    same shared `seen` set aggregate_by_project() uses.
+    """
+    seen: set[bytes] = set()
+    for path in paths:
+        text: str | None = None
+        invoked: list[str] = []
+        for kind, data, _ts in ss.iter_timeline(path, seen=seen):
+            if kind == "user":
+                if text is not None:
+                    yield text, frozenset(invoked)
+                text, invoked = str(data), []
+            elif text is not None and len(invoked) < lookahead_cap:
+                invoked.append(data)
+        if text is not None:
+            yield text, frozenset(invoked)
+
+
+def load_labels(path: pathlib.Path) -> Iterable[tuple[str, frozenset[str]]]:
+    """Read hand-labelled messages: one {"text": ..., "skills": [...]} object per line."""
+    with path.open(encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                obj = json.loads(line)
+                yield str(obj["text"]), frozenset(obj.get("skills") or ())
+
+
+def reservoir(items: Iterable, k: int, rng: random.Random) -> list:
+    """Uniform sample of `k` items from a stream (all of them when k <= 0)."""
+    if k <= 0:
+        return list(items)
+    sample: list = []
+    for i, item in enumerate(items):
+        if i < k:
+            sample.append(item)
+        else:
+            j = rng.randint(0, i)
+            if j < k:
+                sample[j] = item
+    return sample
+
+
+def _ratio(num: int, den: int) -> float | None:
+    return round(num / den, 4) if den else None
+
+
+def score(
+    skill_triggers: list[tuple[str, list[str]]],
+    lowered: list[str],
+    labels: list[frozenset[str]],
+    repeat: int,
+) -> dict:
+    """Precision / recall per skill and matcher throughput for one keyword set."""
+    matcher = ss.TriggerMatcher(skill_triggers)
+    matched = [matcher.match(m) for m in lowered]
+    sec = _best_of(lambda: [matcher.match(m) for m in lowered], repeat)
+    rows = []
+    tp_all = fp_all = fn_all = 0
+    for qualified, trs in skill_triggers:
+        tp = fp = fn = 0
+        for found, positive in zip(matched, labels):
+            if qualified in found:
+                if qualified in positive:
+                    tp += 1
+                else:
+                    fp += 1
+            elif qualified in positive:
+                fn += 1
+        tp_all, fp_all, fn_all = tp_all + tp, fp_all + fp, fn_all + fn
+        rows.append({
+            "skill": qualified,
+            "keywords": len(trs),
+            "tp": tp, "fp": fp, "fn": fn,
+            "precision": _ratio(tp, tp + fp),
+            "recall": _ratio(tp, tp + fn),
+        })
+    return {
+        "keywords": len(matcher.keywords),
+        "matcher_sec": round(sec, 6),
+        "msgs_per_sec": round(len(lowered) / sec) if sec else None,
+        "tp": tp_all, "fp": fp_all, "fn": fn_all,
+        "precision": _ratio(tp_all, tp_all + fp_all),
+        "recall": _ratio(tp_all, tp_all + fn_all),
+        "skills": rows,
+    }
+
+
+def prune_keywords(
+    qualified: str,
+    keywords: list[str],
+    present: list[set[str]],
+    labels: list[frozenset[str]],
+) -> list[str]:
+    """Greedy set cover: the fewest keywords whose true positives cover the full set's.
+
+    Each step takes the keyword adding the most uncovered true positives,
+    preferring fewer false positives, so recall on the sample is unchanged and
+    precision can only go up. Keywords that never produce a true positive are
+    dropped; with no true positive at all the set is returned unchanged
+    (nothing to judge it by).
+    """
+    tps: dict[str, set[int]] = {kw: set() for kw in keywords}
+    fps: dict[str, int] = dict.fromkeys(keywords, 0)
+    for i, (found, positive) in enumerate(zip(present, labels)):
+        for kw in keywords:
+            if kw in found:
+                if qualified in positive:
+                    tps[kw].add(i)
+                else:
+                    fps[kw] += 1
+    uncovered = set().union(*tps.values())
+    if not uncovered:
+        return list(keywords)
+    keep: list[str] = []
+    while uncovered:
+        best = max(keywords, key=lambda kw: (len(tps[kw] & uncovered), -fps[kw], -len(kw)))
+        keep.append(best)
+        uncovered -= tps[best]
+    return sorted(keep, key=keywords.index)
+
+
+def cmd_eval(args: argparse.Namespace) -> int:
+    plugin_root = pathlib.Path(args.plugin_root) if args.plugin_root else ss.plugin_root_default()
+    explicit = ss.load_skills(plugin_root)
+    fallback = ss.load_skills(plugin_root, include_fallback=True)
+
+    rng = random.Random(args.seed)
+    paths: list[pathlib.Path] = []
+    if args.labels:
+        sample = reservoir(load_labels(pathlib.Path(args.labels)), args.sample, rng)
+    else:
+        roots = [pathlib.Path(r) for r in args.root] if args.root else [ss.default_root()]
+        paths = [p for root in roots for p in ss.iter_transcripts(args.days, None, None, root)]
+        sample = reservoir(labelled_messages(paths, args.lookahead_cap), args.sample, rng)
+    if not sample:
+        print("[bench] no labelled messages", file=sys.stderr)
+        return 1
+    lowered = [text.lower() for text, _ in sample]
+    labels = [positive for _, positive in sample]
+
+    def triggers_of(skills: list[dict]) -> list[tuple[str, list[str]]]:
+        return [(s["qualified"], [t.lower() for t in s["triggers"] if t]) for s in skills]
+
+    full = triggers_of(fallback)
+    everything = ss.TriggerMatcher(full)
+    present = [everything.match_keywords(m) for m in lowered]
+    pruned = [(q, prune_keywords(q, trs, present, labels) if trs else []) for q, trs in full]
+
+    configs = {
+        "explicit": score(triggers_of(explicit), lowered, labels, args.repeat),
+        "fallback": score(full, lowered, labels, args.repeat),
+        "pruned": score(pruned, lowered, labels, args.repeat),
+    }
+    source_of = {s["qualified"]: s["triggers_source"] for s in fallback}
+    before = {r["skill"]: r for r in configs["fallback"]["skills"]}
+    after = {r["skill"]: r for r in configs["pruned"]["skills"]}
+    suggestions = []
+    for (qualified, trs), (_, keep) in zip(full, pruned):
+        if len(keep) == len(trs):
+            continue
+        suggestions.append({
+            "skill": qualified,
+            "triggers_source": source_of[qualified],
+            "keep": keep,
+            "drop": [kw for kw in trs if kw not in keep],
+            "precision": [before[qualified]["precision"], after[qualified]["precision"]],
+            "recall": [before[qualified]["recall"], after[qualified]["recall"]],
+        })
+
+    result = {
+        "source": "labels" if args.labels else "transcripts",
+        "messages": len(sample),
+        "positives": sum(1 for positive in labels if positive),
+        "configs": configs,
+        "suggestions": suggestions,
+    }
+    if paths and args.sample <= 0:
+        # labels follow HitTracker, so on the full corpus tp / tp+fp must equal the report's
+        _inv, trig, hits = ss.merge_counters(
+            ss.aggregate_by_project(paths, explicit, lookahead_cap=args.lookahead_cap)
+        )
+        result["agrees_with_aggregate"] = (
+            sum(hits.values()) == configs["explicit"]["tp"]
+            and sum(trig.values()) == configs["explicit"]["tp"] + configs["explicit"]["fp"]
+        )
+        result["jobs_agree"] = jobs_agree(paths, explicit, ss.resolve_jobs(args.jobs), args.lookahead_cap)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    return 0 if result.get("agrees_with_aggregate", True) and result.get("jobs_agree", True) else 1
+
+
+def _count_lines(paths: list[pathlib.Path]) -> int:
+    lines = 0
+    for p in paths:
+        with p.open("rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                lines += block.count(b"\n")
+    return lines
+
+
+def _source_commit() -> str | None:
+    """git HEAD of the checkout holding skill-stats.py, plus "-dirty" for local edits."""
+    here = pathlib.Path(ss.__file__).parent
+    try:
+        head = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=here,
+                              capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--", ss.__file__], cwd=here,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return head + ("-dirty" if dirty else "")
+
+
+def _stage(fn, repeat: int, files: int, mb: float, events: int) -> dict:
+    """Best-of-`repeat` time of `fn` with corpus throughput; `fn` returns a result digest input."""
+    best, out = float("inf"), None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t0)
+    return {
+        "sec": round(best, 4),
+        "files_per_sec": round(files / best, 1) if best else None,
+        "mb_per_sec": round(mb / best, 1) if best else None,
+        "events_per_sec": round(events / best) if best else None,
+        "output": out,
+        "digest": hashlib.sha256(repr(out).encode("utf-8", "surrogatepass")).hexdigest()[:16],
+    }
+
+
+def cmd_stages(args: argparse.Namespace) -> int:
+    root = pathlib.Path(args.root)
+    paths = sorted(ss.iter_transcripts(0, None, None, root))
+    if not paths:
+        print(f"[bench] no transcripts under {args.root}", file=sys.stderr)
+        return 1
+    plugin_root = pathlib.Path(args.plugin_root) if args.plugin_root else ss.plugin_root_default()
+    skills = ss.load_skills(plugin_root)
+    size = sum(p.stat().st_size for p in paths)
+    mb = size / (1024 * 1024)
+    events = _count_lines(paths)
+    jobs = ss.resolve_jobs(args.jobs)
+
+    def transcripts() -> int:
+        return len(list(ss.iter_transcripts(0, None, None, root)))
+
+    def decoded() -> int:
+        return sum(1 for p in paths for _ev in ss.iter_events(p))
+
+    def timelines() -> list[int]:
+        counts = [0, 0]
+        for p in paths:
+            tl, _project = ss.build_timeline(p)
+            for kind, _data, _ts in tl:
+                counts[kind == "skill"] += 1
+        return counts
+
+    def aggregate() -> list[int]:
+        inv, trig, hits = ss.merge_counters(ss.aggregate_by_project(paths, skills, jobs=jobs))
+        return [sum(inv.values()), sum(trig.values()), sum(hits.values())]
+
+    stages = {
+        "iter_transcripts": transcripts,
+        "iter_events": decoded,
+        "build_timeline": timelines,
+        "aggregate_by_project": aggregate,
+    }
+    only = args.stage or list(stages)
+    result = {
+        "commit": _source_commit(),
+        "python": platform.python_version(),
+        "orjson": ss.orjson is not None,
+        "jobs": jobs,
+        "repeat": args.repeat,
+        "corpus": {"root": str(root), "files": len(paths), "mb": round(mb, 1), "events": events},
+        "stages": {name: _stage(stages[name], args.repeat, len(paths), mb, events) for name in only},
+    }
+    if args.baseline:
+        base = json.loads(pathlib.Path(args.baseline).read_text(encoding="utf-8"))
+        if base.get("corpus") != result["corpus"]:
+            print("[bench] baseline was measured on a different corpus", file=sys.stderr)
+        for name, cur in result["stages"].items():
+            prev = base.get("stages", {}).get(name)
+            if prev:
+                cur["baseline_sec"] = prev["sec"]
+                cur["speedup"] = round(prev["sec"] / cur["sec"], 2) if cur["sec"] else None
+                cur["identical"] = prev["digest"] == cur["digest"]
+        result["baseline_commit"] = base.get("commit")
+    text = json.dumps(result, indent=2)
+    if args.out:
+        pathlib.Path(args.out).write_text(text + "\n", encoding="utf-8")
+    print(text)
+    return 0 if all(st.get("identical", True) for st in result["stages"].values()) else 1
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="skill-stats micro-benchmarks")
+    sub = ap.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("matcher", help="トリガーマッチングの旧ループと TriggerMatcher を比較")
+    p.add_argument("--plugin-root", default=None,
+                   help="NDFプラグインのルート (default: 自動検出)")
+    p.add_argument("--include-fallback", action="store_true",
+                   help="description からのフォールバック語彙も含める")
+    p.add_argument("--source", choices=["synthetic", "transcripts"], default="synthetic",
+                   help="メッセージの取得元 (default: synthetic)")
+    p.add_argument("--messages", type=int, default=20000,
+                   help="ベンチマークに使うメッセージ数 (default: 20000)")
+    p.add_argument("--repeat", type=int, default=3,
+                   help="計測回数 (最良値を採用、default: 3)")
+    p.add_argument("--seed", type=int, default=0)
+    p.set_defaults(func=cmd_matcher)
+
+    p = sub.add_parser("gen", help="合成 transcript ツリーを生成")
+    p.add_argument("--out", required=True, help="出力先ディレクトリ")
+    p.add_argument("--size-mb", type=int, default=1024,
+                   help="生成する合計サイズ (MB、default: 1024)")
+    p.add_argument("--projects", type=int, default=8,
+                   help="プロジェクト数 (default: 8)")
+    p.add_argument("--session-kb", type=int, default=4096,
+                   help="1 セッションの平均サイズ (KB、default: 4096)")
+    p.add_argument("--sessions", type=int, default=0,
+                   help="生成するセッション数 (指定時は --size-mb の代わりにこの数で止める)")
+    p.add_argument("--payload-kb", type=int, default=16,
+                   help="tool_result ペイロードの平均サイズ (KB、default: 16)")
+    p.add_argument("--payload-dist", choices=["uniform", "lognormal"], default="uniform",
+                   help="ペイロードサイズの分布 (default: uniform、lognormal は少数の巨大な結果を含む)")
+    p.add_argument("--skill-rate", type=float, default=0.15,
+                   help="ツール呼び出しのうち Skill の割合 (default: 0.15)")
+    p.add_argument("--write-rate", type=float, default=0.20,
+                   help="ツール呼び出しのうちペイロードを入力に持つ Write/Edit の割合 (default: 0.20)")
+    p.add_argument("--tools-per-turn", type=int, default=6,
+                   help="ユーザー発言 1 回あたりのツール呼び出し数の上限 (default: 6)")
+    p.add_argument("--system-rate", type=float, default=0.0,
+                   help="ターン後に system イベントを挟む確率 (default: 0)")
+    p.add_argument("--resume-rate", type=float, default=0.0,
+                   help="同じプロジェクトの既存セッションを再開 / フォークして始める確率 (default: 0)")
+    p.add_argument("--seed", type=int, default=0)
+    p.set_defaults(func=cmd_gen)
+
+    p = sub.add_parser("events", help="全行デコードと pre-filter の timeline 抽出を比較")
+    p.add_argument("--root", required=True, help="transcript ツリー (gen の出力など)")
+    p.add_argument("--plugin-root", default=None,
+                   help="NDFプラグインのルート (default: 自動検出)")
+    p.add_argument("--jobs", type=int, default=4,
+                   help="直列集計と比較する aggregate_by_project の並列数 (default: 4、0 で CPU 数)")
+    p.set_defaults(func=cmd_events)
+
+    p = sub.add_parser("eval", help="トリガーマッチングの precision / recall とキーワード削減案を評価")
+    p.add_argument("--plugin-root", default=None,
+                   help="NDFプラグインのルート (default: 自動検出)")
+    p.add_argument("--root", action="append", default=None,
+                   help="ラベル付けに使う transcript ディレクトリ (複数指定可、default: ~/.claude/projects)")
+    p.add_argument("--days", type=int, default=90,
+                   help="対象 transcript の遡及日数 (default: 90、0 で全期間)")
+    p.add_argument("--labels", default=None,
+                   help='手動ラベルの JSONL ({"text": ..., "skills": [...]} / 行)。指定時は transcript を読まない')
+    p.add_argument("--sample", type=int, default=5000,
+                   help="評価に使うメッセージ数 (reservoir sampling、default: 5000、0 で全件)")
+    p.add_argument("--lookahead-cap", type=int, default=100,
+                   help="ユーザー発言後に正解ラベルとみなす Skill 呼び出し数の上限 (default: 100)")
+    p.add_argument("--repeat", type=int, default=3,
+                   help="計測回数 (最良値を採用、default: 3)")
+    p.add_argument("--jobs", type=int, default=4,
+                   help="全件評価時に直列集計と比較する aggregate_by_project の並列数 (default: 4、0 で CPU 数)")
+    p.add_argument("--seed", type=int, default=0)
+    p.set_defaults(func=cmd_eval)
+
+    p = sub.add_parser("stages", help="iter_transcripts / iter_events / build_timeline / aggregate_by_project を個別に計測")
+    p.add_argument("--root", required=True, help="transcript ツリー (gen の出力など)")
+    p.add_argument("--plugin-root", default=None,
+                   help="NDFプラグインのルート (default: 自動検出)")
+    p.add_argument("--stage", action="append", default=None,
+                   choices=["iter_transcripts", "iter_events", "build_timeline", "aggregate_by_project"],
+                   help="計測する段階 (複数指定可、default: すべて)")
+    p.add_argument("--jobs", type=int, default=1,
+                   help="aggregate_by_project の並列数 (default: 1、0 で CPU 数)")
+    p.add_argument("--repeat", type=int, default=3,
+                   help="計測回数 (最良値を採用、default: 3)")
+    p.add_argument("--out", default=None, help="結果の JSON を書き出すファイル")
+    p.add_argument("--baseline", default=None,
+                   help="以前の --out の JSON。段階ごとの speedup と出力の一致を追加する")
+    p.set_defaults(func=cmd_stages)
+
+    args = ap.parse_args()
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -9,19 +9,48 @@ Scans ~/.claude/projects/**/*.jsonl and counts, for each NDF skill:
                  by an invocation of the same skill before the next user turn
   - hit_rate:    hits / triggers (percent)
 
-Supports project-level breakdown and date-range filtering.
+Supports project-level breakdown and date-range filtering. Parsed timelines
+are cached in a SQLite index so reruns only parse bytes appended since the
+previous run. Other transcript directories and tar / zip archives of them can
+be aggregated together with --root.
+
+The `export` subcommand writes one row per skill event to Parquet (when
+pyarrow is installed) or CSV for slicing in DuckDB / pandas. The `profile`
+subcommand attributes every tool call (Bash, Read, MCP tools, Skill, ...) to
+its result size and wall time. The `serve` subcommand follows transcripts as
+they are written (inotify, or polling) and serves live counters as JSON and
+Prometheus metrics.
 """
 from __future__ import annotations
 
 import argparse
+import csv
+import hashlib
 import json
+import math
+import mmap
 import os
 import pathlib
+import random
 import re
+import select
+import sqlite3
 import sys
+import struct
+import tarfile
+import threading
+import time
+import zipfile
 from collections import Counter, defaultdict
-from datetime import datetime, timedelta
-from typing import Iterable
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import IO, Iterable
+
+try:  # optional: faster decoding of candidate lines
+    import orjson
+except ImportError:  # pragma: no cover - stdlib json fallback
+    orjson = None
 
 
 def plugin_root_default() -> pathlib.Path:
@@ -43,20 +72,42 @@ def _parse_date(s: str | None) -> datetime | None:
     raise SystemExit(f"[skill-stats] invalid date: {s} (expected YYYY-MM-DD)")
 
 
-def iter_transcripts(
+def parse_event_ts(value: object) -> float | None:
+    """Parse an event `timestamp` (ISO 8601, usually UTC `Z`) to epoch seconds."""
+    if not isinstance(value, str) or not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
+
+BUCKETS = ("day", "week", "month")
+
+
+def bucket_label(ts: float | None, bucket: str) -> str:
+    """Local-time bucket label: 2026-04-01 / 2026-W14 / 2026-04 ("unknown" without ts)."""
+    if ts is None:
+        return "unknown"
+    d = datetime.fromtimestamp(ts)
+    if bucket == "day":
+        return f"{d:%Y-%m-%d}"
+    if bucket == "week":
+        year, week, _ = d.isocalendar()
+        return f"{year}-W{week:02d}"
+    return f"{d:%Y-%m}"
+
+
+def resolve_window(
     days: int | None,
     date_from: datetime | None,
     date_to: datetime | None,
-) -> Iterable[pathlib.Path]:
-    """Yield transcript .jsonl paths whose mtime falls in the requested window.
+) -> tuple[float | None, float | None]:
+    """Return the (lower, upper) epoch-second bounds of the requested window.
 
     Priority: explicit --from/--to > --days (if neither given and days>0, use days).
+    `upper` is inclusive to the end of the --to day; None means unbounded.
     """
-    root = pathlib.Path.home() / ".claude" / "projects"
-    if not root.exists():
-        return
-
-    # Compute effective cutoffs
     lower: datetime | None = date_from
     upper: datetime | None = date_to
     if lower is None and days is not None and days > 0:
@@ -64,32 +115,352 @@ def iter_transcripts(
     # make upper inclusive to end-of-day
     if upper is not None:
         upper = upper + timedelta(days=1) - timedelta(microseconds=1)
+    return (
+        lower.timestamp() if lower is not None else None,
+        upper.timestamp() if upper is not None else None,
+    )
+
+
+def default_root() -> pathlib.Path:
+    return pathlib.Path.home() / ".claude" / "projects"
+
+
+def iter_transcripts(
+    days: int | None,
+    date_from: datetime | None,
+    date_to: datetime | None,
+    root: pathlib.Path | None = None,
+) -> Iterable[pathlib.Path]:
+    """Yield transcript .jsonl paths under `root` that may hold events in the requested window.
+
+    Only the lower bound can be decided from mtime: a transcript last written
+    before the window cannot contain later events, but one written after the
+    window may still hold older ones (long-lived / resumed sessions), so the
+    upper bound is applied per event (see `window_filter`).
+    """
+    if root is None:
+        root = default_root()
+    if not root.exists():
+        return
 
+    lower, _upper = resolve_window(days, date_from, date_to)
     for p in root.rglob("*.jsonl"):
         try:
-            mtime = datetime.fromtimestamp(p.stat().st_mtime)
+            mtime = p.stat().st_mtime
         except OSError:
             continue
-        if lower and mtime < lower:
-            continue
-        if upper and mtime > upper:
+        if lower is not None and mtime < lower:
             continue
         yield p
 
 
-def iter_events(path: pathlib.Path) -> Iterable[dict]:
+def is_archive(path: pathlib.Path) -> bool:
+    """True for a regular file that zipfile / tarfile (any compression) can read."""
+    if not path.is_file():
+        return False
     try:
-        with path.open("r", encoding="utf-8", errors="replace") as f:
-            for line in f:
-                line = line.strip()
-                if not line:
+        return zipfile.is_zipfile(path) or tarfile.is_tarfile(path)
+    except OSError:
+        return False
+
+
+def iter_archive_members(
+    archive: pathlib.Path,
+    lower: float | None = None,
+) -> Iterable[tuple[pathlib.PurePosixPath, float, IO[bytes]]]:
+    """Yield (member_path, mtime, stream) for each *.jsonl member of a tar / zip archive.
+
+    Nothing is extracted: tar archives are read in stream mode (`r|*`) and
+    each stream is only valid until the next member is requested. Members
+    last modified before `lower` are skipped, like in iter_transcripts().
+    """
+    if zipfile.is_zipfile(archive):
+        with zipfile.ZipFile(archive) as zf:
+            for info in zf.infolist():
+                if info.is_dir() or not info.filename.endswith(".jsonl"):
                     continue
-                try:
-                    yield json.loads(line)
-                except json.JSONDecodeError:
+                mtime = datetime(*info.date_time).timestamp()
+                if lower is not None and mtime < lower:
                     continue
+                with zf.open(info) as f:
+                    yield pathlib.PurePosixPath(info.filename), mtime, f
+        return
+    with tarfile.open(archive, "r|*") as tf:
+        for info in tf:
+            if not info.isfile() or not info.name.endswith(".jsonl"):
+                continue
+            if lower is not None and info.mtime < lower:
+                continue
+            f = tf.extractfile(info)
+            if f is None:
+                continue
+            with f:
+                yield pathlib.PurePosixPath(info.name), float(info.mtime), f
+
+
+def _mtime_in_window(mtime: float, window: tuple[float | None, float | None] | None) -> bool:
+    if window is None:
+        return True
+    lower, upper = window
+    return (lower is None or mtime >= lower) and (upper is None or mtime <= upper)
+
+
+def _untimed_allowed(path: pathlib.Path, window: tuple[float | None, float | None] | None) -> bool:
+    """Events without a timestamp fall back to the transcript mtime for windowing."""
+    if window is None:
+        return True
+    try:
+        mtime = path.stat().st_mtime
+    except OSError:
+        return False
+    return _mtime_in_window(mtime, window)
+
+
+def window_filter(
+    tl: Iterable[tuple[str, object, float | None]],
+    window: tuple[float | None, float | None] | None,
+    keep_untimed: bool = True,
+) -> Iterable[tuple[str, object, float | None]]:
+    """Drop timeline entries whose event timestamp lies outside `window`."""
+    if window is None:
+        yield from tl
+        return
+    lower, upper = window
+    for entry in tl:
+        ts = entry[2]
+        if ts is None:
+            if keep_untimed:
+                yield entry
+        elif (lower is None or ts >= lower) and (upper is None or ts <= upper):
+            yield entry
+
+
+# Byte probes for the pre-filter. Claude Code writes compact JSON without
+# escaping ASCII, so an event can only contribute to the timeline if its raw
+# line contains one of these tokens: `"user"` for type=user, `"Skill"` for a
+# Skill tool_use, `"cwd"` while the project cwd is still unknown. Lines
+# without them (assistant text, other tool_use, tool output echoed into
+# progress/system events, ...) are skipped without decoding.
+_PROBE_USER = b'"user"'
+_PROBE_SKILL = b'"Skill"'
+_PROBE_CWD = b'"cwd"'
+# Marks an assistant event. Non-candidate lines are only tested for it to
+# number assistant events (see ScanState.assistants) without decoding them.
+_MARKER_ASSISTANT = b'"type":"assistant"'
+# The marker is looked for this close to either end of a line first.
+_MARKER_EDGE = 512
+
+# Transcripts at least this large are memory-mapped instead of read whole.
+_MMAP_THRESHOLD = 4 * 1024 * 1024
+# How much of a mapping is scanned before its pages are dropped from RSS.
+_MMAP_RELEASE_BYTES = 16 * 1024 * 1024
+# Read size for streams that cannot be mapped (archive members).
+_STREAM_CHUNK = 1024 * 1024
+
+
+def _has_marker(find, marker: bytes, pos: int, end: int) -> bool:
+    """`marker in buf[pos:end]`, testing the line's tail and head before the middle.
+
+    Claude Code writes "type" after the (possibly huge) message body, so on
+    real transcripts the marker is found without scanning the payload.
+    """
+    if end - pos <= 2 * _MARKER_EDGE:
+        return find(marker, pos, end) >= 0
+    overlap = len(marker)
+    return (
+        find(marker, end - _MARKER_EDGE, end) >= 0
+        or find(marker, pos, pos + _MARKER_EDGE) >= 0
+        or find(marker, pos + _MARKER_EDGE - overlap, end - _MARKER_EDGE + overlap) >= 0
+    )
+
+
+def _iter_lines(
+    path: pathlib.Path,
+    start: int = 0,
+    probes: list[bytes] | None = None,
+    marker: bytes | None = None,
+) -> Iterable[tuple[int, bool, bytes | memoryview | None, bool]]:
+    """Yield (end_offset, terminated, raw, marked) for each line from byte offset `start`.
+
+    Newlines are located in the raw bytes, never in decoded text. With
+    `probes`, a line containing none of them is yielded with raw=None without
+    being copied out of the buffer; callers may shrink the list while
+    iterating (e.g. drop `_PROBE_CWD` once the cwd is known). For such lines
+    `marked` tells whether they contain `marker`; it is False otherwise.
+
+    Large files are memory-mapped: `raw` is then a zero-copy memoryview that
+    is only valid until the next iteration, and already-scanned pages are
+    released as the scan moves on, so peak RSS stays bounded by the largest
+    candidate line rather than the file size.
+    """
+    try:
+        f = path.open("rb")
     except OSError:
         return
+    with f:
+        try:
+            size = os.fstat(f.fileno()).st_size
+            if size <= start:
+                return
+            mm: mmap.mmap | None = None
+            if size >= _MMAP_THRESHOLD:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                buf, base = mm, 0
+                if hasattr(mm, "madvise") and hasattr(mmap, "MADV_SEQUENTIAL"):
+                    mm.madvise(mmap.MADV_SEQUENTIAL)
+            else:
+                f.seek(start)
+                buf, base = f.read(), start
+        except (OSError, ValueError):
+            return
+        view = memoryview(buf)
+        release = mm is not None and hasattr(mm, "madvise") and hasattr(mmap, "MADV_DONTNEED")
+        released = 0
+        try:
+            find = buf.find
+            n = len(buf)
+            pos = start - base
+            while pos < n:
+                nl = find(b"\n", pos)
+                end = n if nl < 0 else nl + 1
+                if probes is None:
+                    raw = view[pos:end]
+                else:
+                    raw = None
+                    for probe in probes:
+                        if find(probe, pos, end) >= 0:
+                            raw = view[pos:end]
+                            break
+                marked = raw is None and marker is not None and _has_marker(find, marker, pos, end)
+                yield base + end, nl >= 0, raw, marked
+                if raw is not None:
+                    raw.release()
+                    raw = None
+                pos = end
+                if release and pos - released >= _MMAP_RELEASE_BYTES:
+                    upto = pos - pos % mmap.PAGESIZE
+                    mm.madvise(mmap.MADV_DONTNEED, released, upto - released)
+                    released = upto
+        finally:
+            view.release()
+            if mm is not None:
+                mm.close()
+
+
+def _iter_stream_lines(
+    f: IO[bytes],
+    probes: list[bytes] | None = None,
+    marker: bytes | None = None,
+) -> Iterable[tuple[int, bool, bytes | memoryview | None, bool]]:
+    """_iter_lines() for a non-seekable binary stream such as an archive member.
+
+    The stream is read in fixed-size chunks; a line spanning chunks is joined
+    once when its newline arrives, so long lines are not copied repeatedly.
+    """
+    parts: list[bytes] = []
+    offset = 0
+    while True:
+        chunk = f.read(_STREAM_CHUNK)
+        if not chunk:
+            break
+        view = memoryview(chunk)
+        find = chunk.find
+        n = len(chunk)
+        pos = 0
+        while pos < n:
+            nl = find(b"\n", pos)
+            if nl < 0:
+                parts.append(chunk[pos:] if pos else chunk)
+                break
+            end = nl + 1
+            if parts:
+                parts.append(chunk[pos:end])
+                line = b"".join(parts)
+                parts = []
+                offset += len(line)
+                marked = False
+                if probes is not None and not any(probe in line for probe in probes):
+                    marked = marker is not None and _has_marker(line.find, marker, 0, len(line))
+                    line = None
+                yield offset, True, line, marked
+            else:
+                offset += end - pos
+                raw = None
+                if probes is None:
+                    raw = view[pos:end]
+                else:
+                    for probe in probes:
+                        if find(probe, pos, end) >= 0:
+                            raw = view[pos:end]
+                            break
+                marked = raw is None and marker is not None and _has_marker(find, marker, pos, end)
+                yield offset, True, raw, marked
+                if raw is not None:
+                    raw.release()
+                    raw = None
+            pos = end
+        view.release()
+    if parts:
+        line = b"".join(parts)
+        offset += len(line)
+        marked = False
+        if probes is not None and not any(probe in line for probe in probes):
+            marked = marker is not None and _has_marker(line.find, marker, 0, len(line))
+            line = None
+        yield offset, False, line, marked
+
+
+# Resumed and forked sessions copy earlier events (same "uuid") into a new
+# transcript. The key is read from the raw bytes so a copy is skipped before
+# it is decoded; "parentUuid" does not match, and a "uuid" inside string
+# content is escaped (\"uuid\").
+_UUID_RE = re.compile(rb'"uuid":"([0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12})"')
+_ASSISTANT_RE = re.compile(re.escape(_MARKER_ASSISTANT))
+
+
+def event_key(raw: bytes | memoryview) -> bytes:
+    """16-byte identity of an event line: its uuid, or a content hash when it has none."""
+    m = _UUID_RE.search(raw)
+    if m is not None:
+        return bytes.fromhex(m.group(1).replace(b"-", b"").decode("ascii"))
+    return hashlib.blake2b(raw, digest_size=16).digest()
+
+
+def _decode_line(raw: bytes | memoryview) -> dict | None:
+    if orjson is not None:
+        try:
+            ev = orjson.loads(raw)
+        except orjson.JSONDecodeError:
+            # invalid UTF-8, lone surrogates, blank lines...: let the stdlib
+            # path (errors="replace") decide so the output stays identical
+            pass
+        else:
+            return ev if isinstance(ev, dict) else None
+    line = str(raw, "utf-8", errors="replace").strip()
+    if not line:
+        return None
+    try:
+        ev = json.loads(line)
+    except json.JSONDecodeError:
+        return None
+    return ev if isinstance(ev, dict) else None
+
+
+def iter_events(path: pathlib.Path, candidates_only: bool = False) -> Iterable[dict]:
+    """Yield decoded events of a transcript.
+
+    With `candidates_only`, lines that cannot contribute to the skill timeline
+    are dropped by byte probes before JSON decoding (see `_PROBE_USER`).
+    """
+    probes = [_PROBE_USER, _PROBE_SKILL, _PROBE_CWD] if candidates_only else None
+    for _end, _terminated, raw, _marked in _iter_lines(path, 0, probes):
+        if raw is None:
+            continue
+        ev = _decode_line(raw)
+        if ev is not None:
+            if probes and _PROBE_CWD in probes and isinstance(ev.get("cwd"), str) and ev["cwd"]:
+                probes.remove(_PROBE_CWD)
+            yield ev
 
 
 _FRONT_MATTER_RE = re.compile(r"\A---\s*\n(.*?)\n---\s*\n", re.DOTALL)
@@ -161,32 +532,51 @@ def _dedupe_ci(items: list[str]) -> list[str]:
     return out
 
 
-def load_skills(plugin_root: pathlib.Path, include_fallback: bool = False) -> list[dict]:
+def _parse_skill(dir_name: str, text: str) -> dict:
+    """Registry entry for one SKILL.md: name, description and both trigger variants."""
+    fm = parse_front_matter(text)
+    name = fm.get("name", dir_name).strip().strip('"')
+    desc = fm.get("description", "").strip().strip('"')
+    return {
+        "dir": dir_name,
+        "name": name,
+        "description": desc,
+        # include_fallback=False / True -> [triggers, triggers_source]
+        "triggers": {
+            "default": list(extract_triggers(desc)),
+            "fallback": list(extract_triggers(desc, include_fallback=True)),
+        },
+    }
+
+
+def load_skills(
+    plugin_root: pathlib.Path,
+    include_fallback: bool = False,
+    use_registry: bool = True,
+) -> list[dict]:
+    """Return the plugin's skills with their trigger keywords.
+
+    Served from the compiled skill registry (see `load_registry`), which only
+    re-parses SKILL.md files whose content changed.
+    """
+    if use_registry:
+        registry = load_registry(plugin_root)
+    else:
+        registry = compile_registry(plugin_root, with_matchers=False)
+        registry.pop("changed")
+    variant = "fallback" if include_fallback else "default"
     out: list[dict] = []
-    skills_dir = plugin_root / "skills"
-    if not skills_dir.is_dir():
-        return out
-    for d in sorted(skills_dir.iterdir()):
-        if not d.is_dir():
-            continue
-        f = d / "SKILL.md"
-        if not f.exists():
-            continue
-        try:
-            text = f.read_text(encoding="utf-8", errors="replace")
-        except OSError:
-            continue
-        fm = parse_front_matter(text)
-        name = fm.get("name", d.name).strip().strip('"')
-        desc = fm.get("description", "").strip().strip('"')
-        triggers, source = extract_triggers(desc, include_fallback=include_fallback)
+    for entry in registry["skills"]:
+        triggers, source = entry["triggers"][variant]
         out.append({
-            "name": name,
-            "qualified": f"ndf:{name}",
-            "triggers": triggers,
+            "name": entry["name"],
+            "qualified": f"ndf:{entry['name']}",
+            "triggers": list(triggers),
             "triggers_source": source,
-            "dir": d.name,
+            "dir": entry["dir"],
         })
+    if use_registry:
+        _PRECOMPILED_MATCHERS[_matcher_key(out)] = registry["matchers"][variant]
     return out
 
 
@@ -252,184 +642,2997 @@ def detect_project(path: pathlib.Path, first_cwd: str | None) -> str:
     return parent
 
 
-def build_timeline(path: pathlib.Path) -> tuple[list[tuple[str, object]], str]:
-    """Return (timeline, project_label)."""
-    timeline: list[tuple[str, object]] = []
-    first_cwd: str | None = None
-    for ev in iter_events(path):
-        if first_cwd is None:
+class ScanState:
+    """Resumable progress of a transcript scan.
+
+    `consumed` stops before a trailing line that is not newline-terminated
+    and does not decode yet (a writer may still be appending to it), so the
+    scan can be resumed from there later. `assistants` counts the assistant
+    events up to `consumed`.
+    """
+
+    __slots__ = ("consumed", "first_cwd", "assistants")
+
+    def __init__(self, consumed: int = 0, first_cwd: str | None = None, assistants: int = 0) -> None:
+        self.consumed = consumed
+        self.first_cwd = first_cwd
+        self.assistants = assistants
+
+
+def _timeline_probes(state: ScanState) -> list[bytes]:
+    probes = [_PROBE_USER, _PROBE_SKILL]
+    if state.first_cwd is None:
+        probes.append(_PROBE_CWD)
+    return probes
+
+
+def iter_timeline(
+    path: pathlib.Path,
+    state: ScanState | None = None,
+    with_aidx: bool = False,
+    seen: set[bytes] | None = None,
+    with_key: bool = False,
+) -> Iterable[tuple]:
+    """Stream ("user", text, ts) / ("skill", name, ts) entries of `path` from `state.consumed`.
+
+    `ts` is the event timestamp in epoch seconds (None when absent). With
+    `with_aidx`, entries get a fourth field: the number of assistant events
+    so far (for a skill entry, including the one invoking it), so the
+    difference between two entries is their assistant-event distance.
+
+    `seen` holds the event keys already counted: such events (copied by a
+    resumed / forked session) are skipped without being decoded, and the
+    keys of new entries are added to it. `with_key` instead appends the
+    event key (see event_key) to every entry, for the index to tag copies.
+
+    `state` is updated while iterating; nothing but the current line is held
+    in memory.
+    """
+    if state is None:
+        state = ScanState()
+    probes = _timeline_probes(state)
+    lines = _iter_lines(path, state.consumed, probes, _MARKER_ASSISTANT)
+    return _timeline_from_lines(lines, probes, state, with_aidx, seen, with_key)
+
+
+def iter_stream_timeline(
+    f: IO[bytes],
+    state: ScanState | None = None,
+    with_aidx: bool = False,
+    seen: set[bytes] | None = None,
+) -> Iterable[tuple]:
+    """iter_timeline() for a binary stream read from the start (e.g. an archive member)."""
+    if state is None:
+        state = ScanState()
+    probes = _timeline_probes(state)
+    return _timeline_from_lines(_iter_stream_lines(f, probes, _MARKER_ASSISTANT), probes, state, with_aidx, seen)
+
+
+def _timeline_from_lines(
+    lines: Iterable[tuple[int, bool, bytes | memoryview | None, bool]],
+    probes: list[bytes],
+    state: ScanState,
+    with_aidx: bool = False,
+    seen: set[bytes] | None = None,
+    with_key: bool = False,
+) -> Iterable[tuple]:
+    # `probes` is shared with the line reader: dropping the cwd probe here
+    # takes effect on the very next line.
+    key = None
+    for end, terminated, raw, marked in lines:
+        if raw is None:
+            # an unterminated line is read again on resume: count it then
+            if marked and terminated:
+                state.assistants += 1
+            if terminated:
+                state.consumed = end
+            continue
+        dup = False
+        if seen is not None or with_key:
+            key = event_key(raw)
+            dup = seen is not None and key in seen
+            if dup and state.first_cwd is not None:
+                if terminated:
+                    state.consumed = end
+                    if _ASSISTANT_RE.search(raw):
+                        state.assistants += 1
+                raw = None
+                continue
+        ev = _decode_line(raw)
+        # release the (possibly huge) line before the reader produces the next
+        raw = None
+        if terminated or ev is not None:
+            state.consumed = end
+        if ev is None:
+            continue
+        if state.first_cwd is None:
             cwd = ev.get("cwd")
             if isinstance(cwd, str) and cwd:
-                first_cwd = cwd
+                state.first_cwd = cwd
+                probes.remove(_PROBE_CWD)
         t = ev.get("type")
+        if dup:
+            # decoded only for the cwd
+            if t == "assistant":
+                state.assistants += 1
+            continue
         if t == "user":
             text = extract_user_text(ev)
+            ts = parse_event_ts(ev.get("timestamp")) if text else None
+            ev = None
             if text:
-                timeline.append(("user", text))
+                if seen is not None:
+                    seen.add(key)
+                entry = ("user", text, ts, state.assistants) if with_aidx else ("user", text, ts)
+                yield (*entry, key) if with_key else entry
         elif t == "assistant":
-            for skill in extract_skill_invocations(ev):
-                timeline.append(("skill", skill))
-    project = detect_project(path, first_cwd)
-    return timeline, project
+            state.assistants += 1
+            skills = extract_skill_invocations(ev)
+            ts = parse_event_ts(ev.get("timestamp")) if skills else None
+            ev = None
+            if skills and seen is not None:
+                seen.add(key)
+            for skill in skills:
+                entry = ("skill", skill, ts, state.assistants) if with_aidx else ("skill", skill, ts)
+                yield (*entry, key) if with_key else entry
 
 
-def aggregate_by_project(
-    transcripts: list[pathlib.Path],
-    skills: list[dict],
-    lookahead_cap: int = 100,
-) -> dict[str, tuple[Counter, Counter, Counter]]:
-    """Return { project: (invocations, triggers_hits, hits) }."""
-    result: dict[str, tuple[Counter, Counter, Counter]] = defaultdict(
-        lambda: (Counter(), Counter(), Counter())
-    )
-    skill_triggers = [
-        (s["qualified"], [t.lower() for t in s["triggers"] if t])
-        for s in skills
-    ]
-    for path in transcripts:
-        tl, project = build_timeline(path)
-        inv, trig_h, hits = result[project]
-        for i, (kind, data) in enumerate(tl):
-            if kind == "skill":
-                inv[data] += 1
-                continue
-            if kind != "user":
-                continue
-            text_l = str(data).lower()
-            for qualified, trs in skill_triggers:
-                if not trs:
-                    continue
-                if any(t in text_l for t in trs):
-                    trig_h[qualified] += 1
-                    end = min(i + 1 + lookahead_cap, len(tl))
-                    for j in range(i + 1, end):
-                        k2, d2 = tl[j]
-                        if k2 == "user":
-                            break
-                        if k2 == "skill" and d2 == qualified:
-                            hits[qualified] += 1
-                            break
-    return result
+def scan_transcript(
+    path: pathlib.Path,
+    start: int = 0,
+    first_cwd: str | None = None,
+    assistants: int = 0,
+) -> tuple[list[tuple[str, object, float | None, int, bytes]], int, str | None, int]:
+    """Parse `path` from byte offset `start`.
 
+    Return (timeline with assistant indexes and event keys, consumed_offset,
+    first_cwd, assistants).
+    """
+    state = ScanState(start, first_cwd, assistants)
+    timeline = list(iter_timeline(path, state, with_aidx=True, with_key=True))
+    return timeline, state.consumed, state.first_cwd, state.assistants
 
-def merge_counters(
-    per_project: dict[str, tuple[Counter, Counter, Counter]],
-) -> tuple[Counter, Counter, Counter]:
-    inv_total: Counter = Counter()
-    trig_total: Counter = Counter()
-    hits_total: Counter = Counter()
-    for inv, trig, hits in per_project.values():
-        inv_total.update(inv)
-        trig_total.update(trig)
-        hits_total.update(hits)
-    return inv_total, trig_total, hits_total
 
+def build_timeline(path: pathlib.Path) -> tuple[list[tuple[str, object, float | None]], str]:
+    """Return (timeline, project_label)."""
+    timeline, _consumed, first_cwd, _assistants = scan_transcript(path)
+    project = detect_project(path, first_cwd)
+    return [entry[:3] for entry in timeline], project
 
-def build_rows(
-    skills: list[dict],
-    invocations: Counter,
-    triggers_hits: Counter,
-    hits: Counter,
-) -> tuple[list[dict], dict]:
-    rows: list[dict] = []
-    total_inv = total_trig = total_hit = 0
-    for s in sorted(skills, key=lambda x: x["name"]):
-        q = s["qualified"]
-        inv = invocations.get(q, 0)
-        trig = triggers_hits.get(q, 0)
-        hit = hits.get(q, 0)
-        rate = round(hit / trig * 100, 1) if trig else 0.0
-        rows.append({
-            "skill": q,
-            "triggers_source": s["triggers_source"],
-            "invocations": inv,
-            "triggers": trig,
-            "hits": hit,
-            "hit_rate_pct": rate,
-            "trigger_keywords": s["triggers"],
-        })
-        total_inv += inv
-        if s["triggers_source"] == "explicit":
-            total_trig += trig
-            total_hit += hit
-    total_rate = round(total_hit / total_trig * 100, 1) if total_trig else 0.0
-    total = {
-        "invocations": total_inv,
-        "triggers": total_trig,
-        "hits": total_hit,
-        "hit_rate_pct": total_rate,
-    }
-    return rows, total
 
+def default_index_path() -> pathlib.Path:
+    cache = os.environ.get("XDG_CACHE_HOME") or str(pathlib.Path.home() / ".cache")
+    return pathlib.Path(cache) / "ndf" / "skill-stats" / "index.sqlite"
 
-def format_markdown(rows: list[dict], total: dict, heading: str | None = None) -> str:
-    lines: list[str] = []
-    if heading:
-        lines.append(heading)
-    lines.extend([
-        "| skill | triggers源 | 呼び出し数 | 関連話題 | ヒット | ヒット率 |",
-        "|---|---|---:|---:|---:|---:|",
-    ])
-    for r in rows:
-        src = r["triggers_source"]
-        if src == "none":
-            rate = "-"
-            trig = "-"
-            hit = "-"
-        else:
-            rate = f"{r['hit_rate_pct']}%" if r["triggers"] else "-"
-            trig = str(r["triggers"])
-            hit = str(r["hits"])
-        lines.append(
-            f"| {r['skill']} | {src} | {r['invocations']} | {trig} | {hit} | {rate} |"
-        )
-    lines.append(
-        f"| **合計** | | **{total['invocations']}** | **{total['triggers']}** | **{total['hits']}** | **{total['hit_rate_pct']}%** |"
-    )
-    return "\n".join(lines)
 
+class SeenSet:
+    """Which indexed transcript first stored each event key (see event_key).
 
-def main() -> int:
-    ap = argparse.ArgumentParser(
-        description="NDF skill usage statistics from Claude Code transcripts",
-    )
-    ap.add_argument("--days", type=int, default=90,
-                    help="集計対象の遡及日数 (default: 90、--from/--to 指定時は無視)")
-    ap.add_argument("--from", dest="date_from", default=None,
-                    help="開始日 YYYY-MM-DD (inclusive)")
-    ap.add_argument("--to", dest="date_to", default=None,
-                    help="終了日 YYYY-MM-DD (inclusive)")
-    ap.add_argument("--plugin-root", default=None,
-                    help="NDFプラグインのルート (default: 自動検出)")
-    ap.add_argument("--format", choices=["md", "json"], default="md",
-                    help="出力形式 (default: md)")
-    ap.add_argument("--skill", default=None,
-                    help="skill名(部分一致)でフィルタ")
-    ap.add_argument("--project", default=None,
-                    help="プロジェクト名(部分一致)でフィルタ")
-    ap.add_argument("--by-project", action="store_true",
-                    help="プロジェクト別に個別のテーブルを出力")
-    ap.add_argument("--show-keywords", action="store_true",
-                    help="各skillに抽出されたトリガーキーワードを出力")
-    ap.add_argument("--include-fallback", action="store_true",
-                    help="Triggers欄が無いskillでも description から語彙抽出してマッチ (ノイズ多)")
-    args = ap.parse_args()
+    A Bloom filter answers the common "never seen" case in memory; a filter
+    hit is confirmed against the exact `seen` table, so a false positive
+    costs one lookup and never mistakes an event for a copy. The filter is
+    persisted next to the table and rebuilt at twice the capacity when it
+    fills up. Keys
+    are uuid bytes or content hashes (see event_key), hence already uniform,
+    and are used directly as the double-hashing seeds.
+    """
 
-    plugin_root = pathlib.Path(args.plugin_root) if args.plugin_root else plugin_root_default()
-    if not (plugin_root / "skills").is_dir():
-        print(f"[skill-stats] plugin root not found: {plugin_root}", file=sys.stderr)
-        return 2
+    HASHES = 7
+    BITS_PER_KEY = 10  # ~1% false positives at capacity with 7 hashes
 
-    date_from = _parse_date(args.date_from)
-    date_to = _parse_date(args.date_to)
-    # When explicit date range is given, days becomes informational only
-    effective_days = args.days if (date_from is None and date_to is None) else None
+    def __init__(self, conn: sqlite3.Connection, capacity: int = 1 << 18) -> None:
+        self.conn = conn
+        row = conn.execute("SELECT bits, capacity, n FROM bloom WHERE id = 0").fetchone()
+        if row is None:
+            self._reset(capacity)
+            self.dirty = False
+        else:
+            self.bits, self.capacity, self.n = bytearray(row[0]), row[1], row[2]
+            self.m = len(self.bits) * 8
+            self.dirty = False
 
-    skills = load_skills(plugin_root, include_fallback=args.include_fallback)
-    if args.skill:
-        skills = [s for s in skills if args.skill in s["name"]]
+    def _reset(self, capacity: int) -> None:
+        self.capacity = capacity
+        self.bits = bytearray(capacity * self.BITS_PER_KEY // 8 + 1)
+        self.m = len(self.bits) * 8
+        self.n = 0
+        self.dirty = True
 
-    transcripts = list(iter_transcripts(effective_days, date_from, date_to))
+    def _positions(self, key: bytes) -> Iterable[int]:
+        a = int.from_bytes(key[:8], "little")
+        b = int.from_bytes(key[8:16], "little") | 1
+        m = self.m
+        return ((a + i * b) % m for i in range(self.HASHES))
+
+    def _set_bits(self, key: bytes) -> None:
+        bits = self.bits
+        for pos in self._positions(key):
+            bits[pos >> 3] |= 1 << (pos & 7)
+
+    def owner_of(self, key: bytes) -> int | None:
+        """File id of the transcript that holds the original of `key`, None if new."""
+        bits = self.bits
+        for pos in self._positions(key):
+            if not bits[pos >> 3] & (1 << (pos & 7)):
+                return None
+        row = self.conn.execute("SELECT file_id FROM seen WHERE key = ?", (key,)).fetchone()
+        return None if row is None else row[0]
+
+    def add(self, key: bytes, file_id: int) -> None:
+        self.conn.execute("INSERT OR IGNORE INTO seen (key, file_id) VALUES (?, ?)", (key, file_id))
+        self._set_bits(key)
+        self.n += 1
+        self.dirty = True
+        if self.n > self.capacity:
+            self._reset(self.capacity * 2)
+            for (k,) in self.conn.execute("SELECT key FROM seen"):
+                self._set_bits(k)
+                self.n += 1
+
+    def save(self) -> None:
+        if self.dirty:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO bloom (id, bits, capacity, n) VALUES (0, ?, ?, ?)",
+                (bytes(self.bits), self.capacity, self.n),
+            )
+            self.dirty = False
+
+
+class TranscriptIndex:
+    """Persistent per-transcript timeline cache backed by SQLite.
+
+    Each transcript is keyed by path and remembers size / mtime / inode plus
+    the byte offset already consumed. Unchanged files are served straight from
+    the stored timeline; files that only grew are parsed from the checkpoint;
+    anything else (rotated inode, truncation) is re-parsed from scratch.
+
+    The min / max event timestamp of each transcript is kept alongside, so a
+    windowed report skips transcripts entirely outside the window without
+    reading their events. Each event also stores its assistant-event index
+    (see iter_timeline) for turn-distance measurements.
+
+    Events copied into resumed / forked transcripts are tagged with the
+    transcript that first stored them (see SeenSet) and keep their event key.
+    timeline() leaves a copy out when that transcript, or an earlier copy, is
+    among the paths of the last refresh_many() call, so each run counts an
+    event once among the transcripts it reads whatever else was indexed.
+    """
+
+    SCHEMA_VERSION = 5
+
+    def __init__(self, db_path: pathlib.Path) -> None:
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = db_path
+        self.conn = sqlite3.connect(str(db_path), timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        if version != self.SCHEMA_VERSION:
+            self.conn.executescript(
+                """
+                DROP TABLE IF EXISTS events;
+                DROP TABLE IF EXISTS files;
+                DROP TABLE IF EXISTS seen;
+                DROP TABLE IF EXISTS bloom;
+                """
+            )
+        self.conn.executescript(
+            f"""
+            CREATE TABLE IF NOT EXISTS files (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                path TEXT NOT NULL UNIQUE,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                inode INTEGER NOT NULL,
+                offset INTEGER NOT NULL,
+                first_cwd TEXT,
+                min_ts REAL,
+                max_ts REAL,
+                untimed INTEGER NOT NULL DEFAULT 0,
+                assistants INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE TABLE IF NOT EXISTS events (
+                file_id INTEGER NOT NULL,
+                seq INTEGER NOT NULL,
+                kind TEXT NOT NULL,
+                data TEXT NOT NULL,
+                ts REAL,
+                aidx INTEGER,
+                dup_of INTEGER,
+                key BLOB,
+                PRIMARY KEY (file_id, seq)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS events_copy ON events (key) WHERE key IS NOT NULL;
+            CREATE INDEX IF NOT EXISTS events_dup ON events (dup_of) WHERE dup_of IS NOT NULL;
+            CREATE TABLE IF NOT EXISTS seen (
+                key BLOB PRIMARY KEY,
+                file_id INTEGER NOT NULL
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS seen_file ON seen (file_id);
+            CREATE TABLE IF NOT EXISTS bloom (
+                id INTEGER PRIMARY KEY CHECK (id = 0),
+                bits BLOB NOT NULL,
+                capacity INTEGER NOT NULL,
+                n INTEGER NOT NULL
+            );
+            CREATE TEMP TABLE IF NOT EXISTS active (file_id INTEGER PRIMARY KEY, rank INTEGER NOT NULL);
+            PRAGMA user_version = {self.SCHEMA_VERSION};
+            """
+        )
+        self.conn.commit()
+        self.seen = SeenSet(self.conn)
+
+    def close(self) -> None:
+        self.seen.save()
+        self.conn.commit()
+        self.conn.close()
+
+    def _plan(self, path: pathlib.Path) -> tuple | None:
+        """Return ("fresh", file_id, first_cwd) or ("scan", file_id, st, offset, first_cwd, assistants)."""
+        try:
+            st = path.stat()
+        except OSError:
+            return None
+        key = str(path)
+        row = self.conn.execute(
+            "SELECT id, size, mtime_ns, inode, offset, first_cwd, assistants FROM files WHERE path = ?",
+            (key,),
+        ).fetchone()
+        if row is not None:
+            file_id, size, mtime_ns, inode, offset, first_cwd, assistants = row
+            if inode == st.st_ino and size == st.st_size and mtime_ns == st.st_mtime_ns:
+                return "fresh", file_id, first_cwd
+            if inode != st.st_ino or st.st_size < offset:
+                self._drop_events([(file_id,)])
+                offset, first_cwd, assistants = 0, None, 0
+        else:
+            cur = self.conn.execute(
+                "INSERT INTO files (path, size, mtime_ns, inode, offset) VALUES (?, 0, 0, 0, 0)",
+                (key,),
+            )
+            file_id, offset, first_cwd, assistants = cur.lastrowid, 0, None, 0
+        return "scan", file_id, st, offset, first_cwd, assistants
+
+    def _apply(
+        self,
+        file_id: int,
+        st: os.stat_result,
+        timeline: Iterable[tuple[str, object, float | None, int, bytes]],
+        state: ScanState,
+    ) -> None:
+        """Append `timeline` (may be a lazy iter_timeline with_aidx, with_key) and checkpoint `state`."""
+        seq0 = self.conn.execute(
+            "SELECT COALESCE(MAX(seq) + 1, 0) FROM events WHERE file_id = ?", (file_id,)
+        ).fetchone()[0]
+        self.conn.executemany(
+            "INSERT INTO events (file_id, seq, kind, data, ts, aidx, dup_of, key)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            ((file_id, seq0 + i, kind, str(data), ts, aidx, dup_of, key)
+             for i, (kind, data, ts, aidx, dup_of, key) in enumerate(self._tag_copies(file_id, timeline))),
+        )
+        min_ts, max_ts, untimed = self.conn.execute(
+            "SELECT MIN(ts), MAX(ts), COUNT(*) - COUNT(ts) FROM events WHERE file_id = ?",
+            (file_id,),
+        ).fetchone()
+        self.conn.execute(
+            "UPDATE files SET size = ?, mtime_ns = ?, inode = ?, offset = ?, first_cwd = ?,"
+            " min_ts = ?, max_ts = ?, untimed = ?, assistants = ? WHERE id = ?",
+            (st.st_size, st.st_mtime_ns, st.st_ino, state.consumed, state.first_cwd,
+             min_ts, max_ts, untimed, state.assistants, file_id),
+        )
+
+    def _tag_copies(
+        self,
+        file_id: int,
+        timeline: Iterable[tuple[str, object, float | None, int, bytes]],
+    ) -> Iterable[tuple[str, object, float | None, int, int | None, bytes | None]]:
+        """Add the id of the transcript holding the original; copies keep their key, originals drop it."""
+        current = dup_of = None
+        for kind, data, ts, aidx, key in timeline:
+            if key != current:  # entries of one event share its key
+                current = key
+                dup_of = self.seen.owner_of(key)
+                if dup_of is None:
+                    self.seen.add(key, file_id)
+                elif dup_of == file_id:
+                    dup_of = None
+            yield kind, data, ts, aidx, dup_of, (key if dup_of is not None else None)
+
+    def _drop_events(self, file_ids: list[tuple[int]]) -> None:
+        """Delete the stored events of `file_ids`; the earliest surviving copy becomes the original."""
+        self.conn.executemany("DELETE FROM events WHERE file_id = ?", file_ids)
+        self.conn.executemany("DELETE FROM seen WHERE file_id = ?", file_ids)
+        for (file_id,) in file_ids:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO seen (key, file_id)"
+                " SELECT key, MIN(file_id) FROM events WHERE dup_of = ? GROUP BY key",
+                (file_id,),
+            )
+            self.conn.execute(
+                "UPDATE events SET dup_of = NULL, key = NULL WHERE dup_of = ?"
+                " AND file_id = (SELECT file_id FROM seen WHERE seen.key = events.key)",
+                (file_id,),
+            )
+            self.conn.execute(
+                "UPDATE events SET dup_of = (SELECT file_id FROM seen WHERE seen.key = events.key)"
+                " WHERE dup_of = ?",
+                (file_id,),
+            )
+
+    def _refresh(self, path: pathlib.Path) -> tuple[int, str | None] | None:
+        """Bring the stored timeline for `path` up to date; return (file_id, first_cwd)."""
+        plan = self._plan(path)
+        if plan is None:
+            return None
+        if plan[0] == "fresh":
+            return plan[1], plan[2]
+        _, file_id, st, offset, first_cwd, assistants = plan
+        state = ScanState(offset, first_cwd, assistants)
+        self._apply(file_id, st, iter_timeline(path, state, with_aidx=True, with_key=True), state)
+        return file_id, state.first_cwd
+
+    def refresh_many(self, paths: list[pathlib.Path], jobs: int = 1) -> None:
+        """Refresh every stale transcript, parsing them across `jobs` processes.
+
+        `paths` also become the set of transcripts among which copied events
+        are counted once by the following timeline() calls.
+        """
+        active: list[int] = []
+        if jobs <= 1:
+            for path in paths:
+                refreshed = self._refresh(path)
+                if refreshed is not None:
+                    active.append(refreshed[0])
+            self._set_active(active)
+            return
+        stale: list[tuple[pathlib.Path, int, os.stat_result, int, str | None, int]] = []
+        for path in paths:
+            plan = self._plan(path)
+            if plan is None:
+                continue
+            active.append(plan[1])
+            if plan[0] == "scan":
+                stale.append((path, *plan[1:]))
+        if stale:
+            with ProcessPoolExecutor(max_workers=jobs) as ex:
+                scanned = ex.map(
+                    scan_transcript,
+                    [x[0] for x in stale],
+                    [x[3] for x in stale],
+                    [x[4] for x in stale],
+                    [x[5] for x in stale],
+                    chunksize=max(1, len(stale) // (jobs * 4)),
+                )
+                for (_, file_id, st, *_), (timeline, consumed, first_cwd, assistants) in zip(stale, scanned):
+                    self._apply(file_id, st, timeline, ScanState(consumed, first_cwd, assistants))
+        self._set_active(active)
+
+    def _set_active(self, file_ids: list[int]) -> None:
+        self.conn.execute("DELETE FROM temp.active")
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO temp.active (file_id, rank) VALUES (?, ?)",
+            ((file_id, rank) for rank, file_id in enumerate(file_ids)),
+        )
+        self.seen.save()
+        self.conn.commit()
+
+    def timeline(
+        self,
+        path: pathlib.Path,
+        window: tuple[float | None, float | None] | None = None,
+        with_aidx: bool = False,
+    ) -> tuple[Iterable[tuple], str]:
+        """Like build_timeline(), but served lazily from the index.
+
+        With `window`, only entries inside it are returned, and a transcript
+        whose stored timestamp range misses the window is not read at all.
+        `with_aidx` adds the assistant-event index as in iter_timeline().
+        """
+        refreshed = self._refresh(path)
+        if refreshed is None:
+            return iter(()), detect_project(path, None)
+        file_id, first_cwd = refreshed
+        project = detect_project(path, first_cwd)
+        if window is not None:
+            lower, upper = window
+            min_ts, max_ts, untimed = self.conn.execute(
+                "SELECT min_ts, max_ts, untimed FROM files WHERE id = ?", (file_id,)
+            ).fetchone()
+            timed_overlap = (
+                min_ts is not None
+                and (lower is None or max_ts >= lower)
+                and (upper is None or min_ts <= upper)
+            )
+            keep_untimed = bool(untimed) and _untimed_allowed(path, window)
+            if not timed_overlap and not keep_untimed:
+                return iter(()), project
+        columns = "kind, data, ts, aidx" if with_aidx else "kind, data, ts"
+        rows = self.conn.execute(
+            f"SELECT {columns} FROM events WHERE file_id = ?"
+            " AND (dup_of IS NULL OR (dup_of NOT IN (SELECT file_id FROM temp.active)"
+            "  AND NOT EXISTS (SELECT 1 FROM events AS c JOIN temp.active AS a ON a.file_id = c.file_id"
+            "   WHERE c.key = events.key AND a.rank < (SELECT rank FROM temp.active WHERE file_id = ?))))"
+            " ORDER BY seq",
+            (file_id, file_id),
+        )
+        if window is None:
+            return rows, project
+        return window_filter(rows, window, keep_untimed), project
+
+    def checkpoint(self, path: pathlib.Path) -> tuple[ScanState, int] | None:
+        """(scan state, inode) the stored timeline of `path` ends at; None if not indexed."""
+        row = self.conn.execute(
+            "SELECT offset, first_cwd, assistants, inode FROM files WHERE path = ?", (str(path),)
+        ).fetchone()
+        if row is None:
+            return None
+        offset, first_cwd, assistants, inode = row
+        return ScanState(offset, first_cwd, assistants), inode
+
+    def owned_keys(self, path: pathlib.Path) -> set[bytes]:
+        """Event keys first stored by `path` (the ones it counts rather than copies)."""
+        return {
+            bytes(key)
+            for (key,) in self.conn.execute(
+                "SELECT seen.key FROM seen JOIN files ON files.id = seen.file_id WHERE files.path = ?",
+                (str(path),),
+            )
+        }
+
+    def prune_missing(self) -> int:
+        """Forget transcripts that no longer exist on disk (e.g. retention cleanup)."""
+        gone = [
+            (file_id,)
+            for file_id, p in self.conn.execute("SELECT id, path FROM files").fetchall()
+            if not os.path.exists(p)
+        ]
+        if gone:
+            self._drop_events(gone)
+            self.conn.executemany("DELETE FROM files WHERE id = ?", gone)
+        self.conn.commit()
+        return len(gone)
+
+
+def _trie_regex(keywords: list[str]) -> str:
+    """Compile literal keywords into a prefix-trie shaped regex.
+
+    Each trie node becomes one group, so the regex engine picks a branch by the
+    next character instead of trying every keyword at every position. Optional
+    tails are greedy, hence the match at any position is the longest keyword
+    starting there.
+    """
+    trie: dict = {}
+    for kw in keywords:
+        node = trie
+        for ch in kw:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def emit(node: dict) -> str:
+        leaves = [re.escape(ch) for ch, child in sorted(node.items()) if ch and list(child) == [""]]
+        alts = [re.escape(ch) + emit(child) for ch, child in sorted(node.items()) if ch and list(child) != [""]]
+        if leaves:
+            alts.append(leaves[0] if len(leaves) == 1 else "[" + "".join(leaves) + "]")
+        body = alts[0] if len(alts) == 1 else "(?:" + "|".join(alts) + ")"
+        if "" in node:
+            body = f"(?:{body})?"
+        return body
+
+    return emit(trie)
+
+
+def _trigger_lists(skills: list[dict]) -> list[tuple[str, list[str]]]:
+    return [
+        (s["qualified"], [t.lower() for t in s["triggers"] if t])
+        for s in skills
+    ]
+
+
+class TriggerMatcher:
+    """Match every skill's trigger keywords against a message in one pass.
+
+    All keywords are compiled into a single trie-shaped regex (see
+    `_trie_regex`) that reports the longest keyword at each position where one
+    starts. Keywords that are substrings of a reported keyword are recovered
+    through a precomputed closure, so the result equals testing `kw in text`
+    for every keyword of every skill.
+    """
+
+    def __init__(self, skill_triggers: list[tuple[str, list[str]]]) -> None:
+        skills_of: dict[str, list[str]] = {}
+        for qualified, trs in skill_triggers:
+            for t in trs:
+                if not t:
+                    continue
+                owners = skills_of.setdefault(t, [])
+                if qualified not in owners:
+                    owners.append(qualified)
+        keywords = sorted(skills_of, key=lambda k: (-len(k), k))
+        # keyword -> every keyword it contains (itself included)
+        covers = {k: tuple(c for c in keywords if c in k) for k in keywords}
+        self._setup(keywords, skills_of, covers, _trie_regex(keywords) if keywords else None)
+
+    def _setup(
+        self,
+        keywords: list[str],
+        skills_of: dict[str, list[str]],
+        covers: dict[str, tuple[str, ...]],
+        pattern: str | None,
+    ) -> None:
+        self.keywords = keywords
+        self.skills_of = skills_of
+        self._covers = covers
+        self._covered_skills: dict[str, frozenset[str]] = {
+            k: frozenset(q for c in cs for q in skills_of[c])
+            for k, cs in self._covers.items()
+        }
+        self._all_skills = frozenset(q for qs in skills_of.values() for q in qs)
+        self._rx = re.compile(pattern) if pattern else None
+
+    def to_dict(self) -> dict:
+        """JSON-serialisable form, restored by from_dict() without rebuilding the trie."""
+        return {
+            "keywords": self.keywords,
+            "skills_of": self.skills_of,
+            "covers": {k: list(v) for k, v in self._covers.items()},
+            "pattern": self._rx.pattern if self._rx is not None else None,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> TriggerMatcher:
+        self = cls.__new__(cls)
+        self._setup(
+            data["keywords"],
+            data["skills_of"],
+            {k: tuple(v) for k, v in data["covers"].items()},
+            data["pattern"],
+        )
+        return self
+
+    def _iter_longest(self, text_l: str) -> Iterable[str]:
+        if self._rx is None:
+            return
+        search = self._rx.search
+        m = search(text_l)
+        while m is not None:
+            yield m.group()
+            m = search(text_l, m.start() + 1)
+
+    def match(self, text_l: str) -> set[str]:
+        """Return the qualified names of skills with a keyword in `text_l` (lowercased)."""
+        found: set[str] = set()
+        seen: set[str] = set()
+        for kw in self._iter_longest(text_l):
+            if kw in seen:
+                continue
+            seen.add(kw)
+            found |= self._covered_skills[kw]
+            if len(found) == len(self._all_skills):
+                break
+        return found
+
+    def match_keywords(self, text_l: str) -> set[str]:
+        """Return every keyword contained in `text_l` (lowercased)."""
+        found: set[str] = set()
+        for kw in self._iter_longest(text_l):
+            found.update(self._covers[kw])
+        return found
+
+
+# _matcher_key(skills) -> TriggerMatcher.to_dict(), filled by load_skills() from the registry
+_PRECOMPILED_MATCHERS: dict[str, dict] = {}
+
+
+def _matcher_key(skills: list[dict]) -> str:
+    return json.dumps(_trigger_lists(skills), ensure_ascii=False)
+
+
+def build_matcher(skills: list[dict]) -> TriggerMatcher:
+    compiled = _PRECOMPILED_MATCHERS.get(_matcher_key(skills))
+    if compiled is not None:
+        return TriggerMatcher.from_dict(compiled)
+    return TriggerMatcher(_trigger_lists(skills))
+
+
+REGISTRY_VERSION = 1
+
+
+def default_registry_path(plugin_root: pathlib.Path) -> pathlib.Path:
+    """One registry per plugin root, next to the transcript index."""
+    key = hashlib.sha256(str(plugin_root.resolve()).encode("utf-8")).hexdigest()[:16]
+    return default_index_path().with_name(f"registry-{key}.json")
+
+
+def compile_registry(
+    plugin_root: pathlib.Path,
+    previous: dict | None = None,
+    with_matchers: bool = True,
+) -> dict:
+    """Build the skill registry, reusing entries of `previous` whose SKILL.md is unchanged.
+
+    An entry is reused without reading the file when size and mtime match,
+    and without re-parsing when the content hash matches. The result carries
+    "changed" = False when nothing differs from `previous`.
+    """
+    old: dict[str, dict] = {}
+    if previous and previous.get("version") == REGISTRY_VERSION:
+        old = {e["dir"]: e for e in previous.get("skills", [])}
+    entries: list[dict] = []
+    changed = previous is None
+    skills_dir = plugin_root / "skills"
+    for d in sorted(skills_dir.iterdir()) if skills_dir.is_dir() else ():
+        if not d.is_dir():
+            continue
+        f = d / "SKILL.md"
+        try:
+            st = f.stat()
+        except OSError:
+            continue
+        prev = old.get(d.name)
+        if prev is not None and prev["size"] == st.st_size and prev["mtime_ns"] == st.st_mtime_ns:
+            entries.append(prev)
+            continue
+        try:
+            data = f.read_bytes()
+        except OSError:
+            continue
+        digest = hashlib.sha256(data).hexdigest()
+        if prev is not None and prev["sha256"] == digest:
+            entry = dict(prev)
+        else:
+            # same newline handling as Path.read_text()
+            text = data.decode("utf-8", errors="replace").replace("\r\n", "\n").replace("\r", "\n")
+            entry = _parse_skill(d.name, text)
+            entry["sha256"] = digest
+        entry["size"] = st.st_size
+        entry["mtime_ns"] = st.st_mtime_ns
+        entries.append(entry)
+        changed = True
+    if [e["dir"] for e in entries] != list(old):
+        changed = True
+    registry = {
+        "version": REGISTRY_VERSION,
+        "plugin_root": str(plugin_root),
+        "skills": entries,
+        "changed": changed,
+    }
+    if with_matchers:
+        if not changed and previous and "matchers" in previous:
+            registry["matchers"] = previous["matchers"]
+        else:
+            registry["matchers"] = {
+                variant: TriggerMatcher(_trigger_lists([
+                    {"qualified": f"ndf:{e['name']}", "triggers": e["triggers"][variant][0]}
+                    for e in entries
+                ])).to_dict()
+                for variant in ("default", "fallback")
+            }
+    return registry
+
+
+def load_registry(plugin_root: pathlib.Path, path: pathlib.Path | None = None) -> dict:
+    """Return the compiled skill registry of `plugin_root`, rebuilding it only when a SKILL.md changed.
+
+    The registry is a JSON file holding each skill's name, description, both
+    trigger variants, content hash and the serialised TriggerMatcher, so other
+    tools can read skill metadata without parsing SKILL.md. An unwritable cache
+    only costs the rebuild.
+    """
+    if path is None:
+        path = default_registry_path(plugin_root)
+    try:
+        previous = json.loads(path.read_bytes())
+    except (OSError, ValueError):
+        previous = None
+    if previous is not None and previous.get("plugin_root") != str(plugin_root):
+        previous = None
+    registry = compile_registry(plugin_root, previous)
+    if registry.pop("changed"):
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+            tmp.write_text(json.dumps(registry, ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"[skill-stats] registry not saved ({path}: {e})", file=sys.stderr)
+    return registry
+
+
+class TDigest:
+    """Mergeable streaming quantile sketch (merging t-digest, arcsine scale).
+
+    Values are buffered and periodically folded into at most ~`compression`
+    centroids, so memory stays fixed however many values are added; accuracy
+    is best towards the tails (p99). Digests built in pool workers are
+    combined with merge().
+    """
+
+    __slots__ = ("compression", "count", "min", "max", "_means", "_weights", "_buffer")
+
+    def __init__(self, compression: int = 100) -> None:
+        self.compression = compression
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+        self._means: list[float] = []
+        self._weights: list[float] = []
+        self._buffer: list[float] = []
+
+    def add(self, x: float) -> None:
+        self._buffer.append(x)
+        self.count += 1
+        if x < self.min:
+            self.min = x
+        if x > self.max:
+            self.max = x
+        if len(self._buffer) >= 4 * self.compression:
+            self._compress()
+
+    def merge(self, other: TDigest) -> None:
+        if not other.count:
+            return
+        self._compress(
+            other._means + other._buffer,
+            other._weights + [1.0] * len(other._buffer),
+        )
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def _compress(self, means: list[float] = (), weights: list[float] = ()) -> None:
+        points = sorted(zip(
+            self._means + self._buffer + list(means),
+            self._weights + [1.0] * len(self._buffer) + list(weights),
+        ))
+        self._buffer = []
+        if not points:
+            return
+        total = sum(w for _, w in points)
+        scale = self.compression / (2 * math.pi)
+
+        def next_limit(q: float) -> float:
+            # weight allowed up to the quantile one unit of k(q) = scale * asin(2q - 1) further
+            k = min(scale * math.asin(2 * q - 1) + 1, scale * math.pi / 2)
+            return (math.sin(k / scale) + 1) / 2 * total
+
+        new_means: list[float] = []
+        new_weights: list[float] = []
+        cur_m, cur_w = points[0]
+        seen = cur_w
+        limit = next_limit(0.0)
+        for m, w in points[1:]:
+            if seen + w <= limit:
+                cur_w += w
+                cur_m += (m - cur_m) * w / cur_w
+            else:
+                new_means.append(cur_m)
+                new_weights.append(cur_w)
+                limit = next_limit(seen / total)
+                cur_m, cur_w = m, w
+            seen += w
+        new_means.append(cur_m)
+        new_weights.append(cur_w)
+        self._means, self._weights = new_means, new_weights
+
+    def quantile(self, q: float) -> float | None:
+        """Estimate the q-quantile (0..1) by interpolating between centroid centres."""
+        if not self.count:
+            return None
+        if self._buffer:
+            self._compress()
+        target = q * self.count
+        prev_m, prev_c = self.min, 0.0
+        seen = 0.0
+        for m, w in zip(self._means, self._weights):
+            center = seen + w / 2
+            if target <= center:
+                if center == prev_c:
+                    return m
+                return prev_m + (m - prev_m) * (target - prev_c) / (center - prev_c)
+            prev_m, prev_c = m, center
+            seen += w
+        if seen == prev_c:
+            return self.max
+        return prev_m + (self.max - prev_m) * (target - prev_c) / (seen - prev_c)
+
+
+def _merge_funnel(
+    into: dict[str, tuple[TDigest, TDigest]],
+    other: dict[str, tuple[TDigest, TDigest]],
+) -> None:
+    for qualified, (elapsed, distance) in other.items():
+        mine = into.get(qualified)
+        if mine is None:
+            into[qualified] = (elapsed, distance)
+        else:
+            mine[0].merge(elapsed)
+            mine[1].merge(distance)
+
+
+def merge_funnels(
+    parts: Iterable[dict[str, dict[str, tuple[TDigest, TDigest]]]],
+    into: dict[str, dict[str, tuple[TDigest, TDigest]]] | None = None,
+) -> dict[str, dict[str, tuple[TDigest, TDigest]]]:
+    """Merge { project: { qualified: (elapsed, distance) } } maps project by project."""
+    merged = {} if into is None else into
+    for part in parts:
+        for project, funnel in part.items():
+            _merge_funnel(merged.setdefault(project, {}), funnel)
+    return merged
+
+
+class HitTracker:
+    """Streaming hit detection for one transcript.
+
+    Every trigger of a user turn shares the same start (the next user turn
+    cancels all of them), so the state is just the set of skills triggered by
+    the latest user message plus the number of timeline entries seen since.
+    A triggered skill counts as a hit when it is invoked within
+    `lookahead_cap` entries and before the next user turn, exactly like
+    scanning a materialised timeline, but memory is O(skills) per file.
+
+    With `bucket` ("day" / "week" / "month") counter keys become
+    (bucket_label, qualified): invocations land in the bucket of their own
+    event, triggers and hits in the bucket of the triggering user message.
+
+    With a `funnel` dict, every hit also records the elapsed seconds and the
+    assistant-event distance from the triggering message into
+    funnel[qualified] = (elapsed, distance) digests; entries then need the
+    assistant index (`aidx`).
+    """
+
+    __slots__ = (
+        "matcher", "lookahead_cap", "bucket", "funnel", "inv", "trig", "hits",
+        "_pending", "_pending_label", "_pending_ts", "_pending_aidx", "_since",
+    )
+
+    def __init__(
+        self,
+        matcher: TriggerMatcher,
+        lookahead_cap: int = 100,
+        bucket: str | None = None,
+        funnel: dict[str, tuple[TDigest, TDigest]] | None = None,
+    ) -> None:
+        self.matcher = matcher
+        self.lookahead_cap = lookahead_cap
+        self.bucket = bucket
+        self.funnel = funnel
+        self.inv: Counter = Counter()
+        self.trig: Counter = Counter()
+        self.hits: Counter = Counter()
+        self._pending: set[str] = set()
+        self._pending_label: str | None = None
+        self._pending_ts: float | None = None
+        self._pending_aidx: int | None = None
+        self._since = 0
+
+    def feed(self, kind: str, data: object, ts: float | None = None, aidx: int | None = None) -> None:
+        bucket = self.bucket
+        if kind == "skill":
+            self.inv[(bucket_label(ts, bucket), data) if bucket else data] += 1
+            if self._pending:
+                self._since += 1
+                if data in self._pending:
+                    self.hits[(self._pending_label, data) if bucket else data] += 1
+                    self._pending.discard(data)
+                    if self.funnel is not None:
+                        self._record(data, ts, aidx)
+                if self._since >= self.lookahead_cap:
+                    self._pending.clear()
+        elif kind == "user":
+            matched = self.matcher.match(str(data).lower())
+            label = bucket_label(ts, bucket) if bucket else None
+            for qualified in matched:
+                self.trig[(label, qualified) if bucket else qualified] += 1
+            self._pending = matched if self.lookahead_cap > 0 else set()
+            self._pending_label = label
+            self._pending_ts = ts
+            self._pending_aidx = aidx
+            self._since = 0
+
+    def _record(self, qualified: str, ts: float | None, aidx: int | None) -> None:
+        digests = self.funnel.get(qualified)
+        if digests is None:
+            digests = self.funnel[qualified] = (TDigest(), TDigest())
+        if ts is not None and self._pending_ts is not None:
+            digests[0].add(max(0.0, ts - self._pending_ts))
+        if aidx is not None and self._pending_aidx is not None:
+            digests[1].add(aidx - self._pending_aidx)
+
+    def counters(self) -> tuple[Counter, Counter, Counter]:
+        return self.inv, self.trig, self.hits
+
+
+def count_timeline(
+    tl: Iterable[tuple],
+    matcher: TriggerMatcher,
+    lookahead_cap: int = 100,
+    bucket: str | None = None,
+    funnel: dict[str, tuple[TDigest, TDigest]] | None = None,
+) -> tuple[Counter, Counter, Counter]:
+    """Count (invocations, triggers_hits, hits) for one transcript timeline.
+
+    With `funnel`, `tl` entries carry the assistant index and per-hit
+    measurements are added to it (see HitTracker).
+    """
+    tracker = HitTracker(matcher, lookahead_cap, bucket, funnel)
+    if funnel is None:
+        for kind, data, ts in tl:
+            tracker.feed(kind, data, ts)
+    else:
+        for kind, data, ts, aidx in tl:
+            tracker.feed(kind, data, ts, aidx)
+    return tracker.counters()
+
+
+def _count_transcript(
+    path: pathlib.Path,
+    matcher: TriggerMatcher,
+    lookahead_cap: int,
+    bucket: str | None = None,
+    window: tuple[float | None, float | None] | None = None,
+    funnel: dict[str, tuple[TDigest, TDigest]] | None = None,
+    seen: set[bytes] | None = None,
+) -> tuple[str, tuple[Counter, Counter, Counter]]:
+    state = ScanState()
+    tl = iter_timeline(path, state, with_aidx=funnel is not None, seen=seen)
+    if window is not None:
+        tl = window_filter(tl, window, _untimed_allowed(path, window))
+    counters = count_timeline(tl, matcher, lookahead_cap, bucket, funnel)
+    return detect_project(path, state.first_cwd), counters
+
+
+def _count_chunk(
+    paths: list[pathlib.Path],
+    matcher: TriggerMatcher,
+    lookahead_cap: int,
+    bucket: str | None = None,
+    window: tuple[float | None, float | None] | None = None,
+    with_funnel: bool = False,
+    skips: list[set[bytes]] | None = None,
+) -> tuple[list[tuple[str, tuple[Counter, Counter, Counter]]], dict | None]:
+    """Process-pool worker: parse + match a batch of transcripts; return ([(project, counters)], funnel).
+
+    Events copied between transcripts of the batch are counted once; with
+    `skips` (see _cross_chunk_skips), so are copies of another batch's events.
+    """
+    counted = []
+    funnel: dict[str, dict[str, tuple[TDigest, TDigest]]] | None = {} if with_funnel else None
+    seen: set[bytes] = set()
+    for i, path in enumerate(paths):
+        local = {} if with_funnel else None
+        if skips is not None:
+            seen = skips[i]
+        project, counters = _count_transcript(path, matcher, lookahead_cap, bucket, window, local, seen)
+        counted.append((project, counters))
+        if local:
+            _merge_funnel(funnel.setdefault(project, {}), local)
+    return counted, funnel
+
+
+def _aggregate_chunk(
+    paths: list[pathlib.Path],
+    matcher: TriggerMatcher,
+    lookahead_cap: int,
+    bucket: str | None = None,
+    window: tuple[float | None, float | None] | None = None,
+    with_funnel: bool = False,
+    skips: list[set[bytes]] | None = None,
+) -> tuple[dict[str, tuple[Counter, Counter, Counter]], dict | None]:
+    """Process-pool worker: like _count_chunk() but merged per project."""
+    counted, funnel = _count_chunk(paths, matcher, lookahead_cap, bucket, window, with_funnel, skips)
+    return merge_per_project({project: counters} for project, counters in counted), funnel
+
+
+def _aggregate_archive(
+    archive: pathlib.Path,
+    matcher: TriggerMatcher,
+    lookahead_cap: int,
+    bucket: str | None = None,
+    window: tuple[float | None, float | None] | None = None,
+    with_funnel: bool = False,
+) -> tuple[dict[str, tuple[Counter, Counter, Counter]], int, dict | None]:
+    """Process-pool worker: stream every transcript of one archive; return (per_project, n_transcripts, funnel)."""
+    parts: list[dict[str, tuple[Counter, Counter, Counter]]] = []
+    funnel: dict[str, dict[str, tuple[TDigest, TDigest]]] | None = {} if with_funnel else None
+    seen: set[bytes] = set()
+    try:
+        for member, mtime, f in iter_archive_members(archive, window[0] if window else None):
+            state = ScanState()
+            local = {} if with_funnel else None
+            tl = iter_stream_timeline(f, state, with_aidx=with_funnel, seen=seen)
+            if window is not None:
+                tl = window_filter(tl, window, _mtime_in_window(mtime, window))
+            counters = count_timeline(tl, matcher, lookahead_cap, bucket, local)
+            project = detect_project(member, state.first_cwd)
+            parts.append({project: counters})
+            if local:
+                _merge_funnel(funnel.setdefault(project, {}), local)
+    except (OSError, EOFError, tarfile.TarError, zipfile.BadZipFile) as e:
+        # keep what was read so far: nightly collections may hold a truncated upload
+        print(f"[skill-stats] archive read error ({archive}: {e})", file=sys.stderr)
+    return merge_per_project(parts), len(parts), funnel
+
+
+def _chunked_by_dir(items: list[pathlib.Path], jobs: int) -> list[list[pathlib.Path]]:
+    """Split transcripts into pool tasks, keeping each directory's transcripts in one chunk.
+
+    Resumed / forked copies of a session usually sit in the same project
+    directory, so most copies are deduplicated within a chunk; copies across
+    directories are handled by _cross_chunk_skips. A single huge project
+    directory is then parsed by one worker.
+    """
+    # ~4 chunks per worker keeps the pool busy without shipping one path per task
+    size = max(1, -(-len(items) // (jobs * 4)))
+    groups: dict[pathlib.Path, list[pathlib.Path]] = defaultdict(list)
+    for path in items:
+        groups[path.parent].append(path)
+    chunks: list[list[pathlib.Path]] = []
+    current: list[pathlib.Path] = []
+    for group in groups.values():
+        current.extend(group)
+        if len(current) >= size:
+            chunks.append(current)
+            current = []
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _chunk_keys(paths: list[pathlib.Path], tools: bool = False) -> list[set[bytes]]:
+    """Process-pool worker: the keys of the events each transcript counts on its own.
+
+    Timeline events by default, tool-call events with `tools` (the key sets
+    iter_timeline() / iter_tool_calls() add to an empty `seen`).
+    """
+    result = []
+    for path in paths:
+        keys: set[bytes] = set()
+        state = ScanState()
+        if tools:
+            probes = _tool_probes()
+            calls = iter_tool_calls(_iter_lines(path, 0, probes), probes, state, keys)
+        else:
+            calls = iter_timeline(path, state, seen=keys)
+        for _ in calls:
+            pass
+        result.append(keys)
+    return result
+
+
+def _cross_chunk_skips(
+    ex: ProcessPoolExecutor,
+    transcripts: list[pathlib.Path],
+    chunks: list[list[pathlib.Path]],
+    tools: bool = False,
+) -> list[list[set[bytes]] | None]:
+    """Per chunk, per transcript: the event keys an earlier transcript already counts.
+
+    Pool workers only see their own chunk, so a session copied into another
+    project directory would be counted by both chunks. A first pass collects
+    every transcript's keys; walking them in `transcripts` order gives each
+    transcript the keys owned before it, exactly as the serial path's shared
+    `seen` set. Seeding the workers with these makes the pool result
+    identical to the serial one. Skipped when everything is in one directory
+    (one chunk, in order).
+    """
+    if len({path.parent for path in transcripts}) <= 1:
+        return [None] * len(chunks)
+    keys_of: dict[pathlib.Path, set[bytes]] = {}
+    for chunk, keys in zip(chunks, ex.map(_chunk_keys, chunks, [tools] * len(chunks))):
+        keys_of.update(zip(chunk, keys))
+    owned: set[bytes] = set()
+    skips: dict[pathlib.Path, set[bytes]] = {}
+    for path in transcripts:
+        keys = keys_of[path]
+        skips[path] = keys & owned
+        owned |= keys
+    return [[skips[path] for path in chunk] for chunk in chunks]
+
+
+def resolve_jobs(jobs: int | None) -> int:
+    """`None`/1 -> serial, 0 -> one worker per CPU."""
+    if jobs is None:
+        return 1
+    if jobs <= 0:
+        return os.cpu_count() or 1
+    return jobs
+
+
+def aggregate_by_project(
+    transcripts: list[pathlib.Path],
+    skills: list[dict],
+    lookahead_cap: int = 100,
+    index: TranscriptIndex | None = None,
+    jobs: int = 1,
+    bucket: str | None = None,
+    window: tuple[float | None, float | None] | None = None,
+    funnel: dict[str, dict[str, tuple[TDigest, TDigest]]] | None = None,
+) -> dict[str, tuple[Counter, Counter, Counter]]:
+    """Return { project: (invocations, triggers_hits, hits) }.
+
+    When `index` is given, timelines come from the persistent index and only
+    bytes appended since the last run are parsed. With `jobs > 1` parsing is
+    fanned out over a process pool; events copied across directories are
+    resolved first (see _cross_chunk_skips), so the result is identical to
+    the serial path.
+    With `bucket`, counter keys are (bucket_label, qualified) (see HitTracker).
+    `window` = (lower, upper) epoch seconds restricts counting to events whose
+    own timestamp falls inside it (see `resolve_window`).
+    With a `funnel` dict, per-hit latency / distance digests are merged into
+    it as { project: { qualified: (elapsed, distance) } }.
+    """
+    matcher = build_matcher(skills)
+    with_funnel = funnel is not None
+    if index is None and jobs > 1 and len(transcripts) > 1:
+        chunks = _chunked_by_dir(transcripts, jobs)
+        with ProcessPoolExecutor(max_workers=jobs) as ex:
+            skips = _cross_chunk_skips(ex, transcripts, chunks)
+            parts = list(ex.map(
+                _aggregate_chunk,
+                chunks,
+                [matcher] * len(chunks),
+                [lookahead_cap] * len(chunks),
+                [bucket] * len(chunks),
+                [window] * len(chunks),
+                [with_funnel] * len(chunks),
+                skips,
+            ))
+        if with_funnel:
+            merge_funnels((f for _, f in parts), into=funnel)
+        return merge_per_project(p for p, _ in parts)
+
+    if index is not None:
+        index.refresh_many(transcripts, jobs=jobs)
+    result: dict[str, tuple[Counter, Counter, Counter]] = defaultdict(
+        lambda: (Counter(), Counter(), Counter())
+    )
+    seen: set[bytes] = set()
+    for path in transcripts:
+        local = {} if with_funnel else None
+        if index is not None:
+            tl, project = index.timeline(path, window, with_aidx=with_funnel)
+            counters = count_timeline(tl, matcher, lookahead_cap, bucket, local)
+        else:
+            project, counters = _count_transcript(path, matcher, lookahead_cap, bucket, window, local, seen)
+        if local:
+            _merge_funnel(funnel.setdefault(project, {}), local)
+        inv, trig_h, hits = result[project]
+        f_inv, f_trig, f_hits = counters
+        inv.update(f_inv)
+        trig_h.update(f_trig)
+        hits.update(f_hits)
+    return result
+
+
+def count_transcripts(
+    transcripts: list[pathlib.Path],
+    skills: list[dict],
+    lookahead_cap: int = 100,
+    index: TranscriptIndex | None = None,
+    jobs: int = 1,
+    bucket: str | None = None,
+    window: tuple[float | None, float | None] | None = None,
+    funnel: dict[str, dict[str, tuple[TDigest, TDigest]]] | None = None,
+) -> list[tuple[str, tuple[Counter, Counter, Counter]]]:
+    """Like aggregate_by_project() but return (project, counters) per transcript, in order.
+
+    Meant for samples, where the per-transcript spread is needed; the
+    per-transcript results are not merged in the workers.
+    """
+    matcher = build_matcher(skills)
+    with_funnel = funnel is not None
+    if index is None and jobs > 1 and len(transcripts) > 1:
+        chunks = _chunked_by_dir(transcripts, jobs)
+        with ProcessPoolExecutor(max_workers=jobs) as ex:
+            skips = _cross_chunk_skips(ex, transcripts, chunks)
+            parts = list(ex.map(
+                _count_chunk,
+                chunks,
+                [matcher] * len(chunks),
+                [lookahead_cap] * len(chunks),
+                [bucket] * len(chunks),
+                [window] * len(chunks),
+                [with_funnel] * len(chunks),
+                skips,
+            ))
+        if with_funnel:
+            merge_funnels((f for _, f in parts), into=funnel)
+        return [entry for counted, _ in parts for entry in counted]
+
+    if index is not None:
+        index.refresh_many(transcripts, jobs=jobs)
+    counted = []
+    seen: set[bytes] = set()
+    for path in transcripts:
+        local = {} if with_funnel else None
+        if index is not None:
+            tl, project = index.timeline(path, window, with_aidx=with_funnel)
+            counters = count_timeline(tl, matcher, lookahead_cap, bucket, local)
+        else:
+            project, counters = _count_transcript(path, matcher, lookahead_cap, bucket, window, local, seen)
+        if local:
+            _merge_funnel(funnel.setdefault(project, {}), local)
+        counted.append((project, counters))
+    return counted
+
+
+def aggregate_archives(
+    archives: list[pathlib.Path],
+    skills: list[dict],
+    lookahead_cap: int = 100,
+    jobs: int = 1,
+    bucket: str | None = None,
+    window: tuple[float | None, float | None] | None = None,
+    funnel: dict[str, dict[str, tuple[TDigest, TDigest]]] | None = None,
+) -> tuple[dict[str, tuple[Counter, Counter, Counter]], int]:
+    """Like aggregate_by_project() for tar / zip archives; return (per_project, n_transcripts).
+
+    An archive is a sequential stream, so with `jobs > 1` each archive is one
+    pool task and the per-archive results are merged project by project.
+    """
+    matcher = build_matcher(skills)
+    with_funnel = funnel is not None
+    n = len(archives)
+    if jobs > 1 and n > 1:
+        with ProcessPoolExecutor(max_workers=min(jobs, n)) as ex:
+            results = list(ex.map(
+                _aggregate_archive,
+                archives,
+                [matcher] * n,
+                [lookahead_cap] * n,
+                [bucket] * n,
+                [window] * n,
+                [with_funnel] * n,
+            ))
+    else:
+        results = [
+            _aggregate_archive(a, matcher, lookahead_cap, bucket, window, with_funnel)
+            for a in archives
+        ]
+    if with_funnel:
+        merge_funnels((f for _, _, f in results), into=funnel)
+    return merge_per_project(r for r, _, _ in results), sum(c for _, c, _ in results)
+
+
+def merge_counters(
+    per_project: dict[str, tuple[Counter, Counter, Counter]],
+) -> tuple[Counter, Counter, Counter]:
+    inv_total: Counter = Counter()
+    trig_total: Counter = Counter()
+    hits_total: Counter = Counter()
+    for inv, trig, hits in per_project.values():
+        inv_total.update(inv)
+        trig_total.update(trig)
+        hits_total.update(hits)
+    return inv_total, trig_total, hits_total
+
+
+def merge_per_project(
+    parts: Iterable[dict[str, tuple[Counter, Counter, Counter]]],
+) -> dict[str, tuple[Counter, Counter, Counter]]:
+    """Merge several { project: triple } maps (e.g. from pool workers) project by project."""
+    grouped: dict[str, dict[int, tuple[Counter, Counter, Counter]]] = defaultdict(dict)
+    for i, part in enumerate(parts):
+        for project, triple in part.items():
+            grouped[project][i] = triple
+    return {project: merge_counters(triples) for project, triples in grouped.items()}
+
+
+def transcript_stratum(path: pathlib.Path, root: pathlib.Path) -> str:
+    """Sampling stratum of a transcript: its project directory under `root`."""
+    try:
+        rel = path.relative_to(root)
+    except ValueError:
+        return str(path.parent)
+    return str(root / rel.parts[0]) if len(rel.parts) > 1 else str(root)
+
+
+def sample_allocation(
+    population: dict[str, int],
+    fraction: float | None = None,
+    max_files: int | None = None,
+) -> dict[str, int]:
+    """Per-stratum sample sizes, proportional to the stratum sizes.
+
+    With `max_files` the proportional shares are rounded by largest remainder
+    so they add up to it. Every stratum then gets at least two transcripts
+    (or all of them), which its variance estimate needs; many small projects
+    can therefore push the sample slightly above `max_files`.
+    """
+    total = sum(population.values())
+    if max_files is not None:
+        exact = {h: n * min(1.0, max_files / total) for h, n in population.items()} if total else {}
+        alloc = {h: int(x) for h, x in exact.items()}
+        short = min(max_files, total) - sum(alloc.values())
+        for h in sorted(exact, key=lambda h: (alloc[h] - exact[h], h))[:short]:
+            alloc[h] += 1
+    else:
+        alloc = {h: math.ceil(n * (fraction or 1.0)) for h, n in population.items()}
+    return {h: min(n, max(alloc[h], 2)) for h, n in population.items()}
+
+
+def stratified_sample(
+    strata: Iterable[tuple[pathlib.Path, str]],
+    fraction: float | None = None,
+    max_files: int | None = None,
+    rng: random.Random | None = None,
+) -> tuple[list[tuple[pathlib.Path, str]], dict[str, int]]:
+    """Draw a stratified random sample of (path, stratum); return (sample, population per stratum).
+
+    `strata` is consumed as a stream with one reservoir per stratum
+    (Algorithm R). The allocation is only known once every stratum size is,
+    so with `max_files` a reservoir holds at most max(max_files, 2) paths,
+    the most any stratum can be allocated, and is subsampled at the end.
+    Memory is O(strata x max_files) whatever the corpus size. A `fraction`
+    alone has no such bound, as the sample grows with the corpus: its
+    reservoirs keep every path, which is no more than the sampled
+    transcripts' counters cost anyway.
+    """
+    rng = rng or random.Random()
+    cap = max(max_files, 2) if max_files is not None else None
+    reservoirs: dict[str, list[pathlib.Path]] = defaultdict(list)
+    population: dict[str, int] = defaultdict(int)
+    for path, stratum in strata:
+        population[stratum] += 1
+        reservoir = reservoirs[stratum]
+        if cap is None or len(reservoir) < cap:
+            reservoir.append(path)
+        else:
+            j = rng.randrange(population[stratum])
+            if j < cap:
+                reservoir[j] = path
+    population = dict(population)
+    alloc = sample_allocation(population, fraction, max_files)
+    sample = []
+    for h in sorted(reservoirs):
+        sample.extend((p, h) for p in rng.sample(reservoirs[h], alloc[h]))
+    return sample, population
+
+
+def scale_sample(
+    counted: list[tuple[str, tuple[Counter, Counter, Counter]]],
+    weights: list[float],
+) -> dict[str, tuple[Counter, Counter, Counter]]:
+    """Weight each sampled transcript's counters (N_h / n_h) into estimated { project: triple }."""
+    scaled: dict[str, tuple[Counter, Counter, Counter]] = defaultdict(
+        lambda: (Counter(), Counter(), Counter())
+    )
+    for (project, counters), w in zip(counted, weights):
+        for mine, theirs in zip(scaled[project], counters):
+            for key, n in theirs.items():
+                mine[key] += n * w
+    return {
+        project: tuple(Counter({k: round(v) for k, v in c.items()}) for c in triple)
+        for project, triple in scaled.items()
+    }
+
+
+def _stratified_total(
+    values: dict[str, list[float]],
+    population: dict[str, int],
+) -> tuple[float, float]:
+    """(estimate, variance) of a population total from per-stratum sample values."""
+    est = var = 0.0
+    for h, ys in values.items():
+        n, big_n = len(ys), population[h]
+        if not n:
+            continue
+        mean = sum(ys) / n
+        est += big_n * mean
+        if 1 < n < big_n:
+            s2 = sum((y - mean) ** 2 for y in ys) / (n - 1)
+            var += big_n * big_n * (1 - n / big_n) * s2 / n
+    return est, var
+
+
+def _interval(est: float, var: float, z: float, cap: float | None = None) -> dict:
+    half = z * math.sqrt(var)
+    high = est + half if cap is None else min(cap, est + half)
+    return {"estimate": round(est, 1), "low": round(max(0.0, est - half), 1), "high": round(high, 1)}
+
+
+def estimate_rows(
+    skills: list[dict],
+    samples: dict[str, list[tuple[Counter, Counter, Counter]]],
+    population: dict[str, int],
+    exact: tuple[Counter, Counter, Counter] | None = None,
+    z: float = 1.96,
+) -> tuple[list[dict], dict]:
+    """Stratified estimates with confidence intervals per skill, plus the total.
+
+    Totals use the stratified expansion estimator; the hit rate is a ratio
+    estimator (hits / triggers) with its linearised variance. `exact`
+    counters (e.g. archives read in full) are added without variance.
+    Bucketed counter keys are folded per skill.
+    """
+    exact = exact or (Counter(), Counter(), Counter())
+
+    def per_skill(c: Counter) -> Counter:
+        folded: Counter = Counter()
+        for key, n in c.items():
+            folded[key[1] if isinstance(key, tuple) else key] += n
+        return folded
+
+    folded = {h: [tuple(per_skill(c) for c in triple) for triple in rows] for h, rows in samples.items()}
+    explicit = {s["qualified"] for s in skills if s["triggers_source"] == "explicit"}
+
+    def estimate(label: str, value) -> dict:
+        """`value(triple, measure)` picks the per-transcript count of `measure` (0..2)."""
+        out: dict = {"skill": label}
+        totals = []
+        for measure, name in enumerate(("invocations", "triggers", "hits")):
+            est, var = _stratified_total(
+                {h: [value(t, measure) for t in rows] for h, rows in folded.items()}, population,
+            )
+            est += value(exact, measure)
+            totals.append(est)
+            out[name] = _interval(est, var, z)
+        trig, hits = totals[1], totals[2]
+        if trig:
+            ratio = hits / trig
+            _, var = _stratified_total(
+                {h: [value(t, 2) - ratio * value(t, 1) for t in rows] for h, rows in folded.items()},
+                population,
+            )
+            out["hit_rate_pct"] = _interval(ratio * 100, var / (trig * trig) * 10000, z, cap=100.0)
+        else:
+            out["hit_rate_pct"] = None
+        return out
+
+    rows = []
+    for s in sorted(skills, key=lambda x: x["name"]):
+        q = s["qualified"]
+        rows.append(estimate(q, lambda t, m, q=q: t[m].get(q, 0)))
+    total = estimate(
+        "total",
+        lambda t, m: sum(t[0].values()) if m == 0 else sum(n for k, n in t[m].items() if k in explicit),
+    )
+    return rows, total
+
+
+def _format_estimates(estimates: dict) -> str:
+    meta = estimates["meta"]
+    return format_estimate_markdown(
+        estimates["skills"], estimates["total"],
+        f"## 推定値と 95% 信頼区間 (サンプル {meta['sampled']} / {meta['population']} transcript、"
+        f"{meta['strata']} 層)",
+    )
+
+
+def format_estimate_markdown(rows: list[dict], total: dict, heading: str) -> str:
+    def cell(iv: dict | None, suffix: str = "") -> str:
+        if iv is None:
+            return "-"
+        return f"{iv['estimate']:g}{suffix} ({iv['low']:g}–{iv['high']:g})"
+
+    lines = [
+        heading,
+        "| skill | 呼び出し数 | 関連話題 | ヒット | ヒット率 |",
+        "|---|---:|---:|---:|---:|",
+    ]
+    for r in rows:
+        if not (r["invocations"]["estimate"] or r["triggers"]["estimate"]):
+            continue
+        lines.append(
+            f"| {r['skill']} | {cell(r['invocations'])} | {cell(r['triggers'])} "
+            f"| {cell(r['hits'])} | {cell(r['hit_rate_pct'], '%')} |"
+        )
+    lines.append(
+        f"| **合計** | {cell(total['invocations'])} | {cell(total['triggers'])} "
+        f"| {cell(total['hits'])} | {cell(total['hit_rate_pct'], '%')} |"
+    )
+    return "\n".join(lines)
+
+
+def build_rows(
+    skills: list[dict],
+    invocations: Counter,
+    triggers_hits: Counter,
+    hits: Counter,
+) -> tuple[list[dict], dict]:
+    rows: list[dict] = []
+    total_inv = total_trig = total_hit = 0
+    for s in sorted(skills, key=lambda x: x["name"]):
+        q = s["qualified"]
+        inv = invocations.get(q, 0)
+        trig = triggers_hits.get(q, 0)
+        hit = hits.get(q, 0)
+        rate = round(hit / trig * 100, 1) if trig else 0.0
+        rows.append({
+            "skill": q,
+            "triggers_source": s["triggers_source"],
+            "invocations": inv,
+            "triggers": trig,
+            "hits": hit,
+            "hit_rate_pct": rate,
+            "trigger_keywords": s["triggers"],
+        })
+        total_inv += inv
+        if s["triggers_source"] == "explicit":
+            total_trig += trig
+            total_hit += hit
+    total_rate = round(total_hit / total_trig * 100, 1) if total_trig else 0.0
+    total = {
+        "invocations": total_inv,
+        "triggers": total_trig,
+        "hits": total_hit,
+        "hit_rate_pct": total_rate,
+    }
+    return rows, total
+
+
+def build_report(skills: list[dict], per_project: dict[str, tuple[Counter, Counter, Counter]]) -> dict:
+    """The `total` / `grand_skills` / `projects` part of the JSON report."""
+    projects_json = []
+    for project, (inv, trig, hits) in sorted(per_project.items()):
+        rows, total = build_rows(skills, inv, trig, hits)
+        projects_json.append({
+            "project": project,
+            "total": total,
+            "skills": rows,
+        })
+    grand_rows, grand_total = build_rows(skills, *merge_counters(per_project))
+    return {
+        "total": grand_total,
+        "grand_skills": grand_rows,
+        "projects": projects_json,
+    }
+
+
+def split_buckets(
+    invocations: Counter,
+    triggers_hits: Counter,
+    hits: Counter,
+) -> dict[str, tuple[Counter, Counter, Counter]]:
+    """Turn (bucket_label, qualified)-keyed counters into { bucket_label: triple }."""
+    out: dict[str, tuple[Counter, Counter, Counter]] = defaultdict(
+        lambda: (Counter(), Counter(), Counter())
+    )
+    for i, counter in enumerate((invocations, triggers_hits, hits)):
+        for (label, qualified), n in counter.items():
+            out[label][i][qualified] += n
+    return out
+
+
+def _bucket_start(label: str, bucket: str) -> datetime:
+    if bucket == "day":
+        return datetime.strptime(label, "%Y-%m-%d")
+    if bucket == "week":
+        return datetime.strptime(label + "-1", "%G-W%V-%u")
+    return datetime.strptime(label, "%Y-%m")
+
+
+def bucket_range(labels: Iterable[str], bucket: str) -> list[str]:
+    """Every bucket label between the first and last of `labels`, in order.
+
+    Gaps are filled so a plotted series has a point per bucket; "unknown"
+    (events without a timestamp) is kept last.
+    """
+    known = sorted(lb for lb in labels if lb != "unknown")
+    out: list[str] = []
+    if known:
+        day = _bucket_start(known[0], bucket)
+        end = _bucket_start(known[-1], bucket)
+        while day <= end:
+            label = bucket_label(day.timestamp(), bucket)
+            if not out or out[-1] != label:
+                out.append(label)
+            day += timedelta(days=1)
+    if "unknown" in labels:
+        out.append("unknown")
+    return out
+
+
+def build_series(
+    skills: list[dict],
+    per_bucket: dict[str, tuple[Counter, Counter, Counter]],
+    bucket: str,
+) -> dict:
+    """Plot-friendly JSON: one zero-filled point list per skill plus bucket totals."""
+    labels = bucket_range(per_bucket, bucket)
+    empty = (Counter(), Counter(), Counter())
+    tables = {lb: build_rows(skills, *per_bucket.get(lb, empty)) for lb in labels}
+    series = []
+    for i, s in enumerate(sorted(skills, key=lambda x: x["name"])):
+        points = []
+        for lb in labels:
+            row = tables[lb][0][i]
+            points.append({
+                "bucket": lb,
+                "invocations": row["invocations"],
+                "triggers": row["triggers"],
+                "hits": row["hits"],
+                "hit_rate_pct": row["hit_rate_pct"],
+            })
+        series.append({
+            "skill": s["qualified"],
+            "triggers_source": s["triggers_source"],
+            "points": points,
+        })
+    return {
+        "bucket": bucket,
+        "buckets": labels,
+        "total": [dict(bucket=lb, **tables[lb][1]) for lb in labels],
+        "series": series,
+    }
+
+
+def format_markdown(rows: list[dict], total: dict, heading: str | None = None) -> str:
+    lines: list[str] = []
+    if heading:
+        lines.append(heading)
+    lines.extend([
+        "| skill | triggers源 | 呼び出し数 | 関連話題 | ヒット | ヒット率 |",
+        "|---|---|---:|---:|---:|---:|",
+    ])
+    for r in rows:
+        src = r["triggers_source"]
+        if src == "none":
+            rate = "-"
+            trig = "-"
+            hit = "-"
+        else:
+            rate = f"{r['hit_rate_pct']}%" if r["triggers"] else "-"
+            trig = str(r["triggers"])
+            hit = str(r["hits"])
+        lines.append(
+            f"| {r['skill']} | {src} | {r['invocations']} | {trig} | {hit} | {rate} |"
+        )
+    lines.append(
+        f"| **合計** | | **{total['invocations']}** | **{total['triggers']}** | **{total['hits']}** | **{total['hit_rate_pct']}%** |"
+    )
+    return "\n".join(lines)
+
+
+FUNNEL_QUANTILES = (("p50", 0.5), ("p90", 0.9), ("p99", 0.99))
+
+
+def build_funnel_rows(
+    skills: list[dict],
+    per_project: dict[str, dict[str, tuple[TDigest, TDigest]]],
+) -> list[dict]:
+    """Per-skill p50 / p90 / p99 of hit latency and assistant-event distance, all projects merged."""
+    total: dict[str, tuple[TDigest, TDigest]] = {}
+    for funnel in per_project.values():
+        for qualified, (elapsed, distance) in funnel.items():
+            mine = total.setdefault(qualified, (TDigest(), TDigest()))
+            mine[0].merge(elapsed)
+            mine[1].merge(distance)
+
+    def quantiles(d: TDigest) -> dict:
+        return {k: (round(d.quantile(q), 1) if d.count else None) for k, q in FUNNEL_QUANTILES}
+
+    rows = []
+    for s in sorted(skills, key=lambda x: x["name"]):
+        digests = total.get(s["qualified"])
+        if digests is None:
+            continue
+        elapsed, distance = digests
+        rows.append({
+            "skill": s["qualified"],
+            "hits": max(elapsed.count, distance.count),
+            "elapsed_sec": quantiles(elapsed),
+            "assistant_events": quantiles(distance),
+        })
+    return rows
+
+
+def format_funnel_markdown(rows: list[dict]) -> str:
+    lines = [
+        "## トリガー → 呼び出しまでの経過 (ヒットのみ)",
+        "| skill | ヒット | 経過秒 p50 | p90 | p99 | assistant イベント数 p50 | p90 | p99 |",
+        "|---|---:|---:|---:|---:|---:|---:|---:|",
+    ]
+    for r in rows:
+        cells = [
+            "-" if v is None else str(v)
+            for part in ("elapsed_sec", "assistant_events")
+            for v in r[part].values()
+        ]
+        lines.append(f"| {r['skill']} | {r['hits']} | " + " | ".join(cells) + " |")
+    return "\n".join(lines)
+
+
+EXPORT_COLUMNS = ("project", "session", "timestamp", "kind", "skill", "triggers", "hit")
+# Rows per Parquet row group / pyarrow batch.
+_EXPORT_BATCH = 65536
+
+
+def iter_export_rows(
+    tl: Iterable[tuple[str, object, float | None]],
+    matcher: TriggerMatcher,
+    session: str,
+    lookahead_cap: int = 100,
+) -> Iterable[list]:
+    """Yield [session, ts, kind, skill, triggers, hit] for each skill event of a timeline.
+
+    kind is "invocation" (hit=None, triggers=None) or "trigger": one row per
+    skill matched by a user message, with the matched keywords of that skill
+    and whether it was hit (same rule as HitTracker). Rows stay in timeline
+    order; only the rows since the latest triggering user message are held
+    back until their hit flags are settled.
+    """
+    held: list[list] = []
+    pending: dict[str, list] = {}
+    since = 0
+    for kind, data, ts in tl:
+        if kind == "skill":
+            row = [session, ts, "invocation", data, None, None]
+            if not pending:
+                yield row
+                continue
+            held.append(row)
+            since += 1
+            trow = pending.pop(data, None)
+            if trow is not None:
+                trow[5] = True
+            if since >= lookahead_cap or not pending:
+                yield from held
+                held = []
+                pending = {}
+        elif kind == "user":
+            yield from held
+            held = []
+            pending = {}
+            text_l = str(data).lower()
+            matched = matcher.match(text_l)
+            if not matched:
+                continue
+            keywords = matcher.match_keywords(text_l)
+            for qualified in sorted(matched):
+                trow = [
+                    session, ts, "trigger", qualified,
+                    sorted(k for k in keywords if qualified in matcher.skills_of[k]),
+                    False,
+                ]
+                held.append(trow)
+                pending[qualified] = trow
+            since = 0
+            if lookahead_cap <= 0:
+                yield from held
+                held = []
+                pending = {}
+    yield from held
+
+
+def _with_project(rows: Iterable[list], path: pathlib.PurePath, state: ScanState) -> Iterable[list]:
+    """Prefix rows with the project label, holding them back until the transcript's cwd is known."""
+    held: list[list] = []
+    project: str | None = None
+    for row in rows:
+        if project is None:
+            if state.first_cwd is None:
+                held.append(row)
+                continue
+            project = detect_project(path, state.first_cwd)
+            for h in held:
+                yield [project, *h]
+            held = []
+        yield [project, *row]
+    if held:
+        project = detect_project(path, state.first_cwd)
+        for h in held:
+            yield [project, *h]
+
+
+def iter_corpus_rows(
+    transcripts: list[pathlib.Path],
+    archives: list[pathlib.Path],
+    skills: list[dict],
+    index: TranscriptIndex | None = None,
+    jobs: int = 1,
+    window: tuple[float | None, float | None] | None = None,
+    lookahead_cap: int = 100,
+) -> Iterable[list]:
+    """Stream export rows (see EXPORT_COLUMNS) for every transcript, file by file."""
+    matcher = build_matcher(skills)
+    if index is not None:
+        index.refresh_many(transcripts, jobs=jobs)
+    seen: set[bytes] = set()
+    for path in transcripts:
+        if index is not None:
+            tl, project = index.timeline(path, window)
+            for row in iter_export_rows(tl, matcher, path.stem, lookahead_cap):
+                yield [project, *row]
+            continue
+        state = ScanState()
+        tl = iter_timeline(path, state, seen=seen)
+        if window is not None:
+            tl = window_filter(tl, window, _untimed_allowed(path, window))
+        yield from _with_project(iter_export_rows(tl, matcher, path.stem, lookahead_cap), path, state)
+    for archive in archives:
+        seen = set()
+        try:
+            for member, mtime, f in iter_archive_members(archive, window[0] if window else None):
+                state = ScanState()
+                tl = iter_stream_timeline(f, state, seen=seen)
+                if window is not None:
+                    tl = window_filter(tl, window, _mtime_in_window(mtime, window))
+                yield from _with_project(
+                    iter_export_rows(tl, matcher, member.stem, lookahead_cap), member, state,
+                )
+        except (OSError, EOFError, tarfile.TarError, zipfile.BadZipFile) as e:
+            print(f"[skill-stats] archive read error ({archive}: {e})", file=sys.stderr)
+
+
+def _load_pyarrow():
+    # imported lazily: pyarrow is optional and slow to import
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        return None
+    return pyarrow
+
+
+def write_parquet(rows: Iterable[list], out: pathlib.Path, pa) -> int:
+    """Stream rows into a Parquet file one row group per batch; return the row count."""
+    schema = pa.schema([
+        ("project", pa.string()),
+        ("session", pa.string()),
+        ("timestamp", pa.timestamp("ms", tz="UTC")),
+        ("kind", pa.string()),
+        ("skill", pa.string()),
+        ("triggers", pa.list_(pa.string())),
+        ("hit", pa.bool_()),
+    ])
+    n = 0
+    with pa.parquet.ParquetWriter(str(out), schema, compression="zstd") as writer:
+        columns: list[list] = [[] for _ in EXPORT_COLUMNS]
+        for row in rows:
+            ts = row[2]
+            row[2] = None if ts is None else round(ts * 1000)
+            for col, value in zip(columns, row):
+                col.append(value)
+            n += 1
+            if len(columns[0]) >= _EXPORT_BATCH:
+                writer.write_batch(pa.record_batch(columns, schema=schema))
+                columns = [[] for _ in EXPORT_COLUMNS]
+        if columns[0] or n == 0:
+            writer.write_batch(pa.record_batch(columns, schema=schema))
+    return n
+
+
+def write_csv(rows: Iterable[list], f: IO[str]) -> int:
+    """Stream rows as CSV (timestamps in ISO 8601 UTC, triggers joined by "|"); return the row count."""
+    writer = csv.writer(f, lineterminator="\n")
+    writer.writerow(EXPORT_COLUMNS)
+    n = 0
+    for row in rows:
+        ts = row[2]
+        if ts is not None:
+            row[2] = datetime.fromtimestamp(ts, timezone.utc).isoformat(timespec="milliseconds")
+        if row[5] is not None:
+            row[5] = "|".join(row[5])
+        if row[6] is not None:
+            row[6] = "true" if row[6] else "false"
+        writer.writerow(row)
+        n += 1
+    return n
+
+
+# Lines worth decoding for the profiler: tool_use blocks, tool_result blocks
+# and (until known) the project cwd.
+_PROBE_TOOL_USE = b'"tool_use"'
+_PROBE_TOOL_RESULT = b'"tool_result"'
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count without a tokenizer: ~4 ASCII characters or 1 other character per token."""
+    ascii_chars = len(text.encode("ascii", errors="ignore"))
+    return -(-ascii_chars // 4) + (len(text) - ascii_chars)
+
+
+def result_size(content: object) -> tuple[int, int]:
+    """(bytes, estimated tokens) of a tool_result `content` as sent back to the model.
+
+    Images count their base64 payload in bytes only.
+    """
+    if isinstance(content, str):
+        return len(content.encode("utf-8", errors="replace")), estimate_tokens(content)
+    nbytes = tokens = 0
+    if isinstance(content, list):
+        for b in content:
+            if not isinstance(b, dict):
+                continue
+            if b.get("type") == "text":
+                text = str(b.get("text", ""))
+                nbytes += len(text.encode("utf-8", errors="replace"))
+                tokens += estimate_tokens(text)
+            elif b.get("type") == "image":
+                nbytes += len(str((b.get("source") or {}).get("data", "")))
+    return nbytes, tokens
+
+
+def tool_label(block: dict) -> str:
+    """Tool name of a tool_use block; Skill calls are split per skill."""
+    name = str(block.get("name") or "?")
+    if name == "Skill":
+        inp = block.get("input") or {}
+        skill = inp.get("skill") or inp.get("name") if isinstance(inp, dict) else None
+        if skill:
+            return f"Skill({skill})"
+    return name
+
+
+def tool_group(label: str) -> str:
+    """MCP tools (mcp__<server>__<tool>) group by server, Skill(...) by "Skill", others by name."""
+    if label.startswith("mcp__"):
+        return "mcp__" + label[5:].split("__", 1)[0]
+    if label.startswith("Skill("):
+        return "Skill"
+    return label
+
+
+def iter_tool_calls(
+    lines: Iterable[tuple[int, bool, bytes | memoryview | None, bool]],
+    probes: list[bytes],
+    state: ScanState,
+    seen: set[bytes] | None = None,
+) -> Iterable[tuple[str, float | None, int | None, int | None, float | None]]:
+    """Yield (label, use_ts, result_bytes, tokens, wall_sec) per tool_use of a transcript.
+
+    A call is yielded when its tool_result arrives; calls that never got one
+    (interrupted sessions) are yielded at the end with None measurements.
+    Only the open calls are held in memory. Events whose key is in `seen`
+    (copied by a resumed / forked session) are skipped, as in iter_timeline().
+    """
+    pending: dict[str, tuple[str, float | None]] = {}
+    for _end, _terminated, raw, _marked in lines:
+        if raw is None:
+            continue
+        dup = False
+        if seen is not None:
+            key = event_key(raw)
+            dup = key in seen
+            if dup and state.first_cwd is not None:
+                continue
+        ev = _decode_line(raw)
+        raw = None
+        if ev is None:
+            continue
+        if state.first_cwd is None:
+            cwd = ev.get("cwd")
+            if isinstance(cwd, str) and cwd:
+                state.first_cwd = cwd
+                probes.remove(_PROBE_CWD)
+        t = ev.get("type")
+        content = (ev.get("message") or {}).get("content")
+        if t not in ("assistant", "user") or not isinstance(content, list):
+            continue
+        if seen is not None:
+            if dup:
+                continue
+            seen.add(key)
+        ts = parse_event_ts(ev.get("timestamp"))
+        ev = None
+        for b in content:
+            if not isinstance(b, dict):
+                continue
+            if t == "assistant" and b.get("type") == "tool_use" and b.get("id"):
+                pending[str(b["id"])] = (tool_label(b), ts)
+            elif t == "user" and b.get("type") == "tool_result":
+                use = pending.pop(str(b.get("tool_use_id")), None)
+                if use is None:
+                    continue
+                label, use_ts = use
+                nbytes, tokens = result_size(b.get("content"))
+                wall = max(0.0, ts - use_ts) if ts is not None and use_ts is not None else None
+                yield label, use_ts, nbytes, tokens, wall
+    for label, use_ts in pending.values():
+        yield label, use_ts, None, None, None
+
+
+class ToolStats:
+    """Accumulated cost of one tool (or tool group) within one project."""
+
+    __slots__ = ("calls", "results", "result_bytes", "tokens", "wall_sec", "wall")
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.results = 0
+        self.result_bytes = 0
+        self.tokens = 0
+        self.wall_sec = 0.0
+        self.wall = TDigest()
+
+    def add(self, result_bytes: int | None, tokens: int | None, wall: float | None) -> None:
+        self.calls += 1
+        if result_bytes is not None:
+            self.results += 1
+            self.result_bytes += result_bytes
+            self.tokens += tokens or 0
+        if wall is not None:
+            self.wall_sec += wall
+            self.wall.add(wall)
+
+    def merge(self, other: ToolStats) -> None:
+        self.calls += other.calls
+        self.results += other.results
+        self.result_bytes += other.result_bytes
+        self.tokens += other.tokens
+        self.wall_sec += other.wall_sec
+        self.wall.merge(other.wall)
+
+
+def merge_tool_stats(
+    parts: Iterable[dict[str, dict[str, ToolStats]]],
+    into: dict[str, dict[str, ToolStats]] | None = None,
+) -> dict[str, dict[str, ToolStats]]:
+    """Merge { project: { tool: ToolStats } } maps project by project."""
+    merged = {} if into is None else into
+    for part in parts:
+        for project, tools in part.items():
+            mine = merged.setdefault(project, {})
+            for label, st in tools.items():
+                if label in mine:
+                    mine[label].merge(st)
+                else:
+                    mine[label] = st
+    return merged
+
+
+def _profile_calls(
+    calls: Iterable[tuple[str, float | None, int | None, int | None, float | None]],
+    window: tuple[float | None, float | None] | None,
+    keep_untimed: bool,
+) -> dict[str, ToolStats]:
+    tools: dict[str, ToolStats] = {}
+    for label, use_ts, nbytes, tokens, wall in calls:
+        if window is not None:
+            if use_ts is None:
+                if not keep_untimed:
+                    continue
+            elif not _mtime_in_window(use_ts, window):
+                continue
+        st = tools.get(label)
+        if st is None:
+            st = tools[label] = ToolStats()
+        st.add(nbytes, tokens, wall)
+    return tools
+
+
+def _tool_probes() -> list[bytes]:
+    return [_PROBE_TOOL_USE, _PROBE_TOOL_RESULT, _PROBE_CWD]
+
+
+def _profile_chunk(
+    paths: list[pathlib.Path],
+    window: tuple[float | None, float | None] | None = None,
+    skips: list[set[bytes]] | None = None,
+) -> dict[str, dict[str, ToolStats]]:
+    """Process-pool worker: profile the tool calls of a batch of transcripts (`skips` as in _count_chunk)."""
+    parts = []
+    seen: set[bytes] = set()
+    for i, path in enumerate(paths):
+        if skips is not None:
+            seen = skips[i]
+        state = ScanState()
+        probes = _tool_probes()
+        calls = iter_tool_calls(_iter_lines(path, 0, probes), probes, state, seen)
+        tools = _profile_calls(calls, window, _untimed_allowed(path, window))
+        parts.append({detect_project(path, state.first_cwd): tools})
+    return merge_tool_stats(parts)
+
+
+def _profile_archive(
+    archive: pathlib.Path,
+    window: tuple[float | None, float | None] | None = None,
+) -> tuple[dict[str, dict[str, ToolStats]], int]:
+    """Process-pool worker: profile every transcript of one archive; return (per_project, n_transcripts)."""
+    parts = []
+    seen: set[bytes] = set()
+    try:
+        for member, mtime, f in iter_archive_members(archive, window[0] if window else None):
+            state = ScanState()
+            probes = _tool_probes()
+            calls = iter_tool_calls(_iter_stream_lines(f, probes), probes, state, seen)
+            tools = _profile_calls(calls, window, _mtime_in_window(mtime, window))
+            parts.append({detect_project(member, state.first_cwd): tools})
+    except (OSError, EOFError, tarfile.TarError, zipfile.BadZipFile) as e:
+        print(f"[skill-stats] archive read error ({archive}: {e})", file=sys.stderr)
+    return merge_tool_stats(parts), len(parts)
+
+
+def profile_tools(
+    transcripts: list[pathlib.Path],
+    archives: list[pathlib.Path] = (),
+    jobs: int = 1,
+    window: tuple[float | None, float | None] | None = None,
+) -> tuple[dict[str, dict[str, ToolStats]], int]:
+    """Return ({ project: { tool: ToolStats } }, n_transcripts) over transcripts and archives."""
+    archives = list(archives)
+    if jobs > 1 and len(transcripts) + len(archives) > 1:
+        chunks = _chunked_by_dir(transcripts, jobs) if transcripts else []
+        with ProcessPoolExecutor(max_workers=jobs) as ex:
+            skips = _cross_chunk_skips(ex, transcripts, chunks, tools=True)
+            dir_parts = ex.map(_profile_chunk, chunks, [window] * len(chunks), skips)
+            arc_parts = ex.map(_profile_archive, archives, [window] * len(archives))
+            merged = merge_tool_stats(dir_parts)
+            n = len(transcripts)
+            for part, count in arc_parts:
+                merge_tool_stats([part], into=merged)
+                n += count
+        return merged, n
+    merged = _profile_chunk(transcripts, window)
+    n = len(transcripts)
+    for archive in archives:
+        part, count = _profile_archive(archive, window)
+        merge_tool_stats([part], into=merged)
+        n += count
+    return merged, n
+
+
+PROFILE_SORT_KEYS = {
+    "bytes": "result_bytes",
+    "tokens": "tokens",
+    "time": "wall_sec",
+    "calls": "calls",
+}
+
+
+def build_profile_rows(tools: dict[str, ToolStats], sort: str = "bytes", top: int | None = None) -> list[dict]:
+    rows = []
+    for label, st in tools.items():
+        rows.append({
+            "tool": label,
+            "calls": st.calls,
+            "results": st.results,
+            "result_bytes": st.result_bytes,
+            "tokens": st.tokens,
+            "wall_sec": round(st.wall_sec, 1),
+            "wall_p50": round(st.wall.quantile(0.5), 1) if st.wall.count else None,
+            "wall_p90": round(st.wall.quantile(0.9), 1) if st.wall.count else None,
+        })
+    key = PROFILE_SORT_KEYS[sort]
+    rows.sort(key=lambda r: (-r[key], r["tool"]))
+    return rows[:top] if top else rows
+
+
+def group_tool_stats(tools: dict[str, ToolStats]) -> dict[str, ToolStats]:
+    """Fold per-tool stats into tool_group() buckets (MCP server, Skill, builtin tool)."""
+    groups: dict[str, ToolStats] = {}
+    for label, st in tools.items():
+        g = groups.get(tool_group(label))
+        if g is None:
+            g = groups[tool_group(label)] = ToolStats()
+        g.merge(st)
+    return groups
+
+
+def format_profile_markdown(rows: list[dict], heading: str, first_column: str = "tool") -> str:
+    lines = [
+        heading,
+        f"| {first_column} | 呼び出し数 | 結果 KB | 推定トークン | 経過秒 合計 | p50 | p90 |",
+        "|---|---:|---:|---:|---:|---:|---:|",
+    ]
+    for r in rows:
+        p50 = "-" if r["wall_p50"] is None else r["wall_p50"]
+        p90 = "-" if r["wall_p90"] is None else r["wall_p90"]
+        lines.append(
+            f"| {r['tool']} | {r['calls']} | {r['result_bytes'] / 1024:.1f} | {r['tokens']} "
+            f"| {r['wall_sec']} | {p50} | {p90} |"
+        )
+    return "\n".join(lines)
+
+
+class _LiveFile:
+    """Tail position, hit tracker and owned event keys of one transcript followed by `serve`."""
+
+    __slots__ = ("state", "tracker", "inode", "keys")
+
+    def __init__(self, state: ScanState, tracker: HitTracker, inode: int, keys: set[bytes] | None = None) -> None:
+        self.state = state
+        self.tracker = tracker
+        self.inode = inode
+        self.keys = keys if keys is not None else set()
+
+
+class LiveStats:
+    """In-memory skill counters kept current by folding in appended transcript bytes.
+
+    Every transcript keeps its ScanState checkpoint and its own HitTracker, so
+    an update parses only the bytes written since the previous one and a
+    trigger still waiting for its invocation carries over to the next append.
+    A rotated (new inode) or truncated transcript starts over. Counters are
+    merged per project when a snapshot is taken.
+
+    `seen` holds the event keys counted so far, as in aggregate_by_project():
+    events copied into a resumed / forked session after startup are skipped,
+    so the counters stay equal to a batch run. Each file remembers the keys
+    it owns so that starting it over releases them first.
+    """
+
+    def __init__(
+        self,
+        matcher: TriggerMatcher,
+        lookahead_cap: int = 100,
+        window: tuple[float | None, float | None] | None = None,
+    ) -> None:
+        self.matcher = matcher
+        self.lookahead_cap = lookahead_cap
+        self.window = window
+        self.files: dict[pathlib.Path, _LiveFile] = {}
+        # only touched by update() / seed(), which run on the watcher thread
+        self.seen: set[bytes] = set()
+        self.lock = threading.Lock()
+        self.bytes_read = 0
+        self.updates = 0
+        self.started = time.time()
+        self.updated: float | None = None
+
+    def seed(
+        self,
+        path: pathlib.Path,
+        timeline: Iterable[tuple],
+        state: ScanState,
+        inode: int,
+        keys: set[bytes] | None = None,
+    ) -> None:
+        """Start following `path` from an already parsed timeline (e.g. served by the index).
+
+        `keys` are the event keys `path` owns (counted here, not as a copy).
+        """
+        tracker = HitTracker(self.matcher, self.lookahead_cap)
+        for kind, data, ts in timeline:
+            tracker.feed(kind, data, ts)
+        keys = set(keys or ())
+        self.seen |= keys
+        with self.lock:
+            self.files[path] = _LiveFile(state, tracker, inode, keys)
+
+    def update(self, path: pathlib.Path) -> int:
+        """Fold the bytes appended to `path` since the last update; return how many were read."""
+        try:
+            st = path.stat()
+        except OSError:
+            with self.lock:
+                self.files.pop(path, None)
+            return 0
+        live = self.files.get(path)
+        if live is None or live.inode != st.st_ino or st.st_size < live.state.consumed:
+            if live is not None:
+                self.seen -= live.keys
+            live = _LiveFile(ScanState(), HitTracker(self.matcher, self.lookahead_cap), st.st_ino)
+        elif st.st_size == live.state.consumed:
+            return 0
+        # Parse outside the lock into a private state; only the fold is serialised.
+        state = ScanState(live.state.consumed, live.state.first_cwd, live.state.assistants)
+        try:
+            parsed = list(iter_timeline(path, state, seen=self.seen, with_key=True))
+        except OSError:
+            return 0
+        live.keys.update(entry[3] for entry in parsed)
+        entries = list(window_filter(
+            (entry[:3] for entry in parsed), self.window, _untimed_allowed(path, self.window),
+        ))
+        read = state.consumed - live.state.consumed
+        with self.lock:
+            for kind, data, ts in entries:
+                live.tracker.feed(kind, data, ts)
+            live.state = state
+            self.files[path] = live
+            self.bytes_read += read
+            self.updates += 1
+            self.updated = time.time()
+        return read
+
+    def paths(self) -> list[pathlib.Path]:
+        with self.lock:
+            return list(self.files)
+
+    def snapshot(self) -> dict[str, tuple[Counter, Counter, Counter]]:
+        """Return { project: (invocations, triggers, hits) } as of now."""
+        with self.lock:
+            parts = [
+                {detect_project(path, live.state.first_cwd): tuple(Counter(c) for c in live.tracker.counters())}
+                for path, live in self.files.items()
+            ]
+        return merge_per_project(parts)
+
+
+# inotify(7) constants
+_IN_MODIFY = 0x00000002
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ISDIR = 0x40000000
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+_IN_WATCH_MASK = _IN_MODIFY | _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE
+_INOTIFY_EVENT = struct.Struct("iIII")
+
+
+class InotifyWatcher:
+    """Recursive inotify watch over transcript directories (Linux, via ctypes).
+
+    `changes()` returns the .jsonl paths written, created, moved or deleted
+    since the last call, or None when the kernel queue overflowed and every
+    transcript has to be re-checked. Raises OSError where inotify is missing.
+    """
+
+    def __init__(self, roots: list[pathlib.Path]) -> None:
+        import ctypes
+        import ctypes.util
+
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            raise OSError("inotify is not available")
+        self._libc = libc
+        self.fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.dirs: dict[int, pathlib.Path] = {}
+        for root in roots:
+            if root.is_dir():
+                self._watch_tree(root)
+
+    def _watch_tree(self, top: pathlib.Path) -> list[pathlib.Path]:
+        """Watch `top` and its subdirectories; return the transcripts already in them."""
+        found = []
+        for dirpath, _dirnames, filenames in os.walk(top):
+            wd = self._libc.inotify_add_watch(self.fd, os.fsencode(dirpath), _IN_WATCH_MASK)
+            if wd >= 0:
+                self.dirs[wd] = pathlib.Path(dirpath)
+            found.extend(pathlib.Path(dirpath) / name for name in filenames if name.endswith(".jsonl"))
+        return found
+
+    def changes(self, timeout: float) -> set[pathlib.Path] | None:
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return set()
+        changed: set[pathlib.Path] = set()
+        overflow = False
+        while True:
+            try:
+                buf = os.read(self.fd, 65536)
+            except BlockingIOError:
+                break
+            pos = 0
+            while pos < len(buf):
+                wd, mask, _cookie, length = _INOTIFY_EVENT.unpack_from(buf, pos)
+                name = os.fsdecode(buf[pos + _INOTIFY_EVENT.size: pos + _INOTIFY_EVENT.size + length].rstrip(b"\0"))
+                pos += _INOTIFY_EVENT.size + length
+                if mask & _IN_Q_OVERFLOW:
+                    overflow = True
+                    continue
+                if mask & _IN_IGNORED:
+                    self.dirs.pop(wd, None)
+                    continue
+                parent = self.dirs.get(wd)
+                if parent is None or not name:
+                    continue
+                if mask & _IN_ISDIR:
+                    if mask & (_IN_CREATE | _IN_MOVED_TO):
+                        # files may land before the new watch exists
+                        changed.update(self._watch_tree(parent / name))
+                elif name.endswith(".jsonl"):
+                    changed.add(parent / name)
+        return None if overflow else changed
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class PollWatcher:
+    """Fallback for `serve` without inotify: stat every transcript once per interval."""
+
+    def __init__(self, roots: list[pathlib.Path]) -> None:
+        self.roots = roots
+        self.seen: dict[pathlib.Path, tuple[int, int, int]] = {}
+
+    def changes(self, timeout: float) -> set[pathlib.Path] | None:
+        time.sleep(timeout)
+        current: dict[pathlib.Path, tuple[int, int, int]] = {}
+        for root in self.roots:
+            if not root.is_dir():
+                continue
+            for p in root.rglob("*.jsonl"):
+                try:
+                    st = p.stat()
+                except OSError:
+                    continue
+                current[p] = (st.st_ino, st.st_size, st.st_mtime_ns)
+        changed = {p for p, sig in current.items() if self.seen.get(p) != sig}
+        changed.update(p for p in self.seen if p not in current)
+        self.seen = current
+        return changed
+
+    def close(self) -> None:
+        pass
+
+
+def _prom_escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_prometheus(per_project: dict[str, tuple[Counter, Counter, Counter]], live: LiveStats) -> str:
+    """Prometheus text exposition of the live counters."""
+    lines = []
+    metrics = (
+        ("ndf_skill_invocations_total", "Skill tool invocations seen in transcripts."),
+        ("ndf_skill_triggers_total", "User messages matching the skill's trigger keywords."),
+        ("ndf_skill_hits_total", "Triggers followed by an invocation of the same skill."),
+    )
+    for i, (name, help_text) in enumerate(metrics):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} counter")
+        for project, counters in sorted(per_project.items()):
+            for skill, n in sorted(counters[i].items()):
+                lines.append(f'{name}{{project="{_prom_escape(project)}",skill="{_prom_escape(skill)}"}} {n}')
+    with live.lock:
+        n_files, read, updated = len(live.files), live.bytes_read, live.updated
+    lines += [
+        "# HELP ndf_skill_stats_transcripts Transcripts being followed.",
+        "# TYPE ndf_skill_stats_transcripts gauge",
+        f"ndf_skill_stats_transcripts {n_files}",
+        "# HELP ndf_skill_stats_read_bytes_total Transcript bytes parsed since start.",
+        "# TYPE ndf_skill_stats_read_bytes_total counter",
+        f"ndf_skill_stats_read_bytes_total {read}",
+        "# HELP ndf_skill_stats_last_update_seconds Unix time of the last folded append.",
+        "# TYPE ndf_skill_stats_last_update_seconds gauge",
+        f"ndf_skill_stats_last_update_seconds {updated or live.started:.3f}",
+    ]
+    return "\n".join(lines) + "\n"
+
+
+def make_handler(live: LiveStats, skills: list[dict], meta: dict, project: str | None = None) -> type:
+    """HTTP handler class serving `/stats` (JSON report) and `/metrics` (Prometheus)."""
+
+    def current() -> dict[str, tuple[Counter, Counter, Counter]]:
+        per_project = live.snapshot()
+        if project:
+            needle = project.lower()
+            per_project = {k: v for k, v in per_project.items() if needle in k.lower()}
+        return per_project
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            path = self.path.split("?", 1)[0].rstrip("/") or "/"
+            if path == "/metrics":
+                body = format_prometheus(current(), live).encode("utf-8")
+                ctype = "text/plain; version=0.0.4; charset=utf-8"
+            elif path in ("/", "/stats"):
+                with live.lock:
+                    status = {
+                        "transcripts": len(live.files),
+                        "read_bytes": live.bytes_read,
+                        "updates": live.updates,
+                        "started": _iso(live.started),
+                        "updated": _iso(live.updated),
+                    }
+                out = {"meta": {**meta, **status}, **build_report(skills, current())}
+                body = json.dumps(out, ensure_ascii=False, indent=2).encode("utf-8")
+                ctype = "application/json; charset=utf-8"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", ctype)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format: str, *args: object) -> None:  # noqa: A002 - stdlib signature
+            pass
+
+    return Handler
+
+
+def _iso(epoch: float | None) -> str | None:
+    if epoch is None:
+        return None
+    return datetime.fromtimestamp(epoch, tz=timezone.utc).isoformat(timespec="seconds")
+
+
+def _add_corpus_args(ap: argparse.ArgumentParser) -> None:
+    """Options selecting which transcripts are read."""
+    ap.add_argument("--days", type=int, default=90,
+                    help="集計対象の遡及日数 (default: 90、--from/--to 指定時は無視)")
+    ap.add_argument("--from", dest="date_from", default=None,
+                    help="開始日 YYYY-MM-DD (inclusive)")
+    ap.add_argument("--to", dest="date_to", default=None,
+                    help="終了日 YYYY-MM-DD (inclusive)")
+    ap.add_argument("--project", default=None,
+                    help="プロジェクト名(部分一致)でフィルタ")
+    ap.add_argument("--jobs", type=int, default=1,
+                    help="transcript パースの並列プロセス数 (default: 1、0 で CPU 数)")
+    ap.add_argument("--root", action="append", default=None, metavar="PATH",
+                    help="集計対象の transcript ディレクトリ、または tar / zip アーカイブ "
+                         "(複数指定可、default: ~/.claude/projects)")
+
+
+def _add_source_args(ap: argparse.ArgumentParser) -> None:
+    """Options shared by the report and `export`: what to read and how."""
+    _add_corpus_args(ap)
+    ap.add_argument("--plugin-root", default=None,
+                    help="NDFプラグインのルート (default: 自動検出)")
+    ap.add_argument("--skill", default=None,
+                    help="skill名(部分一致)でフィルタ")
+    ap.add_argument("--include-fallback", action="store_true",
+                    help="Triggers欄が無いskillでも description から語彙抽出してマッチ (ノイズ多)")
+    ap.add_argument("--index", default=None,
+                    help="transcript インデックス (SQLite) のパス "
+                         "(default: $XDG_CACHE_HOME/ndf/skill-stats/index.sqlite)")
+    ap.add_argument("--no-index", action="store_true",
+                    help="インデックスを使わず毎回すべての transcript を再パースする")
+
+
+def _split_roots(args: argparse.Namespace) -> tuple[list[pathlib.Path], list[pathlib.Path], list[pathlib.Path]] | None:
+    """Return (roots, directories, archives) from --root; None (after a message) on a bad root."""
+    roots = [pathlib.Path(r).expanduser() for r in args.root] if args.root else [default_root()]
+    dirs: list[pathlib.Path] = []
+    archives: list[pathlib.Path] = []
+    for root in roots:
+        if root.is_dir() or not root.exists():
+            dirs.append(root)
+        elif is_archive(root):
+            archives.append(root)
+        else:
+            print(f"[skill-stats] not a directory or tar/zip archive: {root}", file=sys.stderr)
+            return None
+    return roots, dirs, archives
+
+
+def _open_index(args: argparse.Namespace) -> TranscriptIndex | None:
+    if args.no_index:
+        return None
+    index_path = pathlib.Path(args.index) if args.index else default_index_path()
+    try:
+        return TranscriptIndex(index_path)
+    except (OSError, sqlite3.Error) as e:
+        print(f"[skill-stats] index disabled ({index_path}: {e})", file=sys.stderr)
+        return None
+
+
+def export_main(argv: list[str]) -> int:
+    ap = argparse.ArgumentParser(
+        prog="skill-stats.py export",
+        description="Export one row per skill event (trigger / invocation) to Parquet or CSV",
+    )
+    _add_source_args(ap)
+    ap.add_argument("--out", required=True,
+                    help="出力ファイル (- で標準出力に CSV)")
+    ap.add_argument("--format", choices=["auto", "parquet", "csv"], default="auto",
+                    help="出力形式 (default: auto = pyarrow があれば parquet、.csv 拡張子なら csv)")
+    args = ap.parse_args(argv)
+
+    plugin_root = pathlib.Path(args.plugin_root) if args.plugin_root else plugin_root_default()
+    if not (plugin_root / "skills").is_dir():
+        print(f"[skill-stats] plugin root not found: {plugin_root}", file=sys.stderr)
+        return 2
+
+    fmt = args.format
+    pa = _load_pyarrow() if fmt != "csv" and args.out != "-" else None
+    if fmt == "parquet" and pa is None:
+        print("[skill-stats] --format parquet requires pyarrow (pip install pyarrow)", file=sys.stderr)
+        return 2
+    if fmt == "auto":
+        fmt = "parquet" if pa is not None and not args.out.endswith(".csv") else "csv"
+
+    date_from = _parse_date(args.date_from)
+    date_to = _parse_date(args.date_to)
+    effective_days = args.days if (date_from is None and date_to is None) else None
+
+    skills = load_skills(plugin_root, include_fallback=args.include_fallback)
+    if args.skill:
+        skills = [s for s in skills if args.skill in s["name"]]
+    split = _split_roots(args)
+    if split is None:
+        return 2
+    _roots, dirs, archives = split
+    transcripts = list(dict.fromkeys(
+        p for root in dirs for p in iter_transcripts(effective_days, date_from, date_to, root)
+    ))
+
+    index = _open_index(args)
+    try:
+        rows = iter_corpus_rows(
+            transcripts, archives, skills, index=index, jobs=resolve_jobs(args.jobs),
+            window=resolve_window(effective_days, date_from, date_to),
+        )
+        if args.project:
+            needle = args.project.lower()
+            rows = (r for r in rows if needle in r[0].lower())
+        if fmt == "parquet":
+            n = write_parquet(rows, pathlib.Path(args.out), pa)
+        elif args.out == "-":
+            n = write_csv(rows, sys.stdout)
+        else:
+            with open(args.out, "w", encoding="utf-8", newline="") as f:
+                n = write_csv(rows, f)
+    finally:
+        if index is not None:
+            index.close()
+    print(f"[skill-stats] exported {n} rows ({fmt}) -> {args.out}", file=sys.stderr)
+    return 0
+
+
+def registry_main(argv: list[str]) -> int:
+    ap = argparse.ArgumentParser(
+        prog="skill-stats.py registry",
+        description="Refresh the compiled skill registry and print it (or its path)",
+    )
+    ap.add_argument("--plugin-root", default=None,
+                    help="NDFプラグインのルート (default: 自動検出)")
+    ap.add_argument("--path", action="store_true",
+                    help="レジストリの内容ではなくファイルパスを出力")
+    args = ap.parse_args(argv)
+
+    plugin_root = pathlib.Path(args.plugin_root) if args.plugin_root else plugin_root_default()
+    if not (plugin_root / "skills").is_dir():
+        print(f"[skill-stats] plugin root not found: {plugin_root}", file=sys.stderr)
+        return 2
+    registry = load_registry(plugin_root)
+    if args.path:
+        print(default_registry_path(plugin_root))
+    else:
+        print(json.dumps(registry, ensure_ascii=False, indent=2))
+    return 0
+
+
+def profile_main(argv: list[str]) -> int:
+    ap = argparse.ArgumentParser(
+        prog="skill-stats.py profile",
+        description="Attribute every tool call to its result size (bytes / estimated tokens) and wall time",
+    )
+    _add_corpus_args(ap)
+    ap.add_argument("--top", type=int, default=15,
+                    help="各表に出す上位件数 (default: 15、0 で全件)")
+    ap.add_argument("--sort", choices=list(PROFILE_SORT_KEYS), default="bytes",
+                    help="並び順 (default: bytes)")
+    ap.add_argument("--format", choices=["md", "json"], default="md",
+                    help="出力形式 (default: md)")
+    args = ap.parse_args(argv)
+
+    date_from = _parse_date(args.date_from)
+    date_to = _parse_date(args.date_to)
+    effective_days = args.days if (date_from is None and date_to is None) else None
+    split = _split_roots(args)
+    if split is None:
+        return 2
+    roots, dirs, archives = split
+    transcripts = list(dict.fromkeys(
+        p for root in dirs for p in iter_transcripts(effective_days, date_from, date_to, root)
+    ))
+    per_project, n_transcripts = profile_tools(
+        transcripts, archives, jobs=resolve_jobs(args.jobs),
+        window=resolve_window(effective_days, date_from, date_to),
+    )
+    if args.project:
+        needle = args.project.lower()
+        per_project = {k: v for k, v in per_project.items() if needle in k.lower()}
+    total: dict[str, ToolStats] = {}
+    for tools in per_project.values():
+        for label, st in tools.items():
+            total.setdefault(label, ToolStats()).merge(st)
+    top = args.top or None
+    tool_rows = build_profile_rows(total, args.sort, top)
+    group_rows = build_profile_rows(group_tool_stats(total), args.sort, top)
+    project_rows = {
+        project: build_profile_rows(tools, args.sort, top)
+        for project, tools in sorted(per_project.items())
+    }
+
+    if args.format == "json":
+        out = {
+            "meta": {
+                "days": effective_days,
+                "date_from": args.date_from,
+                "date_to": args.date_to,
+                "transcripts": n_transcripts,
+                "roots": [str(r) for r in roots],
+                "project_filter": args.project,
+                "sort": args.sort,
+                "top": args.top,
+            },
+            "tools": tool_rows,
+            "groups": group_rows,
+            "projects": [{"project": k, "tools": v} for k, v in project_rows.items()],
+        }
+        print(json.dumps(out, ensure_ascii=False, indent=2))
+        return 0
+    print(format_profile_markdown(tool_rows, "## ツール別 (全プロジェクト)"))
+    print()
+    print(format_profile_markdown(group_rows, "## グループ別 (MCP サーバー / Skill / 組み込みツール)", "group"))
+    for project, rows in project_rows.items():
+        if rows:
+            print()
+            print(format_profile_markdown(rows, f"## {project}"))
+    return 0
+
+
+def serve_main(argv: list[str]) -> int:
+    ap = argparse.ArgumentParser(
+        prog="skill-stats.py serve",
+        description="Follow transcripts as they are written and serve live counters over HTTP "
+                    "(/stats = JSON report, /metrics = Prometheus)",
+    )
+    _add_source_args(ap)
+    ap.add_argument("--host", default="127.0.0.1",
+                    help="待ち受けアドレス (default: 127.0.0.1)")
+    ap.add_argument("--port", type=int, default=8765,
+                    help="待ち受けポート (default: 8765)")
+    ap.add_argument("--poll", action="store_true",
+                    help="inotify を使わず定期的な stat で変更を検出する")
+    ap.add_argument("--interval", type=float, default=2.0,
+                    help="ポーリング間隔 (秒、default: 2.0)")
+    args = ap.parse_args(argv)
+
+    plugin_root = pathlib.Path(args.plugin_root) if args.plugin_root else plugin_root_default()
+    if not (plugin_root / "skills").is_dir():
+        print(f"[skill-stats] plugin root not found: {plugin_root}", file=sys.stderr)
+        return 2
+    if args.date_to:
+        print("[skill-stats] serve counts new events as they arrive; --to is not supported", file=sys.stderr)
+        return 2
+
+    date_from = _parse_date(args.date_from)
+    effective_days = args.days if date_from is None else None
+    skills = load_skills(plugin_root, include_fallback=args.include_fallback)
+    if args.skill:
+        skills = [s for s in skills if args.skill in s["name"]]
+    split = _split_roots(args)
+    if split is None:
+        return 2
+    roots, dirs, archives = split
+    if archives:
+        print("[skill-stats] serve follows directories only; archives do not change", file=sys.stderr)
+        return 2
+    transcripts = list(dict.fromkeys(
+        p for root in dirs for p in iter_transcripts(effective_days, date_from, None, root)
+    ))
+    # The lower bound is fixed at startup: everything appended later counts.
+    window = (resolve_window(effective_days, date_from, None)[0], None)
+    live = LiveStats(build_matcher(skills), window=window)
+
+    index = _open_index(args)
+    if index is not None:
+        try:
+            index.refresh_many(transcripts, resolve_jobs(args.jobs))
+            for path in transcripts:
+                tl, _project = index.timeline(path, window)
+                checkpoint = index.checkpoint(path)
+                if checkpoint is not None:
+                    live.seed(path, tl, *checkpoint, keys=index.owned_keys(path))
+        finally:
+            index.close()
+    for path in transcripts:
+        live.update(path)  # catch up on appends since the index refresh (or parse, without one)
+
+    watcher: InotifyWatcher | PollWatcher
+    if args.poll:
+        watcher = PollWatcher(dirs)
+    else:
+        try:
+            watcher = InotifyWatcher(dirs)
+        except OSError as e:
+            print(f"[skill-stats] inotify unavailable ({e}); polling every {args.interval}s", file=sys.stderr)
+            watcher = PollWatcher(dirs)
+    meta = {
+        "days": effective_days,
+        "date_from": args.date_from,
+        "roots": [str(r) for r in roots],
+        "plugin_root": str(plugin_root),
+        "project_filter": args.project,
+        "watcher": "inotify" if isinstance(watcher, InotifyWatcher) else "poll",
+    }
+    try:
+        server = ThreadingHTTPServer((args.host, args.port), make_handler(live, skills, meta, args.project))
+    except OSError as e:
+        print(f"[skill-stats] cannot listen on {args.host}:{args.port}: {e}", file=sys.stderr)
+        watcher.close()
+        return 2
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(
+        f"[skill-stats] serving {len(live.files)} transcripts on http://{args.host}:{server.server_port} "
+        f"(/stats, /metrics; {meta['watcher']})",
+        file=sys.stderr,
+    )
+    try:
+        while True:
+            changed = watcher.changes(args.interval)
+            if changed is None:  # inotify queue overflow: re-check everything
+                changed = set(live.paths())
+                for root in dirs:
+                    changed.update(iter_transcripts(None, None, None, root))
+            for path in changed:
+                live.update(path)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        server.server_close()
+        watcher.close()
+    return 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ["export"]:
+        return export_main(argv[1:])
+    if argv[:1] == ["registry"]:
+        return registry_main(argv[1:])
+    if argv[:1] == ["profile"]:
+        return profile_main(argv[1:])
+    if argv[:1] == ["serve"]:
+        return serve_main(argv[1:])
+    ap = argparse.ArgumentParser(
+        description="NDF skill usage statistics from Claude Code transcripts "
+                    "(subcommands: `export` = one row per event, `profile` = tool-call "
+                    "cost, `serve` = live counters over HTTP, `registry` = compiled skill "
+                    "metadata; see `<subcommand> -h`)",
+    )
+    _add_source_args(ap)
+    ap.add_argument("--format", choices=["md", "json"], default="md",
+                    help="出力形式 (default: md)")
+    ap.add_argument("--by-project", action="store_true",
+                    help="プロジェクト別に個別のテーブルを出力")
+    ap.add_argument("--show-keywords", action="store_true",
+                    help="各skillに抽出されたトリガーキーワードを出力")
+    ap.add_argument("--bucket", choices=list(BUCKETS), default=None,
+                    help="イベント時刻で day / week / month ごとに集計した時系列を出力")
+    ap.add_argument("--funnel", action="store_true",
+                    help="ヒットごとのトリガー→呼び出しの経過時間と assistant イベント数の p50/p90/p99 を出力")
+    sampling = ap.add_mutually_exclusive_group()
+    sampling.add_argument("--sample", type=float, default=None, metavar="FRACTION",
+                          help="プロジェクトごとに層化した transcript の一部 (0 < FRACTION <= 1) だけを読み、"
+                               "95%% 信頼区間付きの推定値を出力")
+    sampling.add_argument("--max-files", type=int, default=None, metavar="N",
+                          help="--sample と同様だが、読む transcript 数を約 N 件に抑える")
+    ap.add_argument("--seed", type=int, default=None,
+                    help="サンプリングの乱数シード (再現用)")
+    args = ap.parse_args(argv)
+    if args.sample is not None and not 0 < args.sample <= 1:
+        ap.error("--sample must be in (0, 1]")
+    if args.max_files is not None and args.max_files < 1:
+        ap.error("--max-files must be positive")
+
+    plugin_root = pathlib.Path(args.plugin_root) if args.plugin_root else plugin_root_default()
+    if not (plugin_root / "skills").is_dir():
+        print(f"[skill-stats] plugin root not found: {plugin_root}", file=sys.stderr)
+        return 2
+
+    date_from = _parse_date(args.date_from)
+    date_to = _parse_date(args.date_to)
+    # When explicit date range is given, days becomes informational only
+    effective_days = args.days if (date_from is None and date_to is None) else None
+
+    skills = load_skills(plugin_root, include_fallback=args.include_fallback)
+    if args.skill:
+        skills = [s for s in skills if args.skill in s["name"]]
+
+    split = _split_roots(args)
+    if split is None:
+        return 2
+    roots, dirs, archives = split
+    sampled = args.sample is not None or args.max_files is not None
+    if sampled:
+        def _strata() -> Iterable[tuple[pathlib.Path, str]]:
+            # only overlapping roots can repeat a transcript; one root streams as is
+            listed: set[pathlib.Path] | None = set() if len(dirs) > 1 else None
+            for root in dirs:
+                for p in iter_transcripts(effective_days, date_from, date_to, root):
+                    if listed is not None:
+                        if p in listed:
+                            continue
+                        listed.add(p)
+                    yield p, transcript_stratum(p, root)
+
+        sample, population = stratified_sample(
+            _strata(), args.sample, args.max_files, random.Random(args.seed),
+        )
+        transcripts = [p for p, _ in sample]
+    else:
+        # dict.fromkeys: overlapping roots must not count a transcript twice
+        transcripts = list(dict.fromkeys(
+            p for root in dirs for p in iter_transcripts(effective_days, date_from, date_to, root)
+        ))
 
     # Header summary
     window = []
@@ -441,11 +3644,67 @@ def main() -> int:
         window.append(f"last {effective_days} days")
     print(
         f"# NDF Skill 使用統計 ({' / '.join(window) or 'all time'} / "
-        f"transcript {len(transcripts)}件 / plugin {plugin_root})",
+        + (f"transcript {len(transcripts)}/{sum(population.values())}件をサンプル" if sampled
+           else f"transcript {len(transcripts)}件")
+        + (f" + アーカイブ {len(archives)}件" if archives else "")
+        + f" / plugin {plugin_root})",
         file=sys.stderr,
     )
 
-    per_project = aggregate_by_project(transcripts, skills)
+    index = _open_index(args)
+    jobs = resolve_jobs(args.jobs)
+    event_window = resolve_window(effective_days, date_from, date_to)
+    funnel: dict[str, dict[str, tuple[TDigest, TDigest]]] | None = {} if args.funnel else None
+    try:
+        if index is not None:
+            # before counting: copies skipped in favour of a deleted transcript count again
+            index.prune_missing()
+        if sampled:
+            counted = count_transcripts(
+                transcripts, skills, index=index, jobs=jobs,
+                bucket=args.bucket, window=event_window, funnel=funnel,
+            )
+            drawn = Counter(h for _, h in sample)
+            per_project = scale_sample(counted, [population[h] / drawn[h] for _, h in sample])
+        else:
+            per_project = aggregate_by_project(
+                transcripts, skills, index=index, jobs=jobs,
+                bucket=args.bucket, window=event_window, funnel=funnel,
+            )
+    finally:
+        if index is not None:
+            index.close()
+    n_transcripts = len(transcripts)
+    archived: dict[str, tuple[Counter, Counter, Counter]] = {}
+    if archives:
+        archived, n_archived = aggregate_archives(
+            archives, skills, jobs=jobs, bucket=args.bucket, window=event_window, funnel=funnel,
+        )
+        per_project = merge_per_project([per_project, archived])
+        n_transcripts += n_archived
+    estimates = None
+    if sampled:
+        # Domain estimation: transcripts outside --project count as zero, not as missing.
+        needle = (args.project or "").lower()
+        empty = (Counter(), Counter(), Counter())
+        samples: dict[str, list[tuple[Counter, Counter, Counter]]] = defaultdict(list)
+        for (_, h), (project, counters) in zip(sample, counted):
+            samples[h].append(counters if needle in project.lower() else empty)
+        exact = merge_counters({k: v for k, v in archived.items() if needle in k.lower()})
+        est_rows, est_total = estimate_rows(skills, samples, population, exact)
+        estimates = {
+            "meta": {
+                "fraction": args.sample,
+                "max_files": args.max_files,
+                "seed": args.seed,
+                "sampled": len(transcripts),
+                "population": sum(population.values()),
+                "strata": len(population),
+                "confidence": 0.95,
+            },
+            "total": est_total,
+            "skills": est_rows,
+        }
     if args.project:
         needle = args.project.lower()
         per_project = {
@@ -454,32 +3713,65 @@ def main() -> int:
         if not per_project:
             print(f"[skill-stats] no projects matched: {args.project}", file=sys.stderr)
             return 0
+    funnel_rows = build_funnel_rows(
+        skills, {k: v for k, v in funnel.items() if k in per_project},
+    ) if funnel is not None else None
+
+    if args.bucket:
+        per_bucket = split_buckets(*merge_counters(per_project))
+        series = build_series(skills, per_bucket, args.bucket)
+        if args.format == "json":
+            out = {
+                "meta": {
+                    "days": effective_days,
+                    "date_from": args.date_from,
+                    "date_to": args.date_to,
+                    "transcripts": n_transcripts,
+                    "roots": [str(r) for r in roots],
+                    "plugin_root": str(plugin_root),
+                    "project_filter": args.project,
+                },
+                **series,
+            }
+            if funnel_rows is not None:
+                out["funnel"] = funnel_rows
+            if estimates is not None:
+                out["estimates"] = estimates
+            print(json.dumps(out, ensure_ascii=False, indent=2))
+            return 0
+        for label in series["buckets"]:
+            rows, total = build_rows(skills, *per_bucket.get(label, (Counter(), Counter(), Counter())))
+            rows = [r for r in rows if r["invocations"] or r["triggers"]]
+            if not rows:
+                continue
+            print()
+            print(format_markdown(rows, total, heading=f"## {label}"))
+        if funnel_rows is not None:
+            print()
+            print(format_funnel_markdown(funnel_rows))
+        if estimates is not None:
+            print()
+            print(_format_estimates(estimates))
+        return 0
 
     if args.format == "json":
-        projects_json = []
-        for project, (inv, trig, hits) in sorted(per_project.items()):
-            rows, total = build_rows(skills, inv, trig, hits)
-            projects_json.append({
-                "project": project,
-                "total": total,
-                "skills": rows,
-            })
-        all_inv, all_trig, all_hits = merge_counters(per_project)
-        grand_rows, grand_total = build_rows(skills, all_inv, all_trig, all_hits)
         out = {
             "meta": {
                 "days": effective_days,
                 "date_from": args.date_from,
                 "date_to": args.date_to,
-                "transcripts": len(transcripts),
+                "transcripts": n_transcripts,
+                "roots": [str(r) for r in roots],
                 "plugin_root": str(plugin_root),
                 "by_project": args.by_project,
                 "project_filter": args.project,
             },
-            "total": grand_total,
-            "grand_skills": grand_rows,
-            "projects": projects_json,
+            **build_report(skills, per_project),
         }
+        if funnel_rows is not None:
+            out["funnel"] = funnel_rows
+        if estimates is not None:
+            out["estimates"] = estimates
         print(json.dumps(out, ensure_ascii=False, indent=2))
     else:
         if args.by_project:
@@ -499,6 +3791,14 @@ def main() -> int:
             rows, total = build_rows(skills, all_inv, all_trig, all_hits)
             print(format_markdown(rows, total))
 
+        if funnel_rows is not None:
+            print()
+            print(format_funnel_markdown(funnel_rows))
+
+        if estimates is not None:
+            print()
+            print(_format_estimates(estimates))
+
         if args.show_keywords:
             print("\n## 抽出トリガーキーワード")
             for s in sorted(skills, key=lambda x: x["name"]):